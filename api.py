@@ -0,0 +1,278 @@
+"""Lightweight HTTP API for door kiosks and badge readers.
+
+Check-in, check-out and status on top of data/checkin_log without a Flet
+session, plus a batch endpoint for kiosks syncing events queued while offline.
+Handlers are async; the file work runs on the thread pool so one slow disk
+write doesn't stall other requests.
+
+- Auth: `Authorization: Bearer <token>`. Tokens are issued per kiosk with
+  `python api.py token <name>` and only their SHA-256 is stored.
+- Idempotency: a retried POST with the same `Idempotency-Key` header gets the
+  first response back instead of checking the user in/out twice.
+- Rooms: `?room=<id>` picks the study room (the main room if omitted; check-out
+  and status default to the room the user is checked in to). Batch events may
+  carry a "room" field.
+
+Usage:
+    python api.py token front-door
+    python api.py serve [--host 0.0.0.0] [--port 8001]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import secrets
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+# Runnable as a script from anywhere: put the project and data folders on sys.path
+PROJECT_ROOT = Path(__file__).resolve().parent
+for folder in (PROJECT_ROOT / "data", PROJECT_ROOT):
+    if str(folder) not in sys.path:
+        sys.path.insert(0, str(folder))
+
+from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from pydantic import BaseModel, Field
+
+import async_store as store
+from checkin_log import check_in, check_out, get_current_status, ingest_events
+from occupancy import RoomFull, get_rooms
+from storage import get_store
+from users_data import _synced_index
+
+TOKENS_FILE = PROJECT_ROOT / "data" / "api_tokens.json"
+# Replayed responses are kept this long, and at most this many of them
+IDEMPOTENCY_TTL = 24 * 3600
+IDEMPOTENCY_MAX_KEYS = 50000
+# Same-user requests are serialized on one of these locks (by hash of the username)
+USER_LOCK_STRIPES = 256
+# Largest offline batch accepted in one request
+MAX_BATCH_EVENTS = 10000
+
+_tokens_store = get_store(TOKENS_FILE)
+_tokens_cache = {"signature": None, "tokens": {}}
+
+
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def issue_token(name: str) -> str:
+    """Create an API token for a kiosk. Only its hash is stored; the token
+    itself is returned once."""
+    token = secrets.token_urlsafe(32)
+
+    def _add(tokens):
+        tokens[_hash_token(token)] = {
+            "name": name,
+            "created": datetime.now().strftime("%m/%d/%Y, %I:%M:%S %p"),
+        }
+
+    _tokens_store.update(_add)
+    return token
+
+
+def _known_tokens() -> dict:
+    """Token hashes -> kiosk info, re-read only when the file changes."""
+    try:
+        stat = TOKENS_FILE.stat()
+        signature = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        signature = None
+    if signature != _tokens_cache["signature"]:
+        _tokens_cache["tokens"] = _tokens_store.read() if signature else {}
+        _tokens_cache["signature"] = signature
+    return _tokens_cache["tokens"]
+
+
+class _IdempotencyCache:
+    """Responses by (client, Idempotency-Key). A request arriving while the first
+    one with the same key is still running waits for it instead of running again."""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+
+    def _expire(self, now: float):
+        while self._entries:
+            key, (_, _, created) = next(iter(self._entries.items()))
+            if now - created < self.ttl and len(self._entries) <= self.max_keys:
+                break
+            self._entries.popitem(last=False)
+
+    async def run(self, key, fingerprint: str, handler):
+        """Return handler()'s (status, body), or the stored one for a repeated key."""
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_fingerprint, future, _ = entry
+            if stored_fingerprint != fingerprint:
+                raise HTTPException(422, "Idempotency-Key was already used for a different request")
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self._entries[key] = (fingerprint, future, now)
+        try:
+            result = await handler()
+        except BaseException as ex:
+            # Failures aren't remembered: the client may retry with the same key
+            self._entries.pop(key, None)
+            future.set_exception(ex)
+            future.exception()
+            raise
+        future.set_result(result)
+        return result
+
+
+_idempotency = _IdempotencyCache()
+_user_locks = [asyncio.Lock() for _ in range(USER_LOCK_STRIPES)]
+_bearer = HTTPBearer(auto_error=False)
+
+app = FastAPI(title="Study.Space.Secured! kiosk API")
+
+
+async def require_client(credentials: HTTPAuthorizationCredentials = Depends(_bearer)) -> str:
+    """The kiosk name of a valid bearer token. In-memory, so it runs on the event
+    loop rather than taking a thread-pool hop."""
+    if credentials is None:
+        raise HTTPException(401, "Missing bearer token", headers={"WWW-Authenticate": "Bearer"})
+    client = _known_tokens().get(_hash_token(credentials.credentials))
+    if client is None:
+        raise HTTPException(401, "Invalid token", headers={"WWW-Authenticate": "Bearer"})
+    return client.get("name", "kiosk")
+
+
+async def _require_user(username: str) -> str:
+    """Lower-cased username of an existing, unlocked account, from the in-memory
+    user index. Syncing the index (a stat, and a reload after the users file
+    changed) runs on the users store's executor, off the event loop."""
+    username = username.strip().lower()
+    record = (await store.run("users", _synced_index)).data.get(username)
+    if record is None:
+        raise HTTPException(404, f"Unknown user {username}")
+    if record.get("locked"):
+        raise HTTPException(403, f"User {username} is locked")
+    return username
+
+
+def _public(record: dict) -> dict:
+    return {key: value for key, value in record.items() if key != "prev"}
+
+
+def _require_room(room: str):
+    """room if it is configured (None stays None), else 404."""
+    if room is not None and room not in get_rooms():
+        raise HTTPException(404, f"Unknown room {room}")
+    return room
+
+
+def _check_in_now(username: str, room: str = None) -> tuple:
+    current = get_current_status(username)
+    if current["status"] == "checked_in":
+        return 409, {"detail": f"User {username} is already checked in", "username": username, **current}
+    try:
+        return 200, _public(check_in(username, room))
+    except RoomFull as ex:
+        return 409, {"detail": str(ex), "username": username, "room": ex.room, "occupied": ex.occupied,
+                     "capacity": ex.capacity, "waitlist_position": ex.position}
+    except ValueError as ex:
+        # Checked in to another room (e.g. from the app) since the status check
+        return 409, {"detail": str(ex), "username": username, **get_current_status(username)}
+
+
+def _check_out_now(username: str, room: str = None) -> tuple:
+    current = get_current_status(username, room)
+    if current["status"] != "checked_in":
+        return 409, {"detail": f"User {username} is not checked in", "username": username, **current}
+    return 200, _public(check_out(username, current["room"]))
+
+
+async def _change_status(username: str, client: str, idempotency_key: str, action, fingerprint: str,
+                         room: str = None):
+    username = await _require_user(username)
+    room = _require_room(room)
+
+    async def _run():
+        async with _user_locks[hash(username) % USER_LOCK_STRIPES]:
+            return await run_in_threadpool(action, username, room)
+
+    if idempotency_key:
+        status_code, body = await _idempotency.run((client, idempotency_key), f"{fingerprint}:{username}:{room}", _run)
+    else:
+        status_code, body = await _run()
+    return JSONResponse(body, status_code=status_code)
+
+
+@app.post("/api/users/{username}/check-in")
+async def api_check_in(username: str, room: str = None, client: str = Depends(require_client),
+                       idempotency_key: str = Header(None)):
+    return await _change_status(username, client, idempotency_key, _check_in_now, "check-in", room)
+
+
+@app.post("/api/users/{username}/check-out")
+async def api_check_out(username: str, room: str = None, client: str = Depends(require_client),
+                        idempotency_key: str = Header(None)):
+    return await _change_status(username, client, idempotency_key, _check_out_now, "check-out", room)
+
+
+@app.get("/api/users/{username}/status")
+async def api_status(username: str, room: str = None, client: str = Depends(require_client)):
+    username = await _require_user(username)
+    room = _require_room(room)
+    return {"username": username, **await run_in_threadpool(get_current_status, username, room)}
+
+
+class EventBatch(BaseModel):
+    # Events stay plain dicts: a bad one gets its own "rejected" result instead of failing the batch
+    events: list[dict] = Field(max_length=MAX_BATCH_EVENTS)
+
+
+@app.post("/api/events/batch")
+async def api_ingest(batch: EventBatch, client: str = Depends(require_client),
+                     idempotency_key: str = Header(None)):
+    """Sync events a kiosk queued while offline. See checkin_log.ingest_events."""
+    known_users = (await store.run("users", _synced_index)).data
+
+    async def _run():
+        return 200, await run_in_threadpool(ingest_events, batch.events, known_users)
+
+    if idempotency_key:
+        digest = hashlib.sha256(json.dumps(batch.events, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        status_code, body = await _idempotency.run((client, idempotency_key), f"batch:{digest}", _run)
+    else:
+        status_code, body = await _run()
+    return JSONResponse(body, status_code=status_code)
+
+
+@app.get("/api/health")
+async def api_health():
+    return {"status": "ok"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kiosk check-in API.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    token_parser = commands.add_parser("token", help="issue a bearer token for a kiosk")
+    token_parser.add_argument("name")
+    serve_parser = commands.add_parser("serve", help="run the API server")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args(argv)
+
+    if args.command == "token":
+        print(issue_token(args.name))
+        return 0
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, access_log=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Async facade over the blocking stores, for Flet async event handlers.
+
+Flet runs plain (sync) handlers of every session on one shared thread pool, so
+a few slow exports or MySQL writes can hold up everyone's clicks. Handlers that
+`await` these wrappers instead run the blocking call on a dedicated executor per
+store; each executor's size caps how many calls that store serves at once, and
+a slow store only queues its own callers.
+
+    import async_store as store
+    await store.check_in(username)
+    users = await store.search_users(role="User", query="doe", limit=50)
+    rows = await store.run("activity", build_report, start, end)
+
+Context variables (the handler's unit of work) are carried into the executor.
+Cancelling the awaiting task drops a call that hasn't started yet; a call that
+is already running finishes in the background and its result is discarded.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import auth
+import users_data
+import checkin_log
+import reservations
+import activity_log
+
+# Concurrent blocking calls allowed per store (the size of its executor)
+STORE_LIMITS = {
+    "users": 4,
+    "checkins": 4,
+    "activity": 2,
+    "import": 1,
+}
+
+_executors = {}
+
+
+def _executor(store: str) -> ThreadPoolExecutor:
+    executor = _executors.get(store)
+    if executor is None:
+        executor = _executors.setdefault(
+            store, ThreadPoolExecutor(max_workers=STORE_LIMITS[store], thread_name_prefix=f"store-{store}")
+        )
+    return executor
+
+
+async def run(store: str, func, *args, **kwargs):
+    """Run func(*args, **kwargs) on the store's executor and await the result."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor(store), functools.partial(context.run, func, *args, **kwargs))
+
+
+def _async(store: str, func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run(store, func, *args, **kwargs)
+    return wrapper
+
+
+def shutdown(wait: bool = True):
+    """Stop the executors (e.g. at app exit); queued calls that haven't started are dropped."""
+    for executor in list(_executors.values()):
+        executor.shutdown(wait=wait, cancel_futures=True)
+    _executors.clear()
+
+
+# --- users.json / MySQL ---
+check_credentials = _async("users", auth.check_credentials)
+add_user = _async("users", auth.add_user)
+get_user = _async("users", users_data.get_user)
+search_users = _async("users", users_data.search_users)
+add_user_record = _async("users", users_data.add_user_record)
+delete_user = _async("users", users_data.delete_user)
+toggle_lock = _async("users", users_data.toggle_lock)
+bulk_lock = _async("users", users_data.bulk_lock)
+bulk_delete = _async("users", users_data.bulk_delete)
+bulk_set_role = _async("users", users_data.bulk_set_role)
+
+# --- check-in log ---
+check_in = _async("checkins", checkin_log.check_in)
+check_out = _async("checkins", checkin_log.check_out)
+get_current_status = _async("checkins", checkin_log.get_current_status)
+get_history = _async("checkins", checkin_log.get_history)
+ingest_events = _async("checkins", checkin_log.ingest_events)
+
+# --- seat reservations ---
+book_seat = _async("checkins", reservations.book)
+cancel_reservation = _async("checkins", reservations.cancel)
+free_seats = _async("checkins", reservations.free_seats)
+upcoming_reservations = _async("checkins", reservations.upcoming_for)
+
+# --- activity log ---
+log_activity = _async("activity", activity_log.log_activity)
+
+
+async def import_users(path, actor: str = "system", batch_size: int = None, on_progress=None) -> dict:
+    """user_import.import_users on its own single-worker executor, so a large
+    sheet never occupies the executor that serves lock/delete clicks."""
+    from user_import import import_users as _import_users, BATCH_SIZE
+    return await run("import", _import_users, path, actor, batch_size or BATCH_SIZE, on_progress)
@@ -1,7 +1,7 @@
-import json
 import hashlib
 from pathlib import Path
 from datetime import datetime, timedelta
+from storage import get_store
 
 USERS_FILE = Path(__file__).parent / "users.json"
 LOGIN_ATTEMPTS_FILE = Path(__file__).parent / "data" / "login_attempts.json"
@@ -10,37 +10,41 @@ MAX_FAILED_ATTEMPTS = 3
 LOCKOUT_MINUTES = 15
 
 
+# Shared, locked stores: reads never block each other, writes are atomic and
+# concurrent writers are group-committed into one flush.
+_users_store = get_store(USERS_FILE)
+_attempts_store = get_store(LOGIN_ATTEMPTS_FILE)
+
+
 def _load_users():
-    if not USERS_FILE.exists():
-        return {}
-    try:
-        with open(USERS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+    return _users_store.read()
 
 
 def _save_users(users: dict):
-    with open(USERS_FILE, "w", encoding="utf-8") as f:
-        json.dump(users, f, indent=2)
+    _users_store.replace(users)
+
+
+def _update_users(mutate):
+    """Atomic read-modify-write of users.json. Returns mutate's result."""
+    return _users_store.update(mutate)
 
 
 def _load_login_attempts():
     """Load failed login attempts tracking."""
-    if not LOGIN_ATTEMPTS_FILE.exists():
-        return {}
-    try:
-        with open(LOGIN_ATTEMPTS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+    return _attempts_store.read()
 
 
 def _save_login_attempts(attempts: dict):
     """Save failed login attempts tracking."""
-    LOGIN_ATTEMPTS_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(LOGIN_ATTEMPTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(attempts, f, indent=2)
+    _attempts_store.replace(attempts)
+
+
+def _empty_attempts() -> dict:
+    return {
+        "failed_count": 0,
+        "last_attempt_time": "",
+        "locked_at": ""
+    }
 
 
 def _hash_password(password: str) -> str:
@@ -75,12 +79,7 @@ def _is_account_locked(username: str) -> tuple:
                 return True, int(remaining) + 1
             else:
                 # Lockout period expired, reset attempts
-                attempts[key] = {
-                    "failed_count": 0,
-                    "last_attempt_time": "",
-                    "locked_at": ""
-                }
-                _save_login_attempts(attempts)
+                _reset_login_attempts(key)
                 return False, 0
         except Exception:
             pass
@@ -89,39 +88,46 @@ def _is_account_locked(username: str) -> tuple:
 
 
 def _record_failed_attempt(username: str):
-    """Record a failed login attempt."""
-    attempts = _load_login_attempts()
+    """Record a failed login attempt. Returns the new failed count."""
     key = username.strip().lower()
-    
-    if key not in attempts:
-        attempts[key] = {
-            "failed_count": 0,
-            "last_attempt_time": "",
-            "locked_at": ""
-        }
-    
-    attempts[key]["failed_count"] = attempts[key].get("failed_count", 0) + 1
-    attempts[key]["last_attempt_time"] = datetime.now().isoformat()
-    
-    # Set locked_at timestamp if just reached MAX_FAILED_ATTEMPTS
-    if attempts[key]["failed_count"] == MAX_FAILED_ATTEMPTS:
-        attempts[key]["locked_at"] = datetime.now().isoformat()
-    
-    _save_login_attempts(attempts)
+
+    def _record(attempts):
+        if key not in attempts:
+            attempts[key] = _empty_attempts()
+
+        attempts[key]["failed_count"] = attempts[key].get("failed_count", 0) + 1
+        attempts[key]["last_attempt_time"] = datetime.now().isoformat()
+
+        # Set locked_at timestamp if just reached MAX_FAILED_ATTEMPTS
+        if attempts[key]["failed_count"] == MAX_FAILED_ATTEMPTS:
+            attempts[key]["locked_at"] = datetime.now().isoformat()
+        return attempts[key]["failed_count"]
+
+    return _attempts_store.update(_record)
 
 
 def _reset_login_attempts(username: str):
     """Reset failed login attempts on successful login."""
-    attempts = _load_login_attempts()
     key = username.strip().lower()
-    
-    if key in attempts:
-        attempts[key] = {
-            "failed_count": 0,
-            "last_attempt_time": "",
-            "locked_at": ""
-        }
-        _save_login_attempts(attempts)
+    if key not in _load_login_attempts():
+        return
+
+    def _reset(attempts):
+        if key in attempts:
+            attempts[key] = _empty_attempts()
+
+    _attempts_store.update(_reset)
+
+
+def _reset_login_attempts_many(usernames: list):
+    """Reset failed login attempts of several users in one write."""
+    keys = {username.strip().lower() for username in usernames}
+
+    def _reset(attempts):
+        for key in keys & attempts.keys():
+            attempts[key] = _empty_attempts()
+
+    _attempts_store.update(_reset)
 
 
 def get_login_attempts(username: str) -> dict:
@@ -130,11 +136,7 @@ def get_login_attempts(username: str) -> dict:
     key = username.strip().lower()
     
     if key not in attempts:
-        return {
-            "failed_count": 0,
-            "last_attempt_time": "",
-            "locked_at": ""
-        }
+        return _empty_attempts()
     
     return attempts[key]
 
@@ -142,17 +144,20 @@ def get_login_attempts(username: str) -> dict:
 def add_user(username: str, password: str, email: str = None) -> bool:
     """Add a user. Returns True if created, False if user exists.
     Username is normalized (stripped, lowercased) for consistency."""
-    users = _load_users()
     key = username.strip().lower()
-    if key in users:
-        return False
-    users[key] = {
-        "password_hash": _hash_password(password)
-    }
-    if email:
-        users[key]["email"] = email.strip()
-    _save_users(users)
-    return True
+    password_hash = _hash_password(password)
+
+    def _add(users):
+        if key in users:
+            return False
+        users[key] = {
+            "password_hash": password_hash
+        }
+        if email:
+            users[key]["email"] = email.strip()
+        return True
+
+    return _update_users(_add)
 
 
 def check_credentials(username: str, password: str) -> tuple:
@@ -162,9 +167,7 @@ def check_credentials(username: str, password: str) -> tuple:
 
     users = _load_users()
     if key not in users:
-        _record_failed_attempt(key)
-        attempts = _load_login_attempts()
-        failed_count = attempts.get(key, {}).get("failed_count", 1)
+        failed_count = _record_failed_attempt(key)
         return False, f"Invalid username or password. Attempt {failed_count}/{MAX_FAILED_ATTEMPTS}", 0
 
     # Admin/user manual lock
@@ -177,9 +180,7 @@ def check_credentials(username: str, password: str) -> tuple:
         return False, f"Account locked. Try again in {remaining_minutes} minutes.", remaining_minutes
     
     if users[key].get("password_hash") != _hash_password(password):
-        _record_failed_attempt(key)
-        attempts = _load_login_attempts()
-        failed_count = attempts.get(key, {}).get("failed_count", 1)
+        failed_count = _record_failed_attempt(key)
         return False, f"Invalid username or password. Attempt {failed_count}/{MAX_FAILED_ATTEMPTS}", 0
     
     # Credentials valid - reset attempts
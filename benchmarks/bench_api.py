@@ -0,0 +1,141 @@
+"""Load test for the kiosk API (api.py) against a local server.
+
+The server runs from a scratch copy of the project with its own users and data
+files, pinned to one CPU core where the OS allows it, so the real logs are never
+touched. Each client worker owns a few users and cycles check-in -> status ->
+check-out; every POST carries an Idempotency-Key.
+
+Usage:
+    python benchmarks/bench_api.py [--requests 5000] [--concurrency 32] [--users 200]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _scratch_project(users: int) -> Path:
+    """Copy the code (not the data) to a temp folder and seed bench users."""
+    root = Path(tempfile.mkdtemp(prefix="bench_api_"))
+    for path in PROJECT_ROOT.glob("*.py"):
+        shutil.copy2(path, root)
+    (root / "data").mkdir()
+    for path in (PROJECT_ROOT / "data").glob("*.py"):
+        shutil.copy2(path, root / "data")
+    seeded = {
+        f"bench{i}": {
+            "password_hash": "", "name": f"Bench {i}", "email": "", "role": "User",
+            "status": "Active", "twofa": False, "last_login": "", "locked": False,
+        }
+        for i in range(users)
+    }
+    (root / "users.json").write_text(json.dumps(seeded), encoding="utf-8")
+    return root
+
+
+def _start_server(root: Path, port: int) -> subprocess.Popen:
+    def _pin():
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, {sorted(os.sched_getaffinity(0))[0]})
+
+    server = subprocess.Popen(
+        [sys.executable, "api.py", "serve", "--port", str(port)],
+        cwd=root, preexec_fn=_pin if os.name == "posix" else None,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=0.5)
+            return server
+        except httpx.HTTPError:
+            if server.poll() is not None:
+                raise RuntimeError(server.stderr.read().decode("utf-8", "replace"))
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("API server did not start")
+
+
+async def _worker(client: httpx.AsyncClient, usernames: list, budget: list, latencies: list, statuses: dict):
+    step = 0
+    while budget[0] > 0:
+        budget[0] -= 1
+        username = usernames[(step // 3) % len(usernames)]
+        action = ("check-in", "status", "check-out")[step % 3]
+        step += 1
+        started = time.perf_counter()
+        if action == "status":
+            response = await client.get(f"/api/users/{username}/status")
+        else:
+            response = await client.post(f"/api/users/{username}/{action}",
+                                         headers={"Idempotency-Key": uuid.uuid4().hex})
+        latencies.append(time.perf_counter() - started)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+
+async def _load(port: int, token: str, requests: int, concurrency: int, users: int) -> tuple:
+    latencies, statuses, budget = [], {}, [requests]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits,
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        # Each worker gets its own users so check-ins and check-outs alternate cleanly
+        groups = [[f"bench{i}" for i in range(w, users, concurrency)] for w in range(concurrency)]
+        started = time.perf_counter()
+        await asyncio.gather(*(_worker(client, group, budget, latencies, statuses) for group in groups if group))
+        elapsed = time.perf_counter() - started
+    return elapsed, sorted(latencies), statuses
+
+
+def _percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the kiosk API.")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    root = _scratch_project(max(args.users, args.concurrency))
+    port = _free_port()
+    try:
+        token = subprocess.check_output([sys.executable, "api.py", "token", "bench"], cwd=root, text=True).strip()
+        server = _start_server(root, port)
+        try:
+            elapsed, latencies, statuses = asyncio.run(
+                _load(port, token, args.requests, args.concurrency, max(args.users, args.concurrency)))
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"{len(latencies)} requests, concurrency {args.concurrency}, {args.users} users")
+    print(f"  throughput: {len(latencies) / elapsed:8.1f} req/s")
+    for label, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+        print(f"  {label}:        {1000 * _percentile(latencies, fraction):8.2f} ms")
+    print(f"  status codes: {dict(sorted(statuses.items()))}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""Memory per record: plain dicts vs the __slots__ record types.
+
+Usage:
+    python benchmarks/bench_records.py [count]
+"""
+import sys
+import tracemalloc
+from pathlib import Path
+from datetime import datetime, timedelta
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from records import UserRecord, CheckinEvent, ActivityEvent, TIMESTAMP_FORMAT
+
+
+def _sample_rows(count: int):
+    start = datetime(2025, 12, 1, 8, 0, 0)
+    users, checkins, activities = [], [], []
+    for i in range(count):
+        username = f"user{i % 500}"
+        stamp = (start + timedelta(seconds=37 * i)).strftime(TIMESTAMP_FORMAT)
+        users.append((f"user{i}", {
+            "password_hash": "0904d0a534fcf3d0b19166b1aca415465679c1847314f649d86fc7907533579b",
+            "email": f"user{i}@example.com",
+            "name": f"User {i}",
+            "role": "Admin" if i % 50 == 0 else "User",
+            "status": "Active",
+            "twofa": False,
+            "last_login": "",
+            "locked": False,
+        }))
+        checkins.append({
+            "username": username,
+            "status": "checked_in" if i % 2 == 0 else "checked_out",
+            "check_in_time": stamp if i % 2 == 0 else None,
+            "timestamp": stamp,
+            "prev": 120 * i,
+        })
+        activities.append({
+            "event_type": "login_success" if i % 3 else "login_failed",
+            "username": username,
+            "timestamp": stamp,
+            "description": "",
+        })
+    return users, checkins, activities
+
+
+def _measure(build):
+    """Bytes retained by the objects build() returns."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    users, checkins, activities = _sample_rows(count)
+
+    # Dict baselines copy the rows the way json.load would produce them
+    cases = [
+        ("UserRecord", lambda: [dict(d) for _, d in users], lambda: [UserRecord.from_dict(u, d) for u, d in users]),
+        ("CheckinEvent", lambda: [dict(d) for d in checkins], lambda: [CheckinEvent.from_dict(d) for d in checkins]),
+        ("ActivityEvent", lambda: [dict(d) for d in activities], lambda: [ActivityEvent.from_dict(d) for d in activities]),
+    ]
+    print(f"{count} records each")
+    print(f"{'type':<15}{'dict B/rec':>12}{'slots B/rec':>13}{'saved':>8}")
+    for name, as_dicts, as_records in cases:
+        dict_bytes = _measure(as_dicts) / count
+        record_bytes = _measure(as_records) / count
+        saved = 100 * (1 - record_bytes / dict_bytes)
+        print(f"{name:<15}{dict_bytes:>12.0f}{record_bytes:>13.0f}{saved:>7.0f}%")
+
+
+if __name__ == "__main__":
+    main()
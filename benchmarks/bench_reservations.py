@@ -0,0 +1,128 @@
+"""Seat reservations under thousands of bookings per day.
+
+Runs on a scratch copy of the project (code only), so the real reservation log
+is never touched. Random users book random seats and slots for the coming week;
+once the seats fill up most attempts are rejected as conflicts. Reports booking latency (the overlap checks
+plus the log append), free-seat and free-slot queries, the check-in lookups
+(active_for and reserved_now) and a cold replay of the log.
+
+Usage:
+    python benchmarks/bench_reservations.py [--per-day 6000] [--seats 400] [--users 10000]
+"""
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _scratch_project() -> Path:
+    root = Path(tempfile.mkdtemp(prefix="bench_reservations_"))
+    for path in PROJECT_ROOT.glob("*.py"):
+        shutil.copy2(path, root)
+    (root / "data").mkdir()
+    for path in (PROJECT_ROOT / "data").glob("*.py"):
+        shutil.copy2(path, root / "data")
+    return root
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def _report(label: str, samples: list):
+    samples = sorted(samples)
+    mean = sum(samples) / len(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"  {label:<18}{len(samples):>8}   mean {1e6 * mean:8.1f} us   p99 {1e6 * p99:8.1f} us")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark seat reservations.")
+    parser.add_argument("--per-day", type=int, default=6000, help="booking attempts per day")
+    parser.add_argument("--seats", type=int, default=400)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    root = _scratch_project()
+    sys.path[:0] = [str(root / "data"), str(root)]
+    try:
+        import occupancy
+        import reservations
+        import log_writer
+
+        occupancy.set_capacity(args.seats, "reject", "bench")
+        rng = random.Random(args.seed)
+        seats = reservations.seats()
+        first_day = (datetime.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        slots_per_day = (reservations.CLOSING_HOUR - reservations.OPENING_HOUR) * 60 // reservations.SLOT_MINUTES
+        max_slots = reservations.MAX_BOOKING_HOURS * 60 // reservations.SLOT_MINUTES
+        days = reservations.BOOKING_HORIZON_DAYS - 1
+
+        def _window():
+            length = rng.randint(1, max_slots)
+            slot = rng.randrange(0, slots_per_day - length + 1)
+            start = first_day + timedelta(days=rng.randrange(days), hours=reservations.OPENING_HOUR,
+                                          minutes=slot * reservations.SLOT_MINUTES)
+            return start, start + timedelta(minutes=length * reservations.SLOT_MINUTES)
+
+        booked, conflicts, book_times = 0, 0, []
+        for _ in range(args.per_day * days):
+            start, end = _window()
+            username = f"user{rng.randrange(args.users)}"
+            seat = rng.choice(seats)
+            started = time.perf_counter()
+            try:
+                reservations.book(username, seat, start, end)
+                booked += 1
+            except ValueError:
+                conflicts += 1
+            book_times.append(time.perf_counter() - started)
+
+        free_seat_times, free_slot_times, active_times, reserved_times = [], [], [], []
+        for _ in range(2000):
+            start, end = _window()
+            free_seat_times.append(_timed(reservations.free_seats, start, end)[0])
+            day = start.replace(hour=reservations.OPENING_HOUR, minute=0)
+            free_slot_times.append(_timed(reservations.free_slots, rng.choice(seats), day,
+                                          day.replace(hour=reservations.CLOSING_HOUR))[0])
+
+        # Check-in lookups at moments moving forward through the week, as a
+        # clock would (unclaimed bookings are released as no-shows on the way)
+        for moment in sorted(_window()[0].timestamp() for _ in range(2000)):
+            active_times.append(_timed(reservations.active_for, f"user{rng.randrange(args.users)}", moment)[0])
+            reserved_times.append(_timed(reservations.reserved_now, moment)[0])
+
+        # Cold start: fold the whole log back into memory
+        book = reservations._book()
+        for structure in (book.by_id, book.by_seat, book.by_user):
+            structure.clear()
+        book.no_show_heap.clear()
+        book.scan["size"] = 0
+        replay_time, _ = _timed(reservations._sync, book)
+        log_writer.flush()
+
+        print(f"{days} days x {args.per_day} attempts, {args.seats} seats, {args.users} users")
+        print(f"  booked {booked}, rejected {conflicts} ({booked / days:.0f} bookings per day)")
+        _report("book", book_times)
+        _report("free_seats", free_seat_times)
+        _report("free_slots", free_slot_times)
+        _report("active_for", active_times)
+        _report("reserved_now", reserved_times)
+        log_size = reservations.RESERVATIONS_FILE.stat().st_size
+        print(f"  replay of {log_size / 1e6:.1f} MB log: {replay_time:.2f} s")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
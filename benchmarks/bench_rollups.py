@@ -0,0 +1,114 @@
+"""Monthly usage reports from the rollup files versus a scan of the raw log.
+
+Runs on a scratch copy of the project (code only), so the real logs are never
+touched. Fills the check-in log with --days of sessions through the offline
+sync path, finalizes the past days into monthly rollup files, then times
+monthly_report for last month against pairing up the same month straight from
+the log (what a report without rollups has to do).
+
+Usage:
+    python benchmarks/bench_rollups.py [--days 60] [--per-day 3000] [--users 5000]
+"""
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _scratch_project() -> Path:
+    root = Path(tempfile.mkdtemp(prefix="bench_rollups_"))
+    for path in PROJECT_ROOT.glob("*.py"):
+        shutil.copy2(path, root)
+    (root / "data").mkdir()
+    for path in (PROJECT_ROOT / "data").glob("*.py"):
+        shutil.copy2(path, root / "data")
+    return root
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def _raw_month(checkin_log, first: datetime, last: datetime) -> tuple:
+    """(check-ins, seconds, unique users) of [first, last) from the raw log."""
+    checkins, seconds, users, open_since = 0, 0.0, set(), {}
+    for record in checkin_log.iter_checkins():
+        moment = datetime.strptime(record["timestamp"], checkin_log.TIMESTAMP_FORMAT)
+        if record["status"] == "checked_in":
+            open_since[record["username"]] = moment
+            continue
+        began = open_since.pop(record["username"], None)
+        if began is None:
+            continue
+        start, end = max(began, first), min(moment, last)
+        if end > start:
+            seconds += (end - start).total_seconds()
+            users.add(record["username"])
+        checkins += first <= began < last
+    return checkins, round(seconds), len(users)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark monthly reports from usage rollups.")
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--per-day", type=int, default=3000, help="sessions per day")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    root = _scratch_project()
+    sys.path[:0] = [str(root / "data"), str(root)]
+    try:
+        import checkin_log
+        import log_writer
+        import usage_rollups
+
+        rng = random.Random(args.seed)
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        sequence = 0
+        for offset in range(args.days, 0, -1):
+            day = today - timedelta(days=offset)
+            events = []
+            for _ in range(args.per_day):
+                sequence += 1
+                username = f"user{rng.randrange(args.users)}"
+                start = day + timedelta(hours=rng.randint(7, 20), minutes=rng.randrange(60))
+                end = start + timedelta(minutes=rng.randint(15, 240))
+                for kind, moment in (("check_in", start), ("check_out", end)):
+                    events.append({"client_id": f"{kind}-{sequence}", "username": username, "type": kind,
+                                   "timestamp": moment.strftime(checkin_log.TIMESTAMP_FORMAT)})
+            checkin_log.ingest_events(events)
+        log_writer.flush()
+
+        finalize_time, _ = _timed(usage_rollups.finalize_due)
+        month = today.replace(day=1) - timedelta(days=1)
+        first = month.replace(day=1)
+        last = today.replace(day=1)
+        report_time, report = _timed(usage_rollups.monthly_report, month.year, month.month)
+        raw_time, raw = _timed(_raw_month, checkin_log, first, last)
+        rollup_file = usage_rollups.ROLLUP_DIR / f"usage-{month:%Y-%m}.json"
+
+        print(f"{args.days} days x {args.per_day} sessions, {args.users} users")
+        print(f"  log {checkin_log.CHECKIN_FILE.stat().st_size / 1e6:.1f} MB, "
+              f"rollup file for {month:%Y-%m} {rollup_file.stat().st_size / 1e3:.0f} kB")
+        print(f"  first finalize (whole history): {finalize_time:.2f} s")
+        print(f"  monthly_report from rollups:    {1e3 * report_time:8.1f} ms")
+        print(f"  same month from the raw log:    {1e3 * raw_time:8.1f} ms")
+        same = (report["checkins"], report["seconds"], report["unique_users"]) == raw
+        print(f"  totals match: {same} ({report['checkins']} check-ins, {report['hours']} h, "
+              f"{report['unique_users']} users)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,327 @@
+import json
+import threading
+from pathlib import Path
+from datetime import datetime
+from log_store import append_record, iter_records, iter_records_reverse, write_segment, read_segment_header, iter_segment
+from log_index import iter_range, byte_range, drop_index
+from mmap_reader import MappedLog
+import anomaly_engine
+import log_writer
+from records import ActivityEvent
+from storage import atomic_write_json, after_commit, cached, get_lock, file_lock
+
+LEGACY_ACTIVITY_FILE = Path(__file__).parent / "activity_log.json"
+ACTIVITY_DIR = Path(__file__).parent / "activity"
+MANIFEST_FILE = ACTIVITY_DIR / "manifest.json"
+TIMESTAMP_FORMAT = "%m/%d/%Y, %I:%M:%S %p"
+
+# Retention tiers: events are partitioned by "month" or "day". Only the current
+# partition stays as a plain (hot) file; older ones are sealed into gzip segments.
+PARTITION_BY = "month"
+
+# Readers wait at most this long for queued events to be written (read-your-writes)
+READ_FLUSH_TIMEOUT = 1.0
+
+_last_sealed_key = None
+_seal_lock = threading.Lock()
+_backfill_lock = threading.Lock()
+_backfilled = False
+
+
+def parse_timestamp(timestamp: str):
+    """Parse a stored activity timestamp. Returns None if it can't be parsed."""
+    try:
+        return datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+    except Exception:
+        return None
+
+
+def classify_status(event_type: str, description: str = "") -> str:
+    """Derive the audit status (Success/Failed/Locked/Timeout) of an event."""
+    event_type = (event_type or "").lower()
+    if "failed" in event_type or "denied" in (description or "").lower():
+        return "Failed"
+    if "locked" in event_type:
+        return "Locked"
+    if "timeout" in event_type:
+        return "Timeout"
+    return "Success"
+
+
+def _partition_key(moment: datetime) -> str:
+    if PARTITION_BY == "day":
+        return moment.strftime("%Y-%m-%d")
+    return moment.strftime("%Y-%m")
+
+
+def _partition_bounds(key: str) -> tuple:
+    """Return the [start, end) datetime range covered by a partition key."""
+    if len(key) == 10:
+        start = datetime.strptime(key, "%Y-%m-%d")
+        return start, datetime.fromordinal(start.toordinal() + 1)
+    start = datetime.strptime(key, "%Y-%m")
+    if start.month == 12:
+        return start, start.replace(year=start.year + 1, month=1)
+    return start, start.replace(month=start.month + 1)
+
+
+def _hot_path(key: str) -> Path:
+    return ACTIVITY_DIR / f"{key}.jsonl"
+
+
+def _segment_path(key: str) -> Path:
+    return ACTIVITY_DIR / f"{key}.jsonl.gz"
+
+
+def _load_manifest() -> dict:
+    if not MANIFEST_FILE.exists():
+        return {}
+    try:
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _save_manifest(manifest: dict):
+    atomic_write_json(MANIFEST_FILE, manifest)
+
+
+def _migrate_legacy():
+    """Import the old single-file activity_log.json into partitions once."""
+    manifest = _load_manifest()
+    if manifest.get("legacy_imported"):
+        return
+    if LEGACY_ACTIVITY_FILE.exists():
+        try:
+            with open(LEGACY_ACTIVITY_FILE, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+        except Exception:
+            legacy = []
+        # The legacy file is newest-first; partitions are append-ordered
+        for record in reversed(legacy):
+            moment = parse_timestamp(record.get("timestamp", ""))
+            if moment is None:
+                continue
+            append_record(_hot_path(_partition_key(moment)), record)
+    manifest["legacy_imported"] = True
+    _save_manifest(manifest)
+
+
+def list_partitions() -> list:
+    """Return (key, path, sealed) for every partition, oldest first.
+    A hot file next to a sealed segment of the same key holds events that were
+    appended after the month was sealed; it follows its segment until the next
+    seal folds it in."""
+    _migrate_legacy()
+    # Readers see every event logged before the call (read-your-writes), unless
+    # the writer is stuck: then they don't wait on it for long
+    log_writer.flush(READ_FLUSH_TIMEOUT)
+    partitions = [(path.name[:-len(".jsonl")], path, False) for path in ACTIVITY_DIR.glob("*.jsonl")]
+    partitions += [(path.name[:-len(".jsonl.gz")], path, True) for path in ACTIVITY_DIR.glob("*.jsonl.gz")]
+    return sorted(partitions, key=lambda partition: (partition[0], not partition[2]))
+
+
+def _summarize(key: str, records: list) -> dict:
+    by_event = {}
+    by_status = {}
+    for record in records:
+        event_type = record.get("event_type", "Unknown")
+        status = classify_status(event_type, record.get("description", ""))
+        by_event[event_type] = by_event.get(event_type, 0) + 1
+        by_status[status] = by_status.get(status, 0) + 1
+    return {
+        "partition": key,
+        "count": len(records),
+        "first": records[0].get("timestamp") if records else None,
+        "last": records[-1].get("timestamp") if records else None,
+        "by_event": by_event,
+        "by_status": by_status,
+    }
+
+
+def seal_old_partitions(now: datetime = None):
+    """Compress every partition older than the current one into a read-only segment.
+    Each partition is sealed under its write lock and file lock, so appends and
+    other processes sealing the same month wait for it."""
+    current_key = _partition_key(now or datetime.now())
+    for key, path, sealed in list_partitions():
+        if sealed or key >= current_key:
+            continue
+        with get_lock(path).write(), file_lock(path):
+            # Another process may have sealed it while we waited
+            if not path.exists():
+                continue
+            segment = _segment_path(key)
+            # Late events (appended after the month was sealed) join its segment
+            records = list(iter_segment(segment)) if segment.exists() else []
+            records += iter_records(path)
+            write_segment(segment, _summarize(key, records), records)
+            path.unlink()
+            drop_index(path)
+
+
+def _housekeeping(now: datetime):
+    """Seal the partitions before now's and backfill the anomaly engine. Runs on
+    the log writer thread, ahead of the events queued after it."""
+    try:
+        seal_old_partitions(now)
+    except Exception:
+        pass
+    # Backfill before the new events are written, so they aren't replayed twice
+    _ensure_anomaly_backfill()
+
+
+def _prepare_append(now: datetime) -> Path:
+    """Returns the hot partition path. On the first append and at each partition
+    rollover the seal/backfill housekeeping is queued on the writer thread, so
+    the caller never waits on it."""
+    global _last_sealed_key
+    key = _partition_key(now)
+    with _seal_lock:
+        rollover = _last_sealed_key != key
+        _last_sealed_key = key
+    if rollover:
+        log_writer.submit(lambda: _housekeeping(now))
+    return _hot_path(key)
+
+
+def _new_record(event_type: str, username: str, description: str, ip_address: str, now: datetime,
+                room: str = None) -> dict:
+    record = {
+        "event_type": event_type,
+        "username": username,
+        "timestamp": now.strftime(TIMESTAMP_FORMAT),
+        "description": description,
+    }
+    if ip_address:
+        record["ip_address"] = ip_address
+    if room:
+        record["room"] = room
+    return record
+
+
+def log_activity(event_type: str, username: str, description: str = "", ip_address: str = None, room: str = None):
+    """Queue an activity event for the current (hot) partition and return at once.
+    The background writer appends it (group-committed with other events) and then
+    runs it through the streaming anomaly rules. room tags events that happened
+    in one study room (check-ins/outs), for the audit view's room filter."""
+    now = datetime.now()
+    record = _new_record(event_type, username, description, ip_address, now, room)
+    path = _prepare_append(now)
+    # Inside a unit of work the event is only queued once the unit commits
+    after_commit(lambda: log_writer.enqueue(path, record, on_written=anomaly_engine.process_event))
+
+
+def log_activities(events: list, ip_address: str = None):
+    """Log several (event_type, username, description[, room]) events as one
+    batched append, e.g. the per-user audit trail of a bulk admin action."""
+    now = datetime.now()
+    records = [_new_record(*event[:3], ip_address, now, *event[3:4]) for event in events]
+    if not records:
+        return
+    path = _prepare_append(now)
+    after_commit(lambda: log_writer.enqueue_many(path, records, on_written=anomaly_engine.process_event))
+
+
+def get_partition_summaries() -> list:
+    """Return the summary of each partition (header only for sealed segments)."""
+    summaries = []
+    for key, path, sealed in list_partitions():
+        if sealed:
+            summaries.append(read_segment_header(path))
+        else:
+            summaries.append(_summarize(key, list(iter_records(path))))
+    return summaries
+
+
+def _in_range(record, start: datetime, end: datetime) -> bool:
+    moment = parse_timestamp(record.get("timestamp", ""))
+    return moment is not None and not (start and moment < start) and not (end and moment >= end)
+
+
+def iter_activities(start: datetime = None, end: datetime = None, event_type: str = None, username: str = None,
+                    room: str = None):
+    """Yield events oldest first, opening only partitions overlapping [start, end).
+    Hot partitions are range-read through their timestamp index; with an
+    event_type/username/room filter the indexed byte range is memory-mapped and
+    only matching records are decoded."""
+    equals = {}
+    if event_type:
+        equals["event_type"] = event_type
+    if username:
+        equals["username"] = username
+    if room:
+        equals["room"] = room
+
+    for key, path, sealed in list_partitions():
+        part_start, part_end = _partition_bounds(key)
+        if (start and part_end <= start) or (end and part_start >= end):
+            continue
+        if sealed:
+            for record in iter_segment(path):
+                if any(record.get(field) != value for field, value in equals.items()):
+                    continue
+                if (start or end) and not _in_range(record, start, end):
+                    continue
+                yield record
+        elif equals:
+            first, stop = byte_range(path, start, end)
+            with MappedLog(path) as log:
+                for record in log.records(first, stop):
+                    if any(record.get(field) != value for field, value in equals.items()):
+                        continue
+                    if (start or end) and not _in_range(record, start, end):
+                        continue
+                    yield record.to_dict()
+        else:
+            yield from iter_range(path, start, end)
+
+
+def count_activities(start: datetime = None, end: datetime = None) -> int:
+    """Count events in [start, end), e.g. the dashboard's "today" window."""
+    return cached(("count_activities", start, end), lambda: sum(1 for _ in iter_activities(start, end)))
+
+
+def get_recent_activities(limit: int = 50) -> list:
+    """Return the newest events first as ActivityEvent records, reading the hot
+    partition backwards from its end and opening older partitions only if needed."""
+    return cached(("recent_activities", limit), lambda: _read_recent(limit))
+
+
+def _read_recent(limit: int) -> list:
+    result = []
+    for key, path, sealed in reversed(list_partitions()):
+        if sealed:
+            records = reversed(list(iter_segment(path)))
+        else:
+            records = iter_records_reverse(path)
+        for record in records:
+            result.append(ActivityEvent.from_dict(record))
+            if len(result) >= limit:
+                return result
+    return result
+
+
+def _ensure_anomaly_backfill():
+    """Replay history through the anomaly engine once, the first time it runs."""
+    global _backfilled
+    if _backfilled:
+        return
+    with _backfill_lock:
+        # Another session may have finished the backfill while we waited
+        if anomaly_engine.needs_backfill():
+            anomaly_engine.rebuild(list(iter_activities()))
+        _backfilled = True
+
+
+def count_anomalies() -> int:
+    """Number of anomalies flagged by the streaming rule engine (precomputed)."""
+    _ensure_anomaly_backfill()
+    return cached("count_anomalies", anomaly_engine.count_anomalies)
+
+
+def get_flagged_events() -> dict:
+    """Map of event key -> rules that flagged it."""
+    _ensure_anomaly_backfill()
+    return cached("flagged_events", anomaly_engine.get_flagged_events)
@@ -0,0 +1,175 @@
+import threading
+from collections import deque
+from pathlib import Path
+from datetime import datetime
+from log_store import append_record, iter_records
+from storage import SharedState
+
+ANOMALIES_FILE = Path(__file__).parent / "anomalies.jsonl"
+STATE_FILE = Path(__file__).parent / "anomaly_state.json"
+TIMESTAMP_FORMAT = "%m/%d/%Y, %I:%M:%S %p"
+
+# --- Rule configuration ---
+# "N failed logins in M seconds" for one user, and for one IP across users
+FAILED_LOGIN_LIMIT = 3
+FAILED_LOGIN_WINDOW = 300
+IP_FAILED_LOGIN_LIMIT = 10
+# System-wide failed-login spike, counted in one-minute buckets
+SPIKE_BUCKET_SECONDS = 60
+SPIKE_BUCKETS = 5
+SPIKE_LIMIT = 20
+# Check-ins are expected between these hours (24h clock, end exclusive)
+OPENING_HOUR = 7
+CLOSING_HOUR = 22
+# Bound the remembered IPs per user so state can't grow without limit
+MAX_KNOWN_IPS = 20
+
+_lock = threading.Lock()
+# Sliding windows of event times; entries older than the window are dropped on
+# each insert, so every event costs O(1) amortized.
+_user_failures = {}
+_ip_failures = {}
+_spike_buckets = deque(maxlen=SPIKE_BUCKETS)  # [bucket_start, count]
+# Flag counts and known IPs, shared with the kiosk API process (merged on save)
+_state = SharedState(STATE_FILE, lambda: {"total": 0, "by_rule": {}, "known_ips": {}})
+
+
+def event_key(event: dict) -> str:
+    """Identity of an activity event, used to link flags back to audit rows."""
+    return f"{event.get('timestamp')}|{event.get('username')}|{event.get('event_type')}"
+
+
+def _slide(window: deque, now: float, span: float):
+    window.append(now)
+    while window and window[0] <= now - span:
+        window.popleft()
+    return len(window)
+
+
+def _spike_count(now: float) -> int:
+    bucket_start = now - (now % SPIKE_BUCKET_SECONDS)
+    if _spike_buckets and _spike_buckets[-1][0] == bucket_start:
+        _spike_buckets[-1][1] += 1
+    else:
+        _spike_buckets.append([bucket_start, 1])
+    oldest = bucket_start - SPIKE_BUCKET_SECONDS * (SPIKE_BUCKETS - 1)
+    return sum(count for start, count in _spike_buckets if start >= oldest)
+
+
+def _evaluate(event: dict, now: datetime) -> list:
+    """Run every rule against one event. Returns (rule, detail) pairs."""
+    fired = []
+    event_type = event.get("event_type", "")
+    username = (event.get("username") or "").lower()
+    ip_address = event.get("ip_address")
+    epoch = now.timestamp()
+
+    if event_type == "login_failed":
+        window = _user_failures.setdefault(username, deque())
+        count = _slide(window, epoch, FAILED_LOGIN_WINDOW)
+        if count >= FAILED_LOGIN_LIMIT:
+            fired.append(("failed_login_burst", f"{count} failed logins for {username} in {FAILED_LOGIN_WINDOW}s"))
+        if ip_address:
+            window = _ip_failures.setdefault(ip_address, deque())
+            count = _slide(window, epoch, FAILED_LOGIN_WINDOW)
+            if count >= IP_FAILED_LOGIN_LIMIT:
+                fired.append(("ip_failed_login_burst", f"{count} failed logins from {ip_address} in {FAILED_LOGIN_WINDOW}s"))
+        count = _spike_count(epoch)
+        if count >= SPIKE_LIMIT:
+            fired.append(("failed_login_spike", f"{count} failed logins system-wide in {SPIKE_BUCKET_SECONDS * SPIKE_BUCKETS}s"))
+
+    elif event_type == "login_success" and ip_address:
+        def _remember_ip(state):
+            """Whether the IP is new for a user who already had others."""
+            known = state["known_ips"].setdefault(username, [])
+            if ip_address in known:
+                return False
+            known.append(ip_address)
+            del known[:-MAX_KNOWN_IPS]
+            return len(known) > 1
+
+        # Checked again under the file lock, in case the other process just saw it
+        if ip_address not in _state.read()["known_ips"].get(username, []) and _state.update(_remember_ip, force=True):
+            fired.append(("new_ip_login", f"{username} logged in from new IP {ip_address}"))
+
+    elif event_type.startswith("anomaly_"):
+        # Statistical outliers (usage_stats) arrive as events of their own
+        fired.append(("statistical_outlier", event.get("description", "")))
+
+    elif event_type == "check_in":
+        if not OPENING_HOUR <= now.hour < CLOSING_HOUR:
+            fired.append(("after_hours_checkin", f"{username} checked in at {now.strftime('%I:%M %p')}"))
+
+    return fired
+
+
+def process_event(event: dict) -> list:
+    """Evaluate one activity event as it arrives and persist any flags raised."""
+    try:
+        now = datetime.strptime(event.get("timestamp", ""), TIMESTAMP_FORMAT)
+    except Exception:
+        now = datetime.now()
+
+    with _lock:
+        fired = _evaluate(event, now)
+        if not fired:
+            return []
+        flags = []
+        for rule, detail in fired:
+            flag = {
+                "rule": rule,
+                "event_key": event_key(event),
+                "username": event.get("username"),
+                "timestamp": event.get("timestamp"),
+                "detail": detail,
+            }
+            append_record(ANOMALIES_FILE, flag)
+            flags.append(flag)
+
+        def _count(state):
+            for rule, _ in fired:
+                state["total"] = state.get("total", 0) + 1
+                state["by_rule"][rule] = state["by_rule"].get(rule, 0) + 1
+
+        _state.update(_count)
+    return flags
+
+
+def count_anomalies() -> int:
+    """Number of anomaly flags raised so far (precomputed, no log scan)."""
+    return _state.read().get("total", 0)
+
+
+def get_anomaly_counts() -> dict:
+    """Flag counts per rule."""
+    return dict(_state.read().get("by_rule", {}))
+
+
+def get_flagged_events() -> dict:
+    """Map of event_key -> list of rules that flagged it, for the audit view."""
+    flagged = {}
+    for flag in iter_records(ANOMALIES_FILE):
+        flagged.setdefault(flag.get("event_key"), []).append(flag.get("rule"))
+    return flagged
+
+
+def rebuild(events):
+    """Recompute all flags from scratch by replaying `events` oldest first.
+    Used once to backfill history logged before the engine existed."""
+    def _reset(state):
+        state.clear()
+        state.update({"total": 0, "by_rule": {}, "known_ips": {}})
+
+    with _lock:
+        _user_failures.clear()
+        _ip_failures.clear()
+        _spike_buckets.clear()
+        if ANOMALIES_FILE.exists():
+            ANOMALIES_FILE.unlink()
+        _state.update(_reset, force=True)
+    for event in events:
+        process_event(event)
+
+
+def needs_backfill() -> bool:
+    return not STATE_FILE.exists()
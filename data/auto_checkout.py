@@ -0,0 +1,163 @@
+"""Auto check-out of forgotten sessions.
+
+Every open session gets a deadline: MAX_SESSION_HOURS after its check-in, or
+the next closing time if that comes first. Deadlines sit in a min-heap; one
+background thread sleeps until the earliest one and checks out every session
+that is due in a single batch (one log write plus one audit event per user).
+
+Check-ins of this process reach the heap through checkin_log's write events.
+Those written by another process (the kiosk API) are picked up from the rooms'
+heads indexes: the thread wakes at least every POLL_SECONDS and schedules any
+open session it doesn't have yet. The same sync at start restores sessions
+left open while the app was down, at their original deadline. Entries are never
+removed: a session that was checked out by hand (or checked in again) is
+skipped when its deadline comes up.
+
+The same thread runs the daily usage jobs (scoring yesterday, finalizing the
+usage rollups) so they never hold up a check-in; both are no-ops once done for
+the day, and only one process does each day's work.
+"""
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+
+import checkin_log
+import usage_rollups
+import usage_stats
+from anomaly_engine import CLOSING_HOUR
+
+MAX_SESSION_HOURS = 12
+# Most sessions checked out in one log write
+BATCH_SIZE = 500
+# Wait before retrying after a failed batch (e.g. the log is locked)
+RETRY_SECONDS = 30
+# Longest wait before looking for sessions another process checked in
+POLL_SECONDS = 30
+
+# (deadline epoch, room, username, check_in_time, reason)
+_heap = []
+# (room, username, check_in_time) of every session on the heap
+_scheduled = set()
+# room -> (size, inode) of the heads index at the last sync
+_synced = {}
+_wakeup = threading.Condition()
+_thread = None
+
+
+def deadline_for(check_in: datetime) -> tuple:
+    """(deadline, reason) for a session that started at check_in."""
+    longest = check_in + timedelta(hours=MAX_SESSION_HOURS)
+    closing = check_in.replace(hour=CLOSING_HOUR, minute=0, second=0, microsecond=0)
+    if closing <= check_in:
+        closing += timedelta(days=1)
+    if closing < longest:
+        return closing, "closing time"
+    return longest, f"session over {MAX_SESSION_HOURS} hours"
+
+
+def _schedule(room: str, username: str, check_in_time: str):
+    check_in = checkin_log._parse_moment(check_in_time)
+    if check_in is None:
+        return
+    deadline, reason = deadline_for(check_in)
+    entry = (deadline.timestamp(), room, username, check_in_time, reason)
+    with _wakeup:
+        if (room, username, check_in_time) in _scheduled:
+            return
+        _scheduled.add((room, username, check_in_time))
+        heapq.heappush(_heap, entry)
+        # Only an entry that is now the earliest changes how long the thread sleeps
+        if _heap[0] is entry:
+            _wakeup.notify()
+
+
+def _on_records(records: list):
+    for record in records:
+        if record.get("status") == "checked_in":
+            _schedule(record.get("room") or checkin_log.DEFAULT_ROOM, record["username"], record.get("check_in_time"))
+
+
+def _sync():
+    """Schedule every session the rooms' heads indexes show as open (loading
+    them catches up with the logs). Rooms whose log hasn't changed since the
+    last sync are skipped."""
+    for room in checkin_log.rooms():
+        heads = checkin_log._load_heads(room)
+        signature = (heads["size"], heads.get("inode"))
+        if _synced.get(room) == signature:
+            continue
+        for username, head in list(heads["users"].items()):
+            if head.get("status") == "checked_in":
+                _schedule(room, username, head.get("check_in_time"))
+        _synced[room] = signature
+
+
+def _pop_due(now: float) -> list:
+    """Take up to BATCH_SIZE due entries off the heap. Caller holds _wakeup."""
+    due = []
+    while _heap and _heap[0][0] <= now and len(due) < BATCH_SIZE:
+        deadline, room, username, check_in_time, reason = heapq.heappop(_heap)
+        _scheduled.discard((room, username, check_in_time))
+        due.append((room, username, check_in_time, datetime.fromtimestamp(deadline), reason))
+    return due
+
+
+def run_due(now: float = None) -> list:
+    """Check out every session whose deadline has passed. Returns the records written."""
+    written = []
+    while True:
+        with _wakeup:
+            due = _pop_due(now or time.time())
+        if not due:
+            return written
+        try:
+            written.extend(checkin_log.auto_check_out(due))
+        except Exception:
+            # Put the batch back so the next pass retries it
+            with _wakeup:
+                for room, username, check_in_time, moment, reason in due:
+                    _scheduled.add((room, username, check_in_time))
+                    heapq.heappush(_heap, (moment.timestamp(), room, username, check_in_time, reason))
+            raise
+
+
+def run_daily_jobs():
+    """Score yesterday's sessions and finalize past days' usage rollups.
+    Each is best-effort and a cheap no-op after its first run of the day."""
+    for job in (usage_stats.score_previous_day, usage_rollups.finalize_due):
+        try:
+            job()
+        except Exception:
+            pass
+
+
+def _run():
+    while True:
+        run_daily_jobs()
+        with _wakeup:
+            if not _heap or _heap[0][0] > time.time():
+                _wakeup.wait(min(POLL_SECONDS, _heap[0][0] - time.time()) if _heap else POLL_SECONDS)
+        try:
+            _sync()
+            run_due()
+        except Exception:
+            time.sleep(RETRY_SECONDS)
+
+
+def start():
+    """Restore open sessions from the heads indexes and start the scheduler thread
+    (once), which also runs the daily usage jobs."""
+    global _thread
+    with _wakeup:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_run, name="auto-checkout", daemon=True)
+    checkin_log.subscribe(_on_records)
+    _sync()
+    _thread.start()
+
+
+def pending() -> int:
+    """Number of scheduled deadlines (including ones for sessions already closed)."""
+    return len(_heap)
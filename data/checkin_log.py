@@ -1,103 +1,786 @@
+import atexit
+import heapq
 import json
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime, timedelta
+from log_store import append_record, read_record_at, iter_records, iter_records_reverse, replace_log
+from log_index import iter_range, drop_index
+from activity_log import log_activity, log_activities
+import occupancy
+import reservations
+import usage_stats
+import usage_rollups
+from records import CheckinEvent
+from storage import atomic_write_json, get_lock, file_lock
+from occupancy import DEFAULT_ROOM
 
-CHECKIN_FILE = Path(__file__).parent / "checkin_log.json"
+DATA_DIR = Path(__file__).parent
+LEGACY_CHECKIN_FILE = DATA_DIR / "checkin_log.json"
+# Check-ins are partitioned by room: each room has its own log, heads index and
+# lock, so a room's check-ins never read or wait on another room's files.
+# Append-ordered (oldest first) JSON-lines log of DEFAULT_ROOM (other rooms use
+# checkin_log.<room>.jsonl). Every record carries `prev`, the byte offset of the
+# same user's previous record in that log, so one user's history is a chain.
+CHECKIN_FILE = DATA_DIR / "checkin_log.jsonl"
+# Per-user head of that chain plus the current status, so status lookups and
+# "last N for this user" never scan other users' records (checkin_heads.<room>.json
+# for other rooms).
+HEADS_FILE = DATA_DIR / "checkin_heads.json"
+TIMESTAMP_FORMAT = "%m/%d/%Y, %I:%M:%S %p"
+# The heads file is only a checkpoint (_load_heads replays the log past it), so it
+# is rewritten at most this often (and at exit) instead of on every append
+HEADS_SAVE_INTERVAL = 1.0
+# Offline events stamped further than this in the future are rejected
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+EVENT_STATUSES = {"check_in": "checked_in", "check_out": "checked_out"}
 
 
-def _load_checkins():
-    """Load all check-in records from the log file."""
-    if not CHECKIN_FILE.exists():
-        return []
+class _Partition:
+    """One room's check-in log with its heads index, lock and client-id cache."""
+    __slots__ = ("room", "log_file", "heads_file", "heads", "saved_at", "lock", "client_ids", "client_ids_scan")
+
+    def __init__(self, room: str):
+        self.room = room
+        if room == DEFAULT_ROOM:
+            self.log_file, self.heads_file = CHECKIN_FILE, HEADS_FILE
+        else:
+            self.log_file = DATA_DIR / f"checkin_log.{room}.jsonl"
+            self.heads_file = DATA_DIR / f"checkin_heads.{room}.json"
+        self.heads = None
+        self.saved_at = 0.0
+        # Guards the in-memory heads: catching up from the log and appending must
+        # not interleave between sessions
+        self.lock = threading.RLock()
+        # client_id of every synced offline event in the log, scanned incrementally
+        self.client_ids = set()
+        self.client_ids_scan = {"size": 0, "inode": None}
+
+
+# room id -> _Partition
+_partitions = {}
+_partitions_guard = threading.Lock()
+
+# Called with the records of every successful check-in/out write (see subscribe)
+_listeners = []
+
+
+def _partition(room: str = None) -> _Partition:
+    """The partition of room (DEFAULT_ROOM if None). Raises ValueError for a room
+    that isn't configured."""
+    room = room or DEFAULT_ROOM
+    part = _partitions.get(room)
+    if part is None:
+        occupancy.get_settings(room)
+        with _partitions_guard:
+            part = _partitions.setdefault(room, _Partition(room))
+    return part
+
+
+def rooms() -> list:
+    """Ids of the configured rooms, DEFAULT_ROOM first."""
+    return list(occupancy.get_rooms())
+
+
+def _migrate_legacy():
+    """Import the old newest-first checkin_log.json into the append-ordered log once."""
+    if CHECKIN_FILE.exists() or not LEGACY_CHECKIN_FILE.exists():
+        return
     try:
-        with open(CHECKIN_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(LEGACY_CHECKIN_FILE, "r", encoding="utf-8") as f:
+            legacy = json.load(f)
     except Exception:
-        return []
-
-
-def _save_checkins(checkins: list):
-    """Save check-in records to the log file."""
-    with open(CHECKIN_FILE, "w", encoding="utf-8") as f:
-        json.dump(checkins, f, indent=2)
-
-
-def get_current_status(username: str) -> dict:
-    """Get the current check-in status for a user."""
-    checkins = _load_checkins()
-    
-    # Find the most recent check-in/out for this user
-    user_records = [c for c in checkins if c.get("username") == username]
-    
-    if not user_records:
-        return {"status": "checked_out", "check_in_time": None}
-    
-    last_record = user_records[0]  # Most recent first
+        legacy = []
+    heads = {}
+    for record in reversed(legacy):
+        username = record.get("username")
+        record["prev"] = heads.get(username)
+        heads[username] = append_record(CHECKIN_FILE, record)
+    # Make sure the file exists even if the legacy log was empty
+    CHECKIN_FILE.touch()
+
+
+def _apply_to_heads(heads: dict, record: dict, offset: int):
+    username = record.get("username")
+    head = heads["users"].setdefault(username, {"checkins": 0})
+    was_in = head.get("status") == "checked_in"
+    head["offset"] = offset
+    head["status"] = record.get("status", "checked_out")
+    # Occupancy counter: users currently checked in
+    heads["active"] += (head["status"] == "checked_in") - was_in
+    head["check_in_time"] = record.get("check_in_time")
+    head["timestamp"] = record.get("timestamp")
+    if record.get("status") == "checked_in":
+        head["checkins"] += 1
+
+
+def _replay(part: _Partition, heads: dict):
+    """Fold records appended after the heads were last saved into them."""
+    with open(part.log_file, "rb") as f:
+        f.seek(heads["size"])
+        offset = heads["size"]
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            if line.strip():
+                try:
+                    _apply_to_heads(heads, json.loads(line), offset)
+                except Exception:
+                    pass
+            offset += len(line)
+        heads["size"] = offset
+
+
+def _log_signature(part: _Partition) -> tuple:
+    """(size, inode) of a room's log. A rewrite (ingest_events merging older
+    events) replaces the file, so a changed inode means offsets from before are stale."""
+    try:
+        stat = part.log_file.stat()
+    except OSError:
+        return 0, None
+    return stat.st_size, stat.st_ino
+
+
+def _load_heads(room: str = None) -> dict:
+    """Load a room's per-user heads index, catching up with its log if it is behind."""
+    return _load_part(_partition(room))
+
+
+def _load_part(part: _Partition) -> dict:
+    # Up to date: no lock needed, so a look at another room's heads (current_room)
+    # never waits on that room's writers
+    heads = part.heads
+    if heads is not None and (heads["size"], heads.get("inode")) == _log_signature(part):
+        return heads
+    with part.lock:
+        if part.room == DEFAULT_ROOM:
+            _migrate_legacy()
+        size, inode = _log_signature(part)
+        if part.heads is not None and part.heads["size"] == size and part.heads.get("inode") == inode:
+            return part.heads
+
+        heads = part.heads
+        if heads is None:
+            try:
+                with open(part.heads_file, "r", encoding="utf-8") as f:
+                    heads = json.load(f)
+            except Exception:
+                heads = None
+        if not heads or heads.get("size", 0) > size or heads.get("inode", inode) != inode:
+            # Missing, corrupt or the log was rewritten: rebuild from scratch
+            heads = {"size": 0, "users": {}, "active": 0}
+        if "active" not in heads:
+            # Saved before the occupancy counter existed
+            heads["active"] = sum(1 for head in heads["users"].values() if head.get("status") == "checked_in")
+        heads["inode"] = inode
+        if heads["size"] < size:
+            _replay(part, heads)
+            _save_heads(part, heads)
+        part.heads = heads
+        occupancy.update(heads["active"], part.room)
+        return heads
+
+
+def _save_heads(part: _Partition, heads: dict, force: bool = False):
+    now = time.monotonic()
+    if not force and now - part.saved_at < HEADS_SAVE_INTERVAL:
+        return
+    atomic_write_json(part.heads_file, heads, indent=None, fsync=False)
+    part.saved_at = now
+
+
+def _save_pending_heads():
+    for part in list(_partitions.values()):
+        with part.lock:
+            if part.heads is not None:
+                _save_heads(part, part.heads, force=True)
+
+
+atexit.register(_save_pending_heads)
+
+
+@contextmanager
+def _log_write_lock(part: _Partition):
+    """Exclusive write access to a room's log, against this process's threads
+    and against the other process writing it (the kiosk API or the app)."""
+    with get_lock(part.log_file).write():
+        with file_lock(part.log_file):
+            yield
+
+
+def _append(part: _Partition, record: dict):
+    """Append a record to its user's chain and advance the room's heads index."""
+    with part.lock:
+        heads = _load_part(part)
+        try:
+            with _log_write_lock(part):
+                with open(part.log_file, "ab") as f:
+                    f.seek(0, 2)
+                    offset = f.tell()
+                    if offset != heads["size"]:
+                        # Another process appended since the heads were loaded:
+                        # fold its records in first, so they are indexed and prev is right
+                        _replay(part, heads)
+                        offset = heads["size"]
+                    record["prev"] = heads["users"].get(record["username"], {}).get("offset")
+                    line = (json.dumps(record) + "\n").encode("utf-8")
+                    f.write(line)
+            _apply_to_heads(heads, record, offset)
+            heads["size"] = offset + len(line)
+        except BaseException:
+            part.heads = None
+            raise
+        _save_heads(part, heads)
+
+
+def _user_heads(username: str) -> list:
+    """(room, head) of every room the user has records in. One stat and one
+    dict lookup per room."""
+    found = []
+    for room in rooms():
+        head = _load_heads(room)["users"].get(username)
+        if head:
+            found.append((room, head))
+    return found
+
+
+def current_room(username: str):
+    """The room the user is checked in to, or None."""
+    for room, head in _user_heads(username):
+        if head.get("status") == "checked_in":
+            return room
+    return None
+
+
+def get_current_status(username: str, room: str = None) -> dict:
+    """Get the current check-in status for a user in room, or (room None) in
+    whichever room they are checked in to, else the room of their latest record.
+    The result's "room" says which."""
+    if room is None:
+        heads = _user_heads(username)
+        room = next((r for r, head in heads if head.get("status") == "checked_in"), None)
+        if room is None:
+            room = max(heads, key=lambda item: _record_epoch(item[1]))[0] if heads else DEFAULT_ROOM
+    head = _load_heads(room)["users"].get(username)
+
+    if not head:
+        return {"status": "checked_out", "check_in_time": None, "room": room}
+
     return {
-        "status": last_record.get("status", "checked_out"),
-        "check_in_time": last_record.get("check_in_time"),
-        "timestamp": last_record.get("timestamp")
+        "status": head.get("status", "checked_out"),
+        "check_in_time": head.get("check_in_time"),
+        "timestamp": head.get("timestamp"),
+        "room": room,
     }
 
 
+def _format_duration(seconds: float) -> str:
+    hours = int(seconds // 3600)
+    minutes = int(seconds % 3600 // 60)
+    return f"{hours} hour{'s' if hours != 1 else ''} and {minutes} minute{'s' if minutes != 1 else ''}"
+
+
 def calculate_duration(check_in_time_str: str) -> str:
-    """Calculate duration from check-in time to now."""
+    """Calculate duration from check-in time to now (whole days count as hours)."""
     try:
         check_in_time = datetime.strptime(check_in_time_str, "%m/%d/%Y, %I:%M:%S %p")
-        duration = datetime.now() - check_in_time
-        hours = duration.seconds // 3600
-        minutes = (duration.seconds % 3600) // 60
-        return f"{hours} hour{'s' if hours != 1 else ''} and {minutes} minute{'s' if minutes != 1 else ''}"
+        return _format_duration((datetime.now() - check_in_time).total_seconds())
     except:
         return "N/A"
 
 
-def check_in(username: str):
-    """Record a check-in for a user."""
-    checkins = _load_checkins()
-    timestamp = datetime.now().strftime("%m/%d/%Y, %I:%M:%S %p")
-    
+def subscribe(listener):
+    """Call listener(records) after every check-in/out write of this process
+    with the records written (e.g. the auto-checkout scheduler)."""
+    _listeners.append(listener)
+
+
+def _notify(part: _Partition, records: list):
+    with part.lock:
+        active = _load_part(part)["active"]
+    occupancy.update(active, part.room)
+    for listener in list(_listeners):
+        try:
+            listener(records)
+        except Exception:
+            pass
+
+
+def _observe_usage(func, *args):
+    """Usage statistics are best-effort and must never block a check-in/out."""
+    try:
+        func(*args)
+    except Exception:
+        pass
+
+
+def check_in(username: str, room: str = None) -> dict:
+    """Record a check-in for a user in room (DEFAULT_ROOM if None). Returns the
+    appended record. A user with an active reservation there claims it (the
+    record gets its seat); anyone else needs a seat that is neither taken nor
+    reserved, or occupancy.RoomFull is raised. Raises ValueError if the user is
+    checked in to another room."""
+    part = _partition(room)
+    now = datetime.now()
+    timestamp = now.strftime("%m/%d/%Y, %I:%M:%S %p")
+
+    elsewhere = current_room(username)
+    if elsewhere not in (None, part.room):
+        raise ValueError(f"{username} is checked in to {occupancy.room_name(elsewhere)}; check out there first")
+
     record = {
         "username": username,
         "status": "checked_in",
         "check_in_time": timestamp,
-        "timestamp": timestamp
+        "timestamp": timestamp,
+        "room": part.room,
     }
-    
-    checkins.insert(0, record)
-    _save_checkins(checkins)
-
-
-def check_out(username: str):
-    """Record a check-out for a user."""
-    checkins = _load_checkins()
-    timestamp = datetime.now().strftime("%m/%d/%Y, %I:%M:%S %p")
-    
-    # Find the most recent check-in for this user
-    user_records = [c for c in checkins if c.get("username") == username]
-    if user_records and user_records[0].get("status") == "checked_in":
-        check_in_time = user_records[0].get("check_in_time")
-        duration = calculate_duration(check_in_time)
+
+    # Status check, admission and append under the room's lock and its log's file
+    # lock, so concurrent check-ins (from this process or the other one) can't
+    # overfill it; the heads are reloaded under the file lock to see the other's writes
+    with part.lock, file_lock(part.log_file):
+        heads = _load_part(part)
+        reservation = None
+        if heads["users"].get(username, {}).get("status") != "checked_in":
+            reservation = reservations.active_for(username, room=part.room)
+            if reservation is None:
+                occupancy.admit(username, heads["active"],
+                                reservations.reserved_now(exclude=username, room=part.room), part.room)
+        if reservation is not None:
+            record["seat"] = reservation.seat
+            record["reservation"] = reservation.id
+        _append(part, record)
+        if reservation is not None:
+            reservations.claim(reservation.id, room=part.room)
+    _notify(part, [record])
+    # Audit trail; also lets the anomaly rules see check-ins (e.g. outside opening hours)
+    log_activity("check_in", username, f"User {username} checked in to {occupancy.room_name(part.room)}",
+                 room=part.room)
+    _observe_usage(usage_stats.observe_checkin, username, now)
+    return record
+
+
+def check_out(username: str, room: str = None) -> dict:
+    """Record a check-out for a user from room (if None, the room they are
+    checked in to). Returns the appended record. Only a user still checked in
+    when the log is locked ends a session (a duplicate check-out gets "N/A")."""
+    part = _partition(room or current_room(username))
+    now = datetime.now()
+    timestamp = now.strftime("%m/%d/%Y, %I:%M:%S %p")
+
+    # Status, append and session under the log's locks: of two concurrent
+    # check-outs (in either process) only one ends the session, and a rollup
+    # rebuild from the log sees both the record and the session or neither
+    with part.lock, file_lock(part.log_file):
+        # The user's most recent record comes straight from the heads index
+        current = get_current_status(username, part.room)
+        if current.get("status") == "checked_in":
+            duration = calculate_duration(current.get("check_in_time"))
+        else:
+            duration = "N/A"
+
+        record = {
+            "username": username,
+            "status": "checked_out",
+            "check_in_time": None,
+            "duration": duration,
+            "timestamp": timestamp,
+            "room": part.room,
+        }
+        _append(part, record)
+        if current.get("status") == "checked_in":
+            _observe_usage(usage_rollups.add_session, username, current.get("check_in_time"), now, part.room)
+    _notify(part, [record])
+    log_activity("check_out", username, f"User {username} checked out of {occupancy.room_name(part.room)} ({duration})",
+                 room=part.room)
+    if current.get("status") == "checked_in":
+        _observe_usage(usage_stats.observe_session, username, current.get("check_in_time"), now)
+    return record
+
+
+# --- Offline kiosk sync ---
+
+def _parse_moment(value):
+    """Local naive datetime from the log's timestamp format or ISO 8601, else None."""
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.strptime(value, TIMESTAMP_FORMAT)
+    except ValueError:
+        pass
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment.replace(microsecond=0)
+
+
+def _derive(record: dict, state: dict):
+    """Fill a record's check_in_time/duration from the user's state just before it."""
+    if record["status"] == "checked_in":
+        record["check_in_time"] = record["timestamp"]
+        record.pop("duration", None)
+        return
+    record["check_in_time"] = None
+    started = _parse_moment(state.get("check_in_time")) if state.get("status") == "checked_in" else None
+    ended = _parse_moment(record["timestamp"])
+    if started is not None and ended is not None:
+        record["duration"] = _format_duration((ended - started).total_seconds())
     else:
-        duration = "N/A"
-    
-    record = {
-        "username": username,
-        "status": "checked_out",
-        "check_in_time": None,
-        "duration": duration,
-        "timestamp": timestamp
+        record["duration"] = "N/A"
+
+
+def _sync_client_ids(part: _Partition) -> set:
+    """Bring a room's set of already-synced client IDs up to date with its log."""
+    scan = part.client_ids_scan
+    size, inode = _log_signature(part)
+    if inode != scan["inode"] or size < scan["size"]:
+        part.client_ids.clear()
+        scan.update(size=0, inode=inode)
+    if size > scan["size"]:
+        with open(part.log_file, "rb") as f:
+            f.seek(scan["size"])
+            offset = scan["size"]
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                if b'"client_id"' in line:
+                    try:
+                        part.client_ids.add(json.loads(line)["client_id"])
+                    except Exception:
+                        pass
+                offset += len(line)
+        scan["size"] = offset
+    return part.client_ids
+
+
+def _tail_moment(part: _Partition):
+    """Timestamp of the newest record in a room's log, or None if it is empty."""
+    for record in iter_records_reverse(part.log_file):
+        return _parse_moment(record.get("timestamp"))
+    return None
+
+
+def _append_batch(part: _Partition, records: list):
+    """Append records that are all at or after the log's tail with one write."""
+    heads = _load_part(part)
+    try:
+        with _log_write_lock(part):
+            with open(part.log_file, "ab") as f:
+                f.seek(0, 2)
+                offset = f.tell()
+                if offset != heads["size"]:
+                    # Another process appended since the heads were loaded
+                    _replay(part, heads)
+                    offset = heads["size"]
+                chunks = []
+                for record in records:
+                    head = heads["users"].get(record["username"], {})
+                    _derive(record, head)
+                    record["prev"] = head.get("offset")
+                    line = (json.dumps(record) + "\n").encode("utf-8")
+                    _apply_to_heads(heads, record, offset)
+                    chunks.append(line)
+                    offset += len(line)
+                f.write(b"".join(chunks))
+        heads["size"] = offset
+    except BaseException:
+        # The in-memory heads may be ahead of the file: reload them from the log
+        part.heads = None
+        raise
+    _save_heads(part, heads)
+
+
+def _merge_rewrite(part: _Partition, records: list):
+    """Merge records older than the log's tail into it in timestamp order and
+    rewrite the log once. Only the affected users' check_in_time/duration are
+    recomputed; every chain offset is reassigned and the heads are rebuilt."""
+    affected = {record["username"] for record in records}
+    with _log_write_lock(part):
+        merged = []
+        last = 0.0
+        for record in iter_records(part.log_file):
+            moment = _parse_moment(record.get("timestamp"))
+            # A record without a readable timestamp keeps its place
+            last = moment.timestamp() if moment is not None else last
+            merged.append((last, len(merged), record))
+        for record in records:
+            merged.append((_parse_moment(record["timestamp"]).timestamp(), len(merged), record))
+        # Stable on the sequence number: existing records stay ahead of new ones at the same second
+        merged.sort(key=lambda item: (item[0], item[1]))
+
+        states, chains, chunks, offset = {}, {}, [], 0
+        for _, _, record in merged:
+            username = record.get("username")
+            if username in affected:
+                state = states.setdefault(username, {})
+                _derive(record, state)
+                state["status"] = record["status"]
+                state["check_in_time"] = record.get("check_in_time")
+            record["prev"] = chains.get(username)
+            chains[username] = offset
+            line = (json.dumps(record) + "\n").encode("utf-8")
+            chunks.append(line)
+            offset += len(line)
+        replace_log(part.log_file, b"".join(chunks))
+    drop_index(part.log_file)
+    part.heads = None
+    _save_heads(part, _load_part(part), force=True)
+
+
+def ingest_events(events: list, known_users=None) -> dict:
+    """Merge a batch of offline kiosk events into the room logs.
+
+    Each event is {"client_id", "username", "type": "check_in"|"check_out",
+    "timestamp", "room"} (timestamp in log format or ISO 8601, room optional,
+    DEFAULT_ROOM if missing). Events are deduplicated by client_id (against the
+    room's log and within the batch), sorted by timestamp and merged into each
+    room's log in one write: appended when they all come after the log's tail,
+    otherwise the log is rewritten in order. If known_users is given, events for
+    other usernames are rejected.
+
+    Returns {"accepted", "duplicates", "rejected", "results", "users"} where
+    results has one entry per input event, in order, and users the resulting
+    status of every affected user."""
+    results = [None] * len(events)
+    by_room = {}
+    known_rooms = occupancy.get_rooms()
+    now = datetime.now()
+    batch_ids = set()
+    for position, event in enumerate(events):
+        event = event if isinstance(event, dict) else {}
+        client_id = event.get("client_id")
+        username = str(event.get("username") or "").strip().lower()
+        status = EVENT_STATUSES.get(event.get("type"))
+        moment = _parse_moment(event.get("timestamp"))
+        room = event.get("room") or DEFAULT_ROOM
+        error = None
+        if not isinstance(client_id, str) or not client_id:
+            error = "missing client_id"
+        elif not username:
+            error = "missing username"
+        elif known_users is not None and username not in known_users:
+            error = f"unknown user {username}"
+        elif status is None:
+            error = "type must be check_in or check_out"
+        elif moment is None:
+            error = "invalid timestamp"
+        elif moment > now + MAX_CLOCK_SKEW:
+            error = "timestamp is in the future"
+        elif room not in known_rooms:
+            error = f"unknown room {room}"
+        if error:
+            results[position] = {"client_id": client_id, "result": "rejected", "error": error}
+            continue
+        if client_id in batch_ids:
+            results[position] = {"client_id": client_id, "result": "duplicate"}
+            continue
+        batch_ids.add(client_id)
+        record = {
+            "username": username,
+            "status": status,
+            "check_in_time": None,
+            "timestamp": moment.strftime(TIMESTAMP_FORMAT),
+            "client_id": client_id,
+            "room": room,
+        }
+        by_room.setdefault(room, []).append((moment, position, record))
+        results[position] = {"client_id": client_id, "result": "accepted"}
+
+    written = []
+    # Each room's events go into its own log under its own lock
+    for room, accepted in by_room.items():
+        part = _partition(room)
+        with part.lock:
+            seen = _sync_client_ids(part)
+            fresh = []
+            for moment, position, record in accepted:
+                if record["client_id"] in seen:
+                    results[position] = {"client_id": record["client_id"], "result": "duplicate"}
+                else:
+                    fresh.append((moment, position, record))
+            fresh.sort(key=lambda item: (item[0], item[1]))
+            records = [record for _, _, record in fresh]
+            if records:
+                _write_in_order(part, records, fresh[0][0])
+                _observe_usage(usage_rollups.mark_dirty, [moment for moment, _, _ in fresh], part.room)
+                seen.update(record["client_id"] for record in records)
+                part.client_ids_scan["size"], part.client_ids_scan["inode"] = _log_signature(part)
+        if records:
+            _notify(part, records)
+            written.extend(records)
+
+    if written:
+        log_activities([
+            ("check_in" if record["status"] == "checked_in" else "check_out", record["username"],
+             f"User {record['username']} {'checked in to' if record['status'] == 'checked_in' else 'checked out of'} "
+             f"{occupancy.room_name(record['room'])} at {record['timestamp']} (offline kiosk sync)",
+             record["room"])
+            for record in written
+        ])
+    counts = {"accepted": 0, "duplicate": 0, "rejected": 0}
+    for result in results:
+        counts[result["result"]] += 1
+    return {
+        "accepted": counts["accepted"],
+        "duplicates": counts["duplicate"],
+        "rejected": counts["rejected"],
+        "results": results,
+        "users": {username: get_current_status(username) for username in sorted({r["username"] for r in written})},
     }
-    
-    checkins.insert(0, record)
-    _save_checkins(checkins)
 
 
-def get_history(username: str = None, limit: int = 5):
-    """Get check-in/out history."""
-    checkins = _load_checkins()
-    
+def _write_in_order(part: _Partition, records: list, first_moment: datetime):
+    """Append records (sorted by timestamp) to a room's log or, if they start
+    before its tail, merge them in with one rewrite. Caller holds part.lock."""
+    tail = _tail_moment(part)
+    if tail is None or first_moment >= tail:
+        _append_batch(part, records)
+    else:
+        _merge_rewrite(part, records)
+
+
+def auto_check_out(due: list) -> list:
+    """Check out forgotten sessions in one batch: due is a list of
+    (room, username, check_in_time, moment, reason). Each user is checked out at
+    moment, but only if they are still checked in to room with that
+    check_in_time; others (already checked out or checked in again) are
+    skipped. Returns the records written."""
+    by_room = {}
+    for item in sorted(due, key=lambda item: item[3]):
+        by_room.setdefault(item[0], []).append(item[1:])
+    written, sessions = [], []
+    for room, entries in by_room.items():
+        part = _partition(room)
+        records = []
+        with part.lock, file_lock(part.log_file):
+            users = _load_part(part)["users"]
+            for username, check_in_time, moment, reason in entries:
+                head = users.get(username) or {}
+                if head.get("status") != "checked_in" or head.get("check_in_time") != check_in_time:
+                    continue
+                records.append({
+                    "username": username,
+                    "status": "checked_out",
+                    "check_in_time": None,
+                    "timestamp": moment.strftime(TIMESTAMP_FORMAT),
+                    "room": room,
+                    "auto_checkout": reason,
+                })
+                sessions.append((username, check_in_time, moment))
+            if records:
+                _write_in_order(part, records, _parse_moment(records[0]["timestamp"]))
+                for username, check_in_time, moment in sessions[len(sessions) - len(records):]:
+                    _observe_usage(usage_rollups.add_session, username, check_in_time, moment, room)
+        if records:
+            _notify(part, records)
+            written.extend(records)
+
+    if written:
+        log_activities([
+            ("check_out", record["username"],
+             f"User {record['username']} automatically checked out of {occupancy.room_name(record['room'])} "
+             f"at {record['timestamp']} ({record['duration']}; {record['auto_checkout']})",
+             record["room"])
+            for record in written
+        ])
+        for username, check_in_time, moment in sessions:
+            _observe_usage(usage_stats.observe_session, username, check_in_time, moment)
+    return written
+
+
+def _record_epoch(record: dict) -> float:
+    moment = _parse_moment(record.get("timestamp"))
+    return moment.timestamp() if moment is not None else 0.0
+
+
+def _merged(streams: list, newest_first: bool):
+    """Interleave per-room record streams (each already in order) by timestamp."""
+    if len(streams) == 1:
+        return streams[0]
+    return heapq.merge(*streams, key=_record_epoch, reverse=newest_first)
+
+
+def _room_parts(room: str = None) -> list:
+    return [_partition(room)] if room else [_partition(r) for r in rooms()]
+
+
+def _iter_chain(part: _Partition, username: str):
+    head = _load_part(part)["users"].get(username)
+    offset = head.get("offset") if head else None
+    while offset is not None:
+        record = read_record_at(part.log_file, offset)
+        if record is None:
+            return
+        yield record
+        offset = record.get("prev")
+
+
+def iter_user_history(username: str, room: str = None):
+    """Yield one user's records newest first by following their chain in room,
+    or in every room (merged by timestamp) if room is None."""
+    return _merged([_iter_chain(part, username) for part in _room_parts(room)], newest_first=True)
+
+
+def get_history(username: str = None, limit: int = 5, room: str = None):
+    """Get check-in/out history as CheckinEvent records, newest first, of one
+    room or (room None) all of them."""
     if username:
-        checkins = [c for c in checkins if c.get("username") == username]
-    
-    return checkins[:limit]
+        records = iter_user_history(username, room)
+    else:
+        parts = _room_parts(room)
+        for part in parts:
+            _load_part(part)
+        records = _merged([iter_records_reverse(part.log_file) for part in parts], newest_first=True)
+
+    history = []
+    for record in records:
+        if len(history) >= limit:
+            break
+        history.append(CheckinEvent.from_dict(record))
+    return history
+
+
+def get_active_checkins_count(room: str = None) -> int:
+    """Number of users currently checked in to room, or to any room (the heads'
+    occupancy counters)."""
+    return sum(_load_part(part)["active"] for part in _room_parts(room))
+
+
+def get_checkins_today_count(room: str = None) -> int:
+    """Number of check-ins since midnight in room (or all rooms), range-read
+    through each log's timestamp index."""
+    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    count = 0
+    for part in _room_parts(room):
+        _load_part(part)
+        count += sum(1 for record in iter_range(part.log_file, start=today_start) if record.get("status") == "checked_in")
+    return count
+
+
+def get_user_checkins_count(username: str, room: str = None) -> int:
+    """Total number of check-ins made by a user in room, or in all rooms."""
+    total = 0
+    for part in _room_parts(room):
+        head = _load_part(part)["users"].get(username)
+        total += head.get("checkins", 0) if head else 0
+    return total
+
+
+def log_files(room: str = None) -> list:
+    """(room, log path) of room, or of every room, with each log caught up."""
+    parts = _room_parts(room)
+    for part in parts:
+        _load_part(part)
+    return [(part.room, part.log_file) for part in parts]
+
+
+def iter_checkins(room: str = None):
+    """Yield every check-in/out record of room (or of all rooms, merged by
+    timestamp), oldest first."""
+    return _merged([iter_records(path) for _, path in log_files(room)], newest_first=False)
@@ -0,0 +1,161 @@
+import json
+from bisect import bisect_left
+from pathlib import Path
+from datetime import datetime
+from storage import atomic_write_json
+
+TIMESTAMP_FORMAT = "%m/%d/%Y, %I:%M:%S %p"
+# One index entry every N records keeps the sidecar small
+INDEX_EVERY = 64
+
+# path -> index dict, so repeated queries don't re-read the sidecar file
+_index_cache = {}
+
+
+def _index_path(path: Path) -> Path:
+    return path.with_name(path.name + ".idx")
+
+
+def _epoch(timestamp: str):
+    try:
+        return datetime.strptime(timestamp, TIMESTAMP_FORMAT).timestamp()
+    except Exception:
+        return None
+
+
+def _load_index(path: Path) -> dict:
+    index = _index_cache.get(path)
+    if index is None:
+        try:
+            with open(_index_path(path), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except Exception:
+            index = None
+    stat = path.stat() if path.exists() else None
+    if (not index or stat is None or stat.st_size < index.get("size", 0)
+            or index.get("inode", stat.st_ino) != stat.st_ino):
+        # Missing, corrupt or the log was rewritten: start over
+        index = {"size": 0, "count": 0, "entries": []}
+    if stat is not None:
+        index["inode"] = stat.st_ino
+    return index
+
+
+def _save_index(path: Path, index: dict):
+    _index_cache[path] = index
+    try:
+        atomic_write_json(_index_path(path), index, indent=None, fsync=False)
+    except Exception:
+        pass
+
+
+def build_index(path: Path) -> dict:
+    """Bring the sparse (epoch, offset) index of an append-ordered log up to date.
+    Only the bytes appended since the last call are read."""
+    index = _load_index(path)
+    if not path.exists():
+        return index
+    size = path.stat().st_size
+    if size == index["size"]:
+        _index_cache[path] = index
+        return index
+
+    with open(path, "rb") as f:
+        f.seek(index["size"])
+        offset = index["size"]
+        count = index["count"]
+        for line in f:
+            # Only a complete line counts; a torn tail is indexed next time
+            if not line.endswith(b"\n"):
+                break
+            if line.strip() and count % INDEX_EVERY == 0:
+                try:
+                    epoch = _epoch(json.loads(line).get("timestamp", ""))
+                except Exception:
+                    epoch = None
+                if epoch is not None:
+                    index["entries"].append([epoch, offset])
+            if line.strip():
+                count += 1
+            offset += len(line)
+        index["size"] = offset
+        index["count"] = count
+
+    _save_index(path, index)
+    return index
+
+
+def drop_index(path: Path):
+    """Forget the index of a log that was removed or sealed."""
+    _index_cache.pop(path, None)
+    try:
+        _index_path(path).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _bounds(path: Path, start_epoch, end_epoch) -> tuple:
+    """(seek_to, start_checked_until, stop_at, end_checked_from) byte offsets of
+    the candidate records for [start, end), from the sparse index."""
+    entries = build_index(path)["entries"]
+    epochs = [entry[0] for entry in entries]
+
+    # Everything at or after entries[lo] is >= start
+    lo = bisect_left(epochs, start_epoch) if start_epoch is not None else 0
+    seek_to = entries[lo - 1][1] if lo > 0 else 0
+    start_checked_until = entries[lo][1] if lo < len(entries) else None
+
+    # Everything at or after entries[hi] is >= end
+    hi = bisect_left(epochs, end_epoch) if end_epoch is not None else len(entries)
+    stop_at = entries[hi][1] if hi < len(entries) else None
+    # The block before entries[hi] (or the unindexed tail) straddles end
+    end_checked_from = entries[hi - 1][1] if hi > 0 else 0
+    return seek_to, start_checked_until, stop_at, end_checked_from
+
+
+def byte_range(path: Path, start: datetime = None, end: datetime = None) -> tuple:
+    """(first, stop) byte offsets holding every record with start <= timestamp < end
+    (stop None means to the end of the log), for readers that walk the bytes
+    themselves (e.g. a memory-mapped scan). Records near either offset may still
+    fall outside [start, end)."""
+    if not path.exists():
+        return 0, None
+    seek_to, _, stop_at, _ = _bounds(path, start.timestamp() if start else None, end.timestamp() if end else None)
+    return seek_to, stop_at
+
+
+def iter_range(path: Path, start: datetime = None, end: datetime = None):
+    """Yield records with start <= timestamp < end from an append-ordered log.
+    Binary-searches the sparse index to the first candidate offset and only
+    parses timestamps in the boundary blocks."""
+    if not path.exists():
+        return
+    start_epoch = start.timestamp() if start else None
+    end_epoch = end.timestamp() if end else None
+    seek_to, start_checked_until, stop_at, end_checked_from = _bounds(path, start_epoch, end_epoch)
+
+    with open(path, "rb") as f:
+        f.seek(seek_to)
+        offset = seek_to
+        for line in f:
+            if stop_at is not None and offset >= stop_at:
+                break
+            line_offset = offset
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except Exception:
+                continue
+            check_start = start_epoch is not None and (start_checked_until is None or line_offset < start_checked_until)
+            check_end = end_epoch is not None and line_offset >= end_checked_from
+            if check_start or check_end:
+                epoch = _epoch(record.get("timestamp", ""))
+                if epoch is None:
+                    continue
+                if check_start and epoch < start_epoch:
+                    continue
+                if check_end and epoch >= end_epoch:
+                    break
+            yield record
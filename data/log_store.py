@@ -0,0 +1,140 @@
+import gzip
+import json
+import os
+import tempfile
+from pathlib import Path
+from storage import get_lock
+
+
+# Block size used when reading a log backwards from its end
+REVERSE_BLOCK_SIZE = 64 * 1024
+
+
+def append_record(path: Path, record: dict) -> int:
+    """Append one record as a JSON line to a line-oriented log file.
+    Returns the byte offset the record was written at. Appends to one file are
+    serialized, so the offset always belongs to this record."""
+    line = (json.dumps(record) + "\n").encode("utf-8")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with get_lock(path).write():
+        with open(path, "ab") as f:
+            f.seek(0, 2)
+            offset = f.tell()
+            f.write(line)
+    return offset
+
+
+def replace_log(path: Path, data: bytes):
+    """Atomically replace a log's whole contents (temp file + fsync + rename).
+    The caller holds the log's write lock. The new file gets a new inode, which
+    is how the offset-based indexes notice the rewrite."""
+    fd, tmp_name = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+
+def read_record_at(path: Path, offset: int):
+    """Read the single record that starts at a byte offset."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+    except Exception:
+        return None
+
+
+def iter_records_reverse(path: Path):
+    """Yield records newest first by reading the log backwards in blocks.
+    Only as much of the file as the caller consumes is read."""
+    if not path.exists():
+        return
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        position = f.tell()
+        remainder = b""
+        while position > 0:
+            read_size = min(REVERSE_BLOCK_SIZE, position)
+            position -= read_size
+            f.seek(position)
+            block = f.read(read_size) + remainder
+            lines = block.split(b"\n")
+            # The first piece may be the tail of a line that started earlier
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except Exception:
+                        continue
+        if remainder.strip():
+            try:
+                yield json.loads(remainder)
+            except Exception:
+                pass
+
+
+def iter_records(path: Path):
+    """Yield records from a JSON-lines log file, oldest first."""
+    if not path.exists():
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except Exception:
+                # Skip a torn or corrupt line instead of failing the whole read
+                continue
+
+
+def write_segment(path: Path, header: dict, records: list):
+    """Write a sealed, gzip-compressed segment.
+    The first line is the summary header, the rest are the records. Written to a
+    unique temp file and renamed over path, so a reader never sees half a segment."""
+    fd, tmp_name = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+
+def read_segment_header(path: Path) -> dict:
+    """Read only the summary header of a sealed segment."""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.loads(f.readline())
+    except Exception:
+        return {}
+
+
+def iter_segment(path: Path):
+    """Yield records from a sealed segment, skipping its header."""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            f.readline()
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    except Exception:
+        return
@@ -0,0 +1,277 @@
+"""Background group-commit writer for append-only JSON-lines logs.
+
+Callers enqueue records and return immediately; one writer thread drains the
+bounded queue in batches, appends each batch to its file(s) and fsyncs once per
+file per batch. A full queue blocks the caller (backpressure) instead of growing
+memory, and pending records are flushed at process exit.
+
+A batch that can't be written (disk full, a lock error) is never dropped: it is
+retried with a growing back-off while later records wait in the queue, and the
+failure is reported on stderr and in get_writer_stats() ("failing",
+"last_error") until a retry succeeds. `submit` queues a task to run on the
+writer thread between records, for housekeeping the callers shouldn't wait on.
+"""
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from storage import get_lock, file_lock
+
+# Pending records the queue may hold before callers start to wait
+QUEUE_SIZE = 10000
+# A batch is committed after this many records or this many seconds, whichever first
+BATCH_MAX = 256
+BATCH_WINDOW = 0.005
+# How long flush() waits for the writer at exit before giving up
+EXIT_FLUSH_TIMEOUT = 5.0
+# A failed write is retried after this long, doubling up to the maximum
+RETRY_MIN_SECONDS = 0.5
+RETRY_MAX_SECONDS = 30.0
+
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_start_lock = threading.Lock()
+_thread = None
+
+_stats_lock = threading.Lock()
+_stats = {
+    "enqueued": 0,
+    "written": 0,
+    "batches": 0,
+    "errors": 0,
+    "failing": False,
+    "last_error": None,
+    "blocked": 0,
+    "max_depth": 0,
+    "last_batch_size": 0,
+    "latency_total": 0.0,
+    "latency_max": 0.0,
+    "fsync_total": 0.0,
+}
+
+
+def _ensure_started():
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    with _start_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name="log-writer", daemon=True)
+            _thread.start()
+
+
+def _on_writer_thread() -> bool:
+    return threading.current_thread() is _thread
+
+
+def _append_file(path: Path, records: list):
+    data = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # The file lock orders appends with a partition being sealed by another process
+    with get_lock(path).write(), file_lock(path):
+        with open(path, "ab") as f:
+            f.seek(0, 2)
+            start = f.tell()
+            try:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            except BaseException:
+                # Cut off a partial write, so the retry doesn't follow a torn line
+                try:
+                    f.truncate(start)
+                except OSError:
+                    pass
+                raise
+
+
+def _report_failure(path: Path, ex: Exception, pending: int):
+    message = f"{datetime.now():%m/%d/%Y, %I:%M:%S %p}: could not write {path.name}: {ex}"
+    with _stats_lock:
+        _stats["errors"] += 1
+        first = not _stats["failing"]
+        _stats["failing"] = True
+        _stats["last_error"] = message
+    if first:
+        print(f"log writer: {message}; retrying ({pending} records pending)", file=sys.stderr)
+
+
+def _write_batch(batch: list):
+    """Append a batch grouped by file, one fsync per file, then run callbacks in order.
+    Each queue item carries a list of records that are always written together.
+    A file that fails is retried with back-off until it is written; files already
+    written are not written again."""
+    by_path = {}
+    for path, records, _, _ in batch:
+        by_path.setdefault(path, []).extend(records)
+
+    fsync_seconds = 0.0
+    delay = RETRY_MIN_SECONDS
+    while by_path:
+        path, records = next(iter(by_path.items()))
+        attempt_started = time.perf_counter()
+        try:
+            _append_file(path, records)
+        except Exception as ex:
+            _report_failure(path, ex, sum(len(pending) for pending in by_path.values()))
+            time.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX_SECONDS)
+            continue
+        fsync_seconds += time.perf_counter() - attempt_started
+        del by_path[path]
+
+    done = time.perf_counter()
+    written = sum(len(records) for _, records, _, _ in batch)
+    with _stats_lock:
+        if _stats["failing"]:
+            print("log writer: writes recovered", file=sys.stderr)
+        _stats["failing"] = False
+        _stats["written"] += written
+        _stats["batches"] += 1
+        _stats["last_batch_size"] = written
+        _stats["fsync_total"] += fsync_seconds
+        for _, records, enqueued_at, _ in batch:
+            latency = done - enqueued_at
+            _stats["latency_total"] += latency * len(records)
+            _stats["latency_max"] = max(_stats["latency_max"], latency)
+
+    # Callbacks (e.g. anomaly rules) see records only once they are durable
+    for _, records, _, on_written in batch:
+        if on_written is None:
+            continue
+        for record in records:
+            try:
+                on_written(record)
+            except Exception:
+                pass
+
+
+def _process(batch: list):
+    """Write a batch's records in queue order, running queued tasks (items
+    without a path) between them."""
+    pending = []
+    for item in batch:
+        if item[0] is not None:
+            pending.append(item)
+            continue
+        if pending:
+            _write_batch(pending)
+            pending = []
+        try:
+            item[3]()
+        except Exception:
+            pass
+    if pending:
+        _write_batch(pending)
+
+
+def _run():
+    while True:
+        batch = [_queue.get()]
+        deadline = time.perf_counter() + BATCH_WINDOW
+        while len(batch) < BATCH_MAX:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        try:
+            _process(batch)
+        finally:
+            for _ in batch:
+                _queue.task_done()
+
+
+def enqueue(path: Path, record: dict, on_written=None):
+    """Queue a record for appending to path. on_written(record) runs on the writer
+    thread after the record is on disk. Blocks while the queue is full."""
+    enqueue_many(path, [record], on_written)
+
+
+def enqueue_many(path: Path, records: list, on_written=None):
+    """Queue several records as one item: they are appended together, in order,
+    with a single write (e.g. the audit events of a bulk admin action)."""
+    if not records:
+        return
+    item = (Path(path), list(records), time.perf_counter(), on_written)
+    if _on_writer_thread():
+        # A callback logging again must not wait on its own queue
+        _write_batch([item])
+        return
+    _put(item)
+
+
+def submit(task):
+    """Run task() on the writer thread after the records queued before it and
+    before those queued after it. Errors in task are ignored."""
+    if _on_writer_thread():
+        try:
+            task()
+        except Exception:
+            pass
+        return
+    _put((None, [], time.perf_counter(), task))
+
+
+def _put(item: tuple):
+    _ensure_started()
+    try:
+        _queue.put_nowait(item)
+    except queue.Full:
+        with _stats_lock:
+            _stats["blocked"] += 1
+        _queue.put(item)
+    with _stats_lock:
+        _stats["enqueued"] += len(item[1])
+        _stats["max_depth"] = max(_stats["max_depth"], _queue.qsize())
+
+
+def flush(timeout: float = None) -> bool:
+    """Wait until everything queued so far is written. Returns False on timeout."""
+    if _on_writer_thread() or _thread is None:
+        return True
+    if timeout is None:
+        _queue.join()
+        return True
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def get_writer_stats() -> dict:
+    """Queue depth, throughput and enqueue-to-durable write latency."""
+    with _stats_lock:
+        stats = dict(_stats)
+    written = stats.pop("written")
+    batches = stats.pop("batches")
+    latency_total = stats.pop("latency_total")
+    fsync_total = stats.pop("fsync_total")
+    stats.update({
+        "queue_depth": _queue.qsize(),
+        "queue_capacity": QUEUE_SIZE,
+        "written": written,
+        "batches": batches,
+        "avg_batch_size": written / batches if batches else 0.0,
+        "avg_latency_ms": 1000 * latency_total / written if written else 0.0,
+        "max_latency_ms": 1000 * stats.pop("latency_max"),
+        "avg_fsync_ms": 1000 * fsync_total / batches if batches else 0.0,
+    })
+    return stats
+
+
+def _flush_at_exit():
+    if not flush(EXIT_FLUSH_TIMEOUT):
+        print(f"log writer: {_queue.unfinished_tasks} queued writes were not written before exit",
+              file=sys.stderr)
+
+
+atexit.register(_flush_at_exit)
@@ -0,0 +1,127 @@
+import json
+import mmap
+import re
+from pathlib import Path
+
+# Matches `"field": <value>` where the key starts a JSON member (right after `{` or
+# `,`), so an escaped `\"field\"` inside a string value never matches.
+_VALUE = rb'("(?:[^"\\]|\\.)*"|null|true|false|-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)'
+_field_patterns = {}
+
+
+def _field_pattern(field: str):
+    pattern = _field_patterns.get(field)
+    if pattern is None:
+        key = re.escape(json.dumps(field).encode("utf-8"))
+        pattern = re.compile(rb'[{,]\s*' + key + rb'\s*:\s*' + _VALUE)
+        _field_patterns[field] = pattern
+    return pattern
+
+
+class LazyRecord:
+    """A view of one JSON line inside a mapped log.
+    Fields are decoded one at a time, on first access."""
+
+    __slots__ = ("_buffer", "start", "end", "_cache")
+
+    def __init__(self, buffer, start: int, end: int):
+        self._buffer = buffer
+        self.start = start
+        self.end = end
+        self._cache = {}
+
+    def get(self, field: str, default=None):
+        if field in self._cache:
+            return self._cache[field]
+        # re searches the mmap in place between the record bounds (no slice copy)
+        match = _field_pattern(field).search(self._buffer, self.start, self.end)
+        value = json.loads(match.group(1)) if match else default
+        self._cache[field] = value
+        return value
+
+    def to_dict(self) -> dict:
+        """Fully decode the record (only do this for records that matched)."""
+        return json.loads(self._buffer[self.start:self.end])
+
+
+class MappedLog:
+    """Memory-mapped reader for the line-oriented (JSON-lines) log stores.
+
+    Usage:
+        with MappedLog(path) as log:
+            for rec in log.scan(event_type="login_failed"):
+                print(rec.get("username"))
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = None
+        self._map = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self):
+        if not self.path.exists():
+            return
+        self._file = open(self.path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped
+            self._map = None
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def iter_spans(self, start: int = 0, stop: int = None):
+        """Yield (start, end) byte spans of complete records, found with mmap.find."""
+        buffer = self._map
+        if buffer is None:
+            return
+        stop = len(buffer) if stop is None else min(stop, len(buffer))
+        position = start
+        while position < stop:
+            newline = buffer.find(b"\n", position, stop)
+            if newline == -1:
+                # Torn last line: not a complete record yet
+                return
+            if newline > position:
+                yield position, newline
+            position = newline + 1
+
+    def records(self, start: int = 0, stop: int = None):
+        """Yield a LazyRecord for every record in the mapped byte range."""
+        for span_start, span_end in self.iter_spans(start, stop):
+            yield LazyRecord(self._map, span_start, span_end)
+
+    def scan(self, where=None, **equals):
+        """Yield records whose fields equal the given values (e.g. username="bob"),
+        and that pass the optional `where(record)` predicate. Only the fields a
+        filter touches are decoded."""
+        for record in self.records():
+            if any(record.get(field) != value for field, value in equals.items()):
+                continue
+            if where is not None and not where(record):
+                continue
+            yield record
+
+
+def scan_file(path: Path, fields=None, where=None, **equals):
+    """Scan a log file without materializing it.
+    Yields full dicts, or only `fields` when given."""
+    with MappedLog(path) as log:
+        for record in log.scan(where=where, **equals):
+            if fields:
+                yield {field: record.get(field) for field in fields}
+            else:
+                yield record.to_dict()
@@ -0,0 +1,296 @@
+"""Study rooms: capacity, admission control and live occupancy.
+
+The study space is split into rooms (DEFAULT_ROOM plus any added with
+`add_room`), each with its own capacity and full-room policy. The number of
+users checked in to a room is kept as a counter in that room's checkin_log
+heads index (adjusted on every status change, so reading it is O(1)). check_in
+asks `admit` for a seat while it holds the room's heads lock and its log's file
+lock, so concurrent check-ins from many sessions, and from the kiosk API
+process, can't overfill it. Admission state (waitlist, holds) is per room too,
+under a per-room lock, so rooms never contend.
+
+The waitlist and holds live in memory and are not shared between processes:
+only one process should serve a room with the "waitlist" policy (the app). The
+kiosk API still sees the shared occupancy count, but not the app's waitlist,
+so it may hand a held seat to a walk-up user, and users it turns away wait on
+a list of its own.
+
+When the room is full a check-in is rejected (policy "reject") or the user
+joins a FIFO waitlist (policy "waitlist"). Each seat that frees up is held for
+the next waiting user for HOLD_SECONDS; only they can take it until the hold
+runs out, then it passes down the list.
+
+Listeners registered with `watch` get a room's snapshot after every change in
+it, e.g. the dashboard's live occupancy card.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from activity_log import log_activity
+from storage import get_store
+
+# {"rooms": {room id: {"name", "capacity", "policy"}}}; older files hold a flat
+# {"capacity", "policy"} for the single room, which becomes DEFAULT_ROOM
+CAPACITY_FILE = Path(__file__).parent / "room_capacity.json"
+DEFAULT_ROOM = "main"
+DEFAULT_ROOM_NAME = "Main Study Room"
+DEFAULT_CAPACITY = 60
+# Room ids name files (checkin_log.<room>.jsonl), so they are kept to a safe alphabet
+ROOM_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,31}$")
+POLICIES = ("reject", "waitlist")
+# How long a freed seat is kept for the first user on the waitlist
+HOLD_SECONDS = 10 * 60
+
+
+class RoomFull(Exception):
+    """Raised by check_in when no seat is free. position is the user's place on
+    the waitlist (1 = next), or None if the policy is "reject"."""
+
+    def __init__(self, occupied: int, capacity: int, position: int = None, room: str = DEFAULT_ROOM):
+        self.occupied = occupied
+        self.capacity = capacity
+        self.position = position
+        self.room = room
+        message = f"{room_name(room)} is full ({occupied}/{capacity})"
+        if position is not None:
+            message += f"; you are #{position} on the waitlist"
+        super().__init__(message)
+
+
+class _RoomState:
+    """Live admission state of one room, guarded by its own lock."""
+    __slots__ = ("lock", "waitlist", "holds", "occupied")
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # username -> time joined, in arrival order
+        self.waitlist = OrderedDict()
+        # username -> hold expiry (monotonic), oldest first
+        self.holds = OrderedDict()
+        self.occupied = 0
+
+
+_store = get_store(CAPACITY_FILE)
+_rooms = None
+# room id -> _RoomState
+_states = {}
+_states_guard = threading.Lock()
+# session key -> listener(snapshot)
+_watchers = {}
+
+
+def _on_settings_written(data: dict):
+    global _rooms
+    _rooms = None
+
+
+_store.subscribe(_on_settings_written)
+
+
+def _clean_room(room: str, settings: dict) -> dict:
+    capacity = settings.get("capacity", DEFAULT_CAPACITY)
+    policy = settings.get("policy", "reject")
+    return {
+        "name": settings.get("name") or (DEFAULT_ROOM_NAME if room == DEFAULT_ROOM else room),
+        "capacity": capacity if isinstance(capacity, int) and capacity > 0 else DEFAULT_CAPACITY,
+        "policy": policy if policy in POLICIES else "reject",
+    }
+
+
+def _room_table(data: dict) -> dict:
+    """The file's rooms for an update, moving a flat single-room layout under
+    DEFAULT_ROOM."""
+    if "rooms" not in data:
+        data["rooms"] = {DEFAULT_ROOM: {
+            key: data.pop(key) for key in ("capacity", "policy") if key in data
+        }}
+    data["rooms"].setdefault(DEFAULT_ROOM, {})
+    return data["rooms"]
+
+
+def get_rooms() -> dict:
+    """{room id: {"name", "capacity", "policy"}}, DEFAULT_ROOM first, cached in memory."""
+    global _rooms
+    rooms = _rooms
+    if rooms is None:
+        data = _store.read()
+        table = data["rooms"] if isinstance(data.get("rooms"), dict) else {DEFAULT_ROOM: data}
+        rooms = {DEFAULT_ROOM: _clean_room(DEFAULT_ROOM, table.get(DEFAULT_ROOM) or {})}
+        for room in sorted(table):
+            if room != DEFAULT_ROOM and ROOM_ID_PATTERN.match(room) and isinstance(table[room], dict):
+                rooms[room] = _clean_room(room, table[room])
+        _rooms = rooms
+    return rooms
+
+
+def get_settings(room: str = DEFAULT_ROOM) -> dict:
+    """{"name", "capacity", "policy"} of a room. Raises ValueError for an unknown room."""
+    settings = get_rooms().get(room)
+    if settings is None:
+        raise ValueError(f"Unknown room {room}")
+    return settings
+
+
+def room_name(room: str) -> str:
+    settings = get_rooms().get(room)
+    return settings["name"] if settings else room
+
+
+def _validate(capacity: int, policy: str):
+    if not isinstance(capacity, int) or capacity <= 0:
+        raise ValueError("Capacity must be a positive whole number")
+    if policy is not None and policy not in POLICIES:
+        raise ValueError(f"Policy must be one of {', '.join(POLICIES)}")
+
+
+def set_capacity(capacity: int, policy: str = None, actor: str = "system", room: str = DEFAULT_ROOM):
+    """Change a room's capacity (and optionally its full-room policy)."""
+    _validate(capacity, policy)
+    get_settings(room)
+
+    def _apply(data):
+        settings = _room_table(data).setdefault(room, {})
+        settings["capacity"] = capacity
+        if policy is not None:
+            settings["policy"] = policy
+
+    _store.update(_apply)
+    log_activity("settings_changed", actor, f"Capacity of {room_name(room)} set to {capacity} by {actor}")
+    # More seats may let waiting users in; fewer never evicts anyone
+    update(_state(room).occupied, room)
+
+
+def add_room(room: str, name: str, capacity: int, policy: str = "reject", actor: str = "system"):
+    """Add a study room. Its check-ins and reservations get their own files."""
+    room = (room or "").strip().lower()
+    name = (name or "").strip()
+    if not ROOM_ID_PATTERN.match(room):
+        raise ValueError("Room id must be 1-32 lowercase letters, digits, '-' or '_'")
+    if not name:
+        raise ValueError("Room name is required")
+    _validate(capacity, policy)
+    if room in get_rooms():
+        raise ValueError(f"Room {room} already exists")
+
+    def _apply(data):
+        _room_table(data)[room] = {"name": name, "capacity": capacity, "policy": policy}
+
+    _store.update(_apply)
+    log_activity("settings_changed", actor, f"Room {name} ({room}, {capacity} seats) added by {actor}")
+
+
+def _state(room: str) -> _RoomState:
+    state = _states.get(room)
+    if state is None:
+        with _states_guard:
+            state = _states.setdefault(room, _RoomState())
+    return state
+
+
+def _expire_holds(holds: OrderedDict, now: float):
+    while holds:
+        username, expires = next(iter(holds.items()))
+        if expires > now:
+            break
+        del holds[username]
+
+
+def _promote(state: _RoomState, capacity: int):
+    """Hold each free seat for the next waiting user. Caller holds state.lock."""
+    now = time.monotonic()
+    _expire_holds(state.holds, now)
+    while state.waitlist and capacity - state.occupied - len(state.holds) > 0:
+        username, _ = state.waitlist.popitem(last=False)
+        state.holds[username] = now + HOLD_SECONDS
+
+
+def admit(username: str, occupied: int, reserved: int = 0, room: str = DEFAULT_ROOM):
+    """Take a seat in room for username or raise RoomFull. O(1) except when
+    joining the waitlist. Called by checkin_log.check_in under the room's heads
+    lock and its log's file lock, with the number of users checked in there and of its seats reserved
+    for others now."""
+    settings = get_settings(room)
+    capacity = settings["capacity"]
+    state = _state(room)
+    with state.lock:
+        _expire_holds(state.holds, time.monotonic())
+        held = username in state.holds
+        # A seat held for this user is theirs; other held or reserved seats are not free
+        free = capacity - occupied - reserved - len(state.holds) + (1 if held else 0)
+        if free > 0:
+            state.holds.pop(username, None)
+            state.waitlist.pop(username, None)
+            return
+        if settings["policy"] != "waitlist":
+            raise RoomFull(occupied, capacity, room=room)
+        state.waitlist.setdefault(username, time.time())
+        raise RoomFull(occupied, capacity, list(state.waitlist).index(username) + 1, room)
+
+
+def leave_waitlist(username: str, room: str = DEFAULT_ROOM):
+    state = _state(room)
+    with state.lock:
+        state.waitlist.pop(username, None)
+        state.holds.pop(username, None)
+    update(state.occupied, room)
+
+
+def update(occupied: int, room: str = DEFAULT_ROOM):
+    """New occupancy of a room after a check-in/out write: pass freed seats down
+    its waitlist and push its snapshot to the watchers."""
+    settings = get_settings(room)
+    state = _state(room)
+    with state.lock:
+        state.occupied = occupied
+        if settings["policy"] == "waitlist":
+            _promote(state, settings["capacity"])
+        snap = snapshot(room)
+    for listener in list(_watchers.values()):
+        try:
+            listener(snap)
+        except Exception:
+            pass
+
+
+def snapshot(room: str = DEFAULT_ROOM) -> dict:
+    """Live occupancy of a room: {"room", "name", "occupied", "capacity", "free",
+    "waitlist", "held_for"}."""
+    settings = get_settings(room)
+    state = _state(room)
+    with state.lock:
+        _expire_holds(state.holds, time.monotonic())
+        return {
+            "room": room,
+            "name": settings["name"],
+            "occupied": state.occupied,
+            "capacity": settings["capacity"],
+            "free": max(0, settings["capacity"] - state.occupied - len(state.holds)),
+            "waitlist": len(state.waitlist),
+            "held_for": list(state.holds),
+        }
+
+
+def waitlist_position(username: str, room: str = DEFAULT_ROOM):
+    """1-based place on a room's waitlist, 0 if a seat is being held for the
+    user, None if they are not waiting."""
+    state = _state(room)
+    with state.lock:
+        if username in state.holds:
+            return 0
+        if username in state.waitlist:
+            return list(state.waitlist).index(username) + 1
+    return None
+
+
+def watch(key, listener):
+    """Push snapshots to listener(snapshot) after every change in any room (the
+    snapshot's "room" says which). One listener per key (e.g. a session id):
+    watching again replaces it."""
+    _watchers[key] = listener
+
+
+def unwatch(key):
+    _watchers.pop(key, None)
@@ -0,0 +1,199 @@
+"""Vectorized occupancy analytics over the check-in log.
+
+Check-in/out events are loaded once into columnar NumPy arrays (local epoch
+seconds, integer user codes, an is-check-in flag); sessions are paired and all
+statistics are computed in bulk instead of per-row dict scans. The dashboard
+summary only loads its window (found through the sparse log index) and is
+cached until a log changes or SUMMARY_MAX_AGE passes.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from checkin_log import TIMESTAMP_FORMAT, log_files
+from log_index import byte_range
+from mmap_reader import MappedLog
+
+_EPOCH = datetime(1970, 1, 1)
+HOUR = 3600
+DAY = 86400
+# Sessions are auto-closed well within a day, so loading one extra day pairs
+# every session that was already open when the window starts
+SESSION_LOOKBACK = DAY
+# Open sessions keep growing, so a cached summary is recomputed at least this often
+SUMMARY_MAX_AGE = 60
+
+# (days, room) -> (log signature, computed at, summary)
+_summary_cache = {}
+_summary_lock = threading.Lock()
+
+
+def _local_seconds(moment: datetime) -> float:
+    # Naive local seconds: hour-of-day and day boundaries are plain integer math
+    return (moment - _EPOCH).total_seconds()
+
+
+def load_events(room: str = None, since: datetime = None):
+    """Load check-in/out events of room (or of every room) as columns, from `since`
+    on when given (a few earlier events may be included).
+    Returns (times, user_codes, is_checkin, usernames) where usernames[code] is the user."""
+    times = []
+    users = []
+    flags = []
+    for _, path in log_files(room):
+        if not path.exists():
+            continue
+        first, stop = byte_range(path, since) if since else (0, None)
+        with MappedLog(path) as log:
+            for record in log.records(first, stop):
+                try:
+                    moment = datetime.strptime(record.get("timestamp"), TIMESTAMP_FORMAT)
+                except Exception:
+                    continue
+                times.append(_local_seconds(moment))
+                users.append(record.get("username") or "")
+                flags.append(record.get("status") == "checked_in")
+
+    usernames, user_codes = np.unique(np.array(users, dtype=object), return_inverse=True)
+    return (
+        np.array(times, dtype=np.float64),
+        user_codes.astype(np.int64),
+        np.array(flags, dtype=bool),
+        list(usernames),
+    )
+
+
+def pair_sessions(times, user_codes, is_checkin, now: float = None):
+    """Pair every check-in with the same user's next event when it is a check-out.
+    Still-open sessions end at `now` (if given) or are dropped.
+    Returns (starts, ends, session_user_codes)."""
+    if len(times) == 0:
+        empty = np.array([], dtype=np.float64)
+        return empty, empty, np.array([], dtype=np.int64)
+
+    order = np.lexsort((times, user_codes))
+    t = times[order]
+    u = user_codes[order]
+    c = is_checkin[order]
+
+    next_same_user = np.append(u[1:] == u[:-1], False)
+    next_is_out = np.append(~c[1:], False)
+    closed = c & next_same_user & next_is_out
+    starts = t[closed]
+    ends = np.roll(t, -1)[closed]
+    codes = u[closed]
+
+    if now is not None:
+        # A check-in that is its user's last event is still open
+        open_now = c & ~next_same_user
+        starts = np.concatenate([starts, t[open_now]])
+        ends = np.concatenate([ends, np.full(open_now.sum(), now)])
+        codes = np.concatenate([codes, u[open_now]])
+    return starts, ends, codes
+
+
+def occupancy_histogram(starts, ends, bin_seconds: int = HOUR, start: float = None, end: float = None):
+    """Number of sessions overlapping each bin in [start, end).
+    Returns (bin_edges, counts) using a difference array and one cumulative sum."""
+    if start is None:
+        start = float(starts.min()) if len(starts) else 0.0
+    if end is None:
+        end = float(ends.max()) if len(ends) else start
+    bins = max(int(np.ceil((end - start) / bin_seconds)), 1)
+    edges = start + np.arange(bins + 1) * bin_seconds
+
+    visible = (ends > start) & (starts < end)
+    first_bin = np.floor((np.maximum(starts[visible], start) - start) / bin_seconds).astype(np.int64)
+    last_bin = np.ceil((np.minimum(ends[visible], end) - start) / bin_seconds).astype(np.int64)
+    diff = np.zeros(bins + 1, dtype=np.int64)
+    np.add.at(diff, first_bin, 1)
+    np.add.at(diff, last_bin, -1)
+    return edges, np.cumsum(diff)[:bins]
+
+
+def hourly_profile(starts, ends, days: int = None, now: float = None):
+    """Average number of occupants for each hour of the day (24 values)."""
+    now = now if now is not None else _local_seconds(datetime.now())
+    window_start = (now // DAY - (days - 1)) * DAY if days else (float(starts.min()) // DAY * DAY if len(starts) else now)
+    edges, counts = occupancy_histogram(starts, ends, HOUR, window_start, now)
+    hours = ((edges[:-1] // HOUR) % 24).astype(np.int64)
+    totals = np.bincount(hours, weights=counts, minlength=24)
+    samples = np.bincount(hours, minlength=24)
+    return np.divide(totals, samples, out=np.zeros(24), where=samples > 0)
+
+
+def daily_checkins(times, is_checkin):
+    """Check-ins per calendar day. Returns (day_start_seconds, counts)."""
+    days = (times[is_checkin] // DAY).astype(np.int64)
+    if len(days) == 0:
+        return np.array([], dtype=np.float64), np.array([], dtype=np.int64)
+    unique_days, counts = np.unique(days, return_counts=True)
+    return unique_days * float(DAY), counts
+
+
+def per_user_totals(durations, codes, user_count: int):
+    """Total session seconds per user code."""
+    return np.bincount(codes, weights=durations, minlength=user_count)
+
+
+def _log_signature(room: str = None) -> tuple:
+    signature = []
+    for _, path in log_files(room):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        signature.append((str(path), stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def get_occupancy_summary(days: int = 7, room: str = None) -> dict:
+    """Headline numbers for the dashboard analytics panel, for one room or all,
+    over the last `days` days. Cached until a log changes or SUMMARY_MAX_AGE passes."""
+    signature = _log_signature(room)
+    with _summary_lock:
+        cached = _summary_cache.get((days, room))
+    if cached and cached[0] == signature and time.monotonic() - cached[1] < SUMMARY_MAX_AGE:
+        return cached[2]
+    summary = _compute_summary(days, room)
+    with _summary_lock:
+        _summary_cache[(days, room)] = (signature, time.monotonic(), summary)
+    return summary
+
+
+def _compute_summary(days: int, room: str = None) -> dict:
+    now = _local_seconds(datetime.now())
+    window_start = (now // DAY - (days - 1)) * DAY
+    since = _EPOCH + timedelta(seconds=window_start - SESSION_LOOKBACK)
+    times, user_codes, is_checkin, usernames = load_events(room, since)
+    starts, ends, codes = pair_sessions(times, user_codes, is_checkin, now=now)
+    # Length stats cover sessions started in the window; usage only its part in it
+    closed = (ends < now) & (starts >= window_start)
+    durations = ends[closed] - starts[closed]
+
+    profile = hourly_profile(starts, ends, days=days, now=now)
+    in_window = np.clip(ends - np.maximum(starts, window_start), 0, None)
+    totals = per_user_totals(in_window, codes, len(usernames))
+    top_users = [
+        (usernames[i], float(totals[i]))
+        for i in np.argsort(totals)[::-1][:5]
+        if totals[i] > 0
+    ]
+    percentiles = np.percentile(durations, [50, 90, 99]) if len(durations) else np.zeros(3)
+
+    return {
+        "sessions": int(len(durations)),
+        "avg_session_seconds": float(durations.mean()) if len(durations) else 0.0,
+        "median_session_seconds": float(percentiles[0]),
+        "p90_session_seconds": float(percentiles[1]),
+        "p99_session_seconds": float(percentiles[2]),
+        "peak_hour": int(np.argmax(profile)) if profile.any() else None,
+        "hourly_profile": [float(v) for v in profile],
+        "top_users": top_users,
+    }
+
+
+def format_seconds(seconds: float) -> str:
+    """Short human form, e.g. 2h 05m."""
+    minutes = int(seconds // 60)
+    return f"{minutes // 60}h {minutes % 60:02d}m"
@@ -0,0 +1,447 @@
+"""Seat reservations.
+
+Students book a seat in a study room for a time slot ahead of time. Each room
+keeps its bookings in its own append-only JSON-lines log of events (book,
+cancel, claim, no_show), folded into that room's memory under its own lock: per
+seat, and per user, a list of live reservations sorted by start time. A seat's reservations never overlap, so an overlap check is two bisects
+(O(log n)) and the free slots of a seat come from one bisect plus a walk over
+the window.
+
+A user can't hold two reservations at the same time, even in different rooms:
+a booking checks the user's intervals in every room.
+
+Check-in to a room claims the user's reservation there when one is active (from
+EARLY_CHECKIN_MINUTES before its start until its end). Seats reserved for
+someone else right now are not free for walk-ins. A reservation that is not
+claimed within NO_SHOW_MINUTES of its start is released (a "no_show" event),
+which frees the seat again.
+
+The app and the kiosk API both write a room's log. Every write (book, cancel,
+claim, no_show) re-reads the log and re-checks the reservation under the log's
+file lock, so the two processes can't both release a no-show or race a claim.
+"""
+import bisect
+import heapq
+import json
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from activity_log import log_activity
+from anomaly_engine import OPENING_HOUR, CLOSING_HOUR
+from log_store import append_record
+from storage import file_lock
+import occupancy
+from occupancy import DEFAULT_ROOM
+
+# Event log of DEFAULT_ROOM; other rooms use reservations.<room>.jsonl
+RESERVATIONS_FILE = Path(__file__).parent / "reservations.jsonl"
+TIMESTAMP_FORMAT = "%m/%d/%Y, %I:%M:%S %p"
+# Bookings start and end on these boundaries
+SLOT_MINUTES = 30
+MAX_BOOKING_HOURS = 4
+BOOKING_HORIZON_DAYS = 7
+# A reservation can be claimed this early, and is released if not claimed this late
+EARLY_CHECKIN_MINUTES = 10
+NO_SHOW_MINUTES = 15
+# Reservations that ended longer ago than this are dropped from memory
+RETAIN_HOURS = 24
+
+
+class Reservation:
+    __slots__ = ("id", "room", "seat", "username", "start", "end", "status")
+
+    def __init__(self, id, room, seat, username, start, end, status="booked"):
+        self.id = id
+        self.room = room
+        self.seat = seat
+        self.username = username
+        self.start = start
+        self.end = end
+        self.status = status
+
+    @property
+    def start_time(self) -> datetime:
+        return datetime.fromtimestamp(self.start)
+
+    @property
+    def end_time(self) -> datetime:
+        return datetime.fromtimestamp(self.end)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "room": self.room,
+            "seat": self.seat,
+            "username": self.username,
+            "start": self.start_time.strftime(TIMESTAMP_FORMAT),
+            "end": self.end_time.strftime(TIMESTAMP_FORMAT),
+            "status": self.status,
+        }
+
+
+class _Book:
+    """One room's reservations: its event log and in-memory indexes."""
+    __slots__ = ("room", "log_file", "lock", "by_id", "by_seat", "by_user", "no_show_heap", "scan",
+                 "pruned_at", "seat_ids")
+
+    def __init__(self, room: str):
+        self.room = room
+        self.log_file = RESERVATIONS_FILE if room == DEFAULT_ROOM else RESERVATIONS_FILE.with_name(f"reservations.{room}.jsonl")
+        self.lock = threading.RLock()
+        self.by_id = {}
+        # seat -> [(start, end, id)] of live (booked or claimed) reservations, by start
+        self.by_seat = {}
+        # username -> same, for the user's own reservations in this room
+        self.by_user = {}
+        # (no-show deadline, id) of booked reservations
+        self.no_show_heap = []
+        self.scan = {"size": 0}
+        self.pruned_at = 0.0
+        # Seat ids for the current capacity, rebuilt when it changes
+        self.seat_ids = {"capacity": None, "list": [], "set": frozenset()}
+
+
+# room id -> _Book
+_books = {}
+_books_guard = threading.Lock()
+# Serializes bookings, so two rooms can't both accept one user's overlapping slots
+_booking_lock = threading.Lock()
+
+
+def _book(room: str = None) -> _Book:
+    """The reservations of room (DEFAULT_ROOM if None); ValueError if unknown."""
+    room = room or DEFAULT_ROOM
+    book = _books.get(room)
+    if book is None:
+        occupancy.get_settings(room)
+        with _books_guard:
+            book = _books.setdefault(room, _Book(room))
+    return book
+
+
+def _seat_table(book: _Book) -> dict:
+    capacity = occupancy.get_settings(book.room)["capacity"]
+    if book.seat_ids["capacity"] != capacity:
+        ids = [f"S{n}" for n in range(1, capacity + 1)]
+        book.seat_ids.update(capacity=capacity, list=ids, set=frozenset(ids))
+    return book.seat_ids
+
+
+def seats(room: str = None) -> list:
+    """Seat ids of a room: S1..S<capacity>."""
+    return _seat_table(_book(room))["list"]
+
+
+def _moment(value: str) -> float:
+    return datetime.strptime(value, TIMESTAMP_FORMAT).timestamp()
+
+
+def _insert(intervals: dict, key: str, entry: tuple):
+    bisect.insort(intervals.setdefault(key, []), entry)
+
+
+def _remove(intervals: dict, key: str, entry: tuple):
+    entries = intervals.get(key, [])
+    i = bisect.bisect_left(entries, entry)
+    if i < len(entries) and entries[i] == entry:
+        del entries[i]
+
+
+def _conflicts(entries: list, start: float, end: float):
+    """The id of an entry overlapping [start, end), or None. Entries don't overlap
+    each other, so only the neighbours of start's insertion point can."""
+    i = bisect.bisect_left(entries, (start,))
+    if i > 0 and entries[i - 1][1] > start:
+        return entries[i - 1][2]
+    if i < len(entries) and entries[i][0] < end:
+        return entries[i][2]
+    return None
+
+
+def _apply(book: _Book, event: dict):
+    op = event.get("op")
+    if op == "book":
+        reservation = Reservation(event["id"], book.room, event["seat"], event["username"],
+                                  _moment(event["start"]), _moment(event["end"]))
+        book.by_id[reservation.id] = reservation
+        entry = (reservation.start, reservation.end, reservation.id)
+        _insert(book.by_seat, reservation.seat, entry)
+        _insert(book.by_user, reservation.username, entry)
+        heapq.heappush(book.no_show_heap, (reservation.start + NO_SHOW_MINUTES * 60, reservation.id))
+        return
+    reservation = book.by_id.get(event.get("id"))
+    if reservation is None:
+        return
+    if op == "claim":
+        reservation.status = "claimed"
+    elif op in ("cancel", "no_show") and reservation.status == "booked":
+        reservation.status = "cancelled" if op == "cancel" else "no_show"
+        entry = (reservation.start, reservation.end, reservation.id)
+        _remove(book.by_seat, reservation.seat, entry)
+        _remove(book.by_user, reservation.username, entry)
+
+
+def _sync(book: _Book):
+    """Fold events appended to a room's log since the last call (by any process) into memory."""
+    try:
+        size = book.log_file.stat().st_size
+    except OSError:
+        return
+    if size == book.scan["size"]:
+        return
+    with open(book.log_file, "rb") as f:
+        f.seek(book.scan["size"])
+        offset = book.scan["size"]
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            if line.strip():
+                try:
+                    _apply(book, json.loads(line))
+                except Exception:
+                    pass
+    book.scan["size"] = offset
+
+
+def _write(book: _Book, event: dict):
+    """Append an event. The caller holds book.lock and file_lock(book.log_file),
+    and synced the book and checked the event against it under them."""
+    append_record(book.log_file, event)
+    _sync(book)
+
+
+def _release_no_shows(book: _Book, now: float):
+    if not book.no_show_heap or book.no_show_heap[0][0] > now:
+        return
+    # Released under the log's file lock after catching up with it, so a claim
+    # or release by the other process is seen first
+    with file_lock(book.log_file):
+        _sync(book)
+        _release_due(book, now)
+
+
+def _release_due(book: _Book, now: float):
+    while book.no_show_heap and book.no_show_heap[0][0] <= now:
+        _, reservation_id = heapq.heappop(book.no_show_heap)
+        reservation = book.by_id.get(reservation_id)
+        if reservation is None or reservation.status != "booked":
+            continue
+        _write(book, {"op": "no_show", "id": reservation_id})
+        log_activity("reservation_released", reservation.username,
+                     f"Reservation {reservation_id} for seat {reservation.seat} in {occupancy.room_name(book.room)} "
+                     f"released: {reservation.username} did not check in", room=book.room)
+
+
+def _prune(book: _Book, now: float):
+    """Drop reservations that ended more than RETAIN_HOURS ago (hourly)."""
+    if now - book.pruned_at < 3600:
+        return
+    book.pruned_at = now
+    cutoff = now - RETAIN_HOURS * 3600 - MAX_BOOKING_HOURS * 3600
+    for intervals in (book.by_seat, book.by_user):
+        for key, entries in list(intervals.items()):
+            # Ends are ordered like starts (no overlaps), so the old ones are a prefix
+            del entries[:bisect.bisect_left(entries, (cutoff,))]
+            if not entries:
+                del intervals[key]
+    for reservation_id in [r.id for r in book.by_id.values() if r.end < cutoff]:
+        del book.by_id[reservation_id]
+
+
+def _refresh(book: _Book, now: float):
+    _sync(book)
+    _release_no_shows(book, now)
+    _prune(book, now)
+
+
+def _user_conflict(username: str, start: float, end: float):
+    """The room where the user has a reservation overlapping [start, end), or None.
+    The caller holds _booking_lock."""
+    for room in occupancy.get_rooms():
+        book = _book(room)
+        with book.lock:
+            # Only read: taking another room's file lock here could deadlock
+            # with the other process booking there
+            _sync(book)
+            if _conflicts(book.by_user.get(username, []), start, end) is not None:
+                return room
+    return None
+
+
+def _validate(book: _Book, seat: str, start: datetime, end: datetime, now: datetime):
+    if seat not in _seat_table(book)["set"]:
+        raise ValueError(f"Unknown seat {seat}")
+    if end <= start:
+        raise ValueError("A reservation must end after it starts")
+    for moment in (start, end):
+        if moment.second or moment.microsecond or moment.minute % SLOT_MINUTES:
+            raise ValueError(f"Reservations start and end on {SLOT_MINUTES}-minute slots")
+    if end - start > timedelta(hours=MAX_BOOKING_HOURS):
+        raise ValueError(f"Reservations are at most {MAX_BOOKING_HOURS} hours long")
+    if end <= now or start + timedelta(minutes=NO_SHOW_MINUTES) <= now:
+        raise ValueError("That time has already passed")
+    if start > now + timedelta(days=BOOKING_HORIZON_DAYS):
+        raise ValueError(f"Seats can be booked at most {BOOKING_HORIZON_DAYS} days ahead")
+    opening = start.replace(hour=OPENING_HOUR, minute=0)
+    closing = start.replace(hour=CLOSING_HOUR, minute=0)
+    if start < opening or end > closing:
+        raise ValueError(f"The study space is open {OPENING_HOUR}:00-{CLOSING_HOUR}:00")
+
+
+def book(username: str, seat: str, start: datetime, end: datetime, room: str = None) -> dict:
+    """Reserve seat in room (DEFAULT_ROOM if None) for [start, end). Raises
+    ValueError if the slot is invalid, the seat is taken or the user already has
+    a reservation (in any room) at that time."""
+    book = _book(room)
+    now = datetime.now()
+    _validate(book, seat, start, end, now)
+    begin, finish = start.timestamp(), end.timestamp()
+    with _booking_lock, book.lock, file_lock(book.log_file):
+        _refresh(book, time.time())
+        other = _user_conflict(username, begin, finish)
+        if other == book.room:
+            raise ValueError("You already have a reservation at that time")
+        if other is not None:
+            raise ValueError(f"You already have a reservation in {occupancy.room_name(other)} at that time")
+        if _conflicts(book.by_seat.get(seat, []), begin, finish) is not None:
+            raise ValueError(f"Seat {seat} is already booked at that time")
+        reservation_id = secrets.token_hex(6)
+        _write(book, {
+            "op": "book",
+            "id": reservation_id,
+            "seat": seat,
+            "username": username,
+            "start": start.strftime(TIMESTAMP_FORMAT),
+            "end": end.strftime(TIMESTAMP_FORMAT),
+            "created": now.strftime(TIMESTAMP_FORMAT),
+        })
+        booked = book.by_id[reservation_id].to_dict()
+    log_activity("reservation_booked", username,
+                 f"{username} booked seat {seat} in {occupancy.room_name(book.room)} for {booked['start']} - {booked['end']}",
+                 room=book.room)
+    return booked
+
+
+def _find(reservation_id: str, room: str = None):
+    """(book, reservation) holding reservation_id, looking in every room if room is None."""
+    for book in ([_book(room)] if room else [_book(r) for r in occupancy.get_rooms()]):
+        reservation = book.by_id.get(reservation_id)
+        if reservation is not None:
+            return book, reservation
+    return None, None
+
+
+def cancel(reservation_id: str, actor: str, room: str = None) -> bool:
+    """Cancel a booked reservation (its owner or an admin). False if it is not
+    booked (already claimed, cancelled, released or unknown)."""
+    book, _ = _find(reservation_id, room)
+    if book is None:
+        return False
+    with book.lock, file_lock(book.log_file):
+        _refresh(book, time.time())
+        reservation = book.by_id.get(reservation_id)
+        if reservation is None or reservation.status != "booked":
+            return False
+        _write(book, {"op": "cancel", "id": reservation_id, "by": actor})
+    log_activity("reservation_cancelled", actor,
+                 f"Reservation {reservation_id} for seat {reservation.seat} in {occupancy.room_name(book.room)} "
+                 f"cancelled by {actor}", room=book.room)
+    return True
+
+
+def active_for(username: str, now: float = None, room: str = None):
+    """The user's booked reservation in room that can be claimed right now, or None."""
+    book = _book(room)
+    now = now or time.time()
+    with book.lock:
+        _refresh(book, now)
+        entries = book.by_user.get(username, [])
+        # The reservation starting soonest after now - its length could be live
+        i = bisect.bisect_right(entries, (now + EARLY_CHECKIN_MINUTES * 60, float("inf")))
+        while i > 0:
+            start, end, reservation_id = entries[i - 1]
+            if end <= now:
+                break
+            if book.by_id[reservation_id].status == "booked":
+                return book.by_id[reservation_id]
+            i -= 1
+    return None
+
+
+def claim(reservation_id: str, room: str = None):
+    """Mark a reservation as used by its owner's check-in."""
+    book = _book(room)
+    with book.lock, file_lock(book.log_file):
+        _sync(book)
+        reservation = book.by_id.get(reservation_id)
+        if reservation is not None and reservation.status == "booked":
+            _write(book, {"op": "claim", "id": reservation_id, "at": datetime.now().strftime(TIMESTAMP_FORMAT)})
+
+
+def reserved_now(now: float = None, exclude: str = None, room: str = None) -> int:
+    """Seats of room held right now by booked, not yet claimed reservations of
+    users other than exclude. O(seats * log n)."""
+    book = _book(room)
+    now = now or time.time()
+    horizon = now + EARLY_CHECKIN_MINUTES * 60
+    count = 0
+    with book.lock:
+        _refresh(book, now)
+        for entries in book.by_seat.values():
+            i = bisect.bisect_right(entries, (horizon, float("inf")))
+            # At most two reservations of a seat are live at once: the current
+            # one and the next, once it is inside its early check-in window
+            live = [book.by_id[entries[j][2]] for j in (i - 2, i - 1) if j >= 0 and entries[j][1] > now]
+            if any(r.status == "claimed" for r in live):
+                continue
+            if any(r.status == "booked" and r.username != exclude for r in live):
+                count += 1
+    return count
+
+
+def free_seats(start: datetime, end: datetime, room: str = None) -> list:
+    """Seats of room with no live reservation overlapping [start, end)."""
+    book = _book(room)
+    begin, finish = start.timestamp(), end.timestamp()
+    with book.lock:
+        _refresh(book, time.time())
+        return [seat for seat in _seat_table(book)["list"] if _conflicts(book.by_seat.get(seat, []), begin, finish) is None]
+
+
+def free_slots(seat: str, start: datetime, end: datetime, room: str = None) -> list:
+    """Free (start, end) datetime gaps of a seat within [start, end)."""
+    book = _book(room)
+    begin, finish = start.timestamp(), end.timestamp()
+    with book.lock:
+        _refresh(book, time.time())
+        entries = book.by_seat.get(seat, [])
+        i = max(0, bisect.bisect_left(entries, (begin,)) - 1)
+        gaps, cursor = [], begin
+        while i < len(entries) and entries[i][0] < finish:
+            booked_start, booked_end, _ = entries[i]
+            if booked_start > cursor:
+                gaps.append((cursor, booked_start))
+            cursor = max(cursor, booked_end)
+            i += 1
+        if cursor < finish:
+            gaps.append((cursor, finish))
+    return [(datetime.fromtimestamp(a), datetime.fromtimestamp(b)) for a, b in gaps]
+
+
+def upcoming_for(username: str, limit: int = 10, room: str = None) -> list:
+    """The user's live reservations that haven't ended, in room or (room None)
+    in every room, soonest first."""
+    now = time.time()
+    upcoming = []
+    for book in ([_book(room)] if room else [_book(r) for r in occupancy.get_rooms()]):
+        with book.lock:
+            _refresh(book, now)
+            entries = book.by_user.get(username, [])
+            i = max(0, bisect.bisect_left(entries, (now - MAX_BOOKING_HOURS * 3600,)))
+            upcoming.extend(book.by_id[reservation_id] for start, end, reservation_id in entries[i:] if end > now)
+    upcoming.sort(key=lambda reservation: reservation.start)
+    return [reservation.to_dict() for reservation in upcoming[:limit]]
@@ -0,0 +1,403 @@
+"""Daily usage rollups: check-ins, seconds used and unique users per day, per
+user and per hour of the day, for each room.
+
+Every finished session (check_out, auto check-out) is folded into the live
+aggregates of the days and hours it overlaps as it is written; a session counts
+as one check-in in the hour it started. Live days sit in usage_rollups.json.
+
+Once FINALIZE_AFTER_DAYS more days have passed a day is final: it is rebuilt
+once from its slice of the check-in log (an index range read) and written as
+compact rows to its month's file in rollups/ (per-user rows and 24 hourly rows
+with unique-user counts). The auto check-out thread runs finalize_due, off the
+check-in path. A monthly report reads that file plus the month's
+live days instead of the raw log.
+
+Offline kiosk syncs can add sessions to any day: the days they touch are marked
+dirty and rebuilt from the log before they are next read or finalized.
+"""
+import heapq
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from log_index import iter_range
+from occupancy import DEFAULT_ROOM
+from storage import SharedState, atomic_write_json, file_lock, get_lock
+
+STATE_FILE = Path(__file__).parent / "usage_rollups.json"
+# Finalized days, one file per month: usage-YYYY-MM.json
+ROLLUP_DIR = Path(__file__).parent / "rollups"
+TIMESTAMP_FORMAT = "%m/%d/%Y, %I:%M:%S %p"
+# A day is finalized when this many further days have passed
+FINALIZE_AFTER_DAYS = 1
+# How far around a day a rebuild reads the log for sessions running into it
+SESSION_SCAN_HOURS = 24
+# Live aggregates are saved at most this often (and at exit), not per check-out
+SAVE_INTERVAL = 1.0
+TOP_USERS = 10
+
+# {"finalized_through": last final day or None, "days": {day: {room: aggregate}},
+# "dirty": [[room, first day, last day], ...]}, shared with the kiosk API process.
+# Lock order: a room's checkin_log locks, then this state's.
+_state = SharedState(STATE_FILE, lambda: {"finalized_through": None, "days": {}, "dirty": []}, SAVE_INTERVAL)
+
+
+def _day_key(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d")
+
+
+def _day_start(key: str) -> datetime:
+    return datetime.strptime(key, "%Y-%m-%d")
+
+
+def _next_key(key: str) -> str:
+    return _day_key(_day_start(key) + timedelta(days=1))
+
+
+# --- Aggregates ---
+
+def _new_aggregate() -> dict:
+    # users[u] = [check-ins, seconds]; hours[h] = [check-ins, seconds, usernames]
+    return {"checkins": 0, "seconds": 0.0, "users": {}, "hours": [[0, 0.0, []] for _ in range(24)]}
+
+
+def _slices(start: datetime, end: datetime):
+    """Split [start, end) at hour boundaries: yields (day key, hour, seconds)."""
+    cursor = start
+    while cursor < end:
+        boundary = min(end, cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1))
+        yield _day_key(cursor), cursor.hour, (boundary - cursor).total_seconds()
+        cursor = boundary
+
+
+def _fold_session(days: dict, room: str, username: str, start: datetime, end: datetime, counted: bool = True):
+    """Add [start, end) of a session to days[day][room]; counted says whether
+    start is the session's check-in (else it is the clipped start of a slice).
+    A zero-length session still counts as a check-in."""
+    slices = list(_slices(start, end))
+    if not slices and counted:
+        slices = [(_day_key(start), start.hour, 0.0)]
+    for key, hour, seconds in slices:
+        aggregate = days.setdefault(key, {}).setdefault(room, _new_aggregate())
+        user = aggregate["users"].setdefault(username, [0, 0.0])
+        bucket = aggregate["hours"][hour]
+        if counted:
+            aggregate["checkins"] += 1
+            user[0] += 1
+            bucket[0] += 1
+            counted = False
+        aggregate["seconds"] += seconds
+        user[1] += seconds
+        bucket[1] += seconds
+        if username not in bucket[2]:
+            bucket[2].append(username)
+
+
+def _compact(aggregate: dict) -> dict:
+    """Finalized row of a day: unique-user counts instead of hourly username lists."""
+    return {
+        "checkins": aggregate["checkins"],
+        "seconds": round(aggregate["seconds"]),
+        "unique_users": len(aggregate["users"]),
+        "users": {username: [checkins, round(seconds)] for username, (checkins, seconds) in aggregate["users"].items()},
+        "hours": [[checkins, round(seconds), len(users)] for checkins, seconds, users in aggregate["hours"]],
+    }
+
+
+# --- Dirty ranges ---
+
+def _add_dirty(state: dict, room: str, first: str, last: str):
+    """Mark first..last of room for a rebuild, merging overlapping or adjacent ranges."""
+    ranges = sorted([item for item in state["dirty"] if item[0] == room] + [[room, first, last]],
+                    key=lambda item: item[1])
+    merged = []
+    for item in ranges:
+        if merged and item[1] <= _next_key(merged[-1][2]):
+            merged[-1][2] = max(merged[-1][2], item[2])
+        else:
+            merged.append(list(item))
+    state["dirty"] = [item for item in state["dirty"] if item[0] != room] + merged
+
+
+def _clear_dirty(state: dict, room: str, first: str, last: str):
+    """Drop first..last of room from the dirty ranges, splitting any that stick out."""
+    kept = []
+    for item in state["dirty"]:
+        if item[0] != room or item[2] < first or item[1] > last:
+            kept.append(item)
+            continue
+        if item[1] < first:
+            kept.append([room, item[1], _day_key(_day_start(first) - timedelta(days=1))])
+        if item[2] > last:
+            kept.append([room, _next_key(last), item[2]])
+    state["dirty"] = kept
+
+
+# --- Incremental updates ---
+
+def add_session(username: str, check_in_time: str, check_out: datetime, room: str = DEFAULT_ROOM):
+    """Fold a finished session into the live days it overlaps. checkin_log calls
+    this right after writing the check-out, still holding the room's log locks."""
+    try:
+        start = datetime.strptime(check_in_time, TIMESTAMP_FORMAT)
+    except Exception:
+        return
+    if check_out < start:
+        return
+
+    def _fold(state):
+        finalized = state["finalized_through"]
+        begin, counted = start, True
+        if finalized is not None and _day_key(start) <= finalized:
+            # Part of it is in days that are already final: rebuild those from the log
+            _add_dirty(state, room, _day_key(start), min(finalized, _day_key(check_out)))
+            begin, counted = max(start, _day_start(finalized) + timedelta(days=1)), False
+        _fold_session(state["days"], room, username, begin, check_out, counted)
+
+    _state.update(_fold)
+
+
+def mark_dirty(moments, room: str = DEFAULT_ROOM):
+    """Rebuild the days around these moments (a day either side, for sessions
+    across midnight) from the log before they are next read. For records written
+    without a check-out of their own, e.g. by an offline sync."""
+    moments = sorted(moments)
+
+    def _mark(state):
+        for moment in moments:
+            _add_dirty(state, room, _day_key(moment - timedelta(days=1)), _day_key(moment + timedelta(days=1)))
+
+    _state.update(_mark)
+
+
+# --- Rebuilds from the log ---
+
+def _scan_days(room: str, first: str, last: str) -> dict:
+    """{day: {room: aggregate}} for first..last of room, from its check-in log.
+    Caller holds the room's checkin_log lock."""
+    # Imported here: checkin_log imports this module
+    import checkin_log
+
+    start, end = _day_start(first), _day_start(last) + timedelta(days=1)
+    margin = timedelta(hours=SESSION_SCAN_HOURS)
+    open_since, days = {}, {}
+    for record in iter_range(checkin_log._partition(room).log_file, start - margin, end + margin):
+        try:
+            moment = datetime.strptime(record.get("timestamp"), TIMESTAMP_FORMAT)
+        except Exception:
+            continue
+        username = record.get("username")
+        if record.get("status") == "checked_in":
+            open_since[username] = moment
+            continue
+        began = open_since.pop(username, None)
+        if began is not None and began < end and (moment > start or began >= start):
+            _fold_session(days, room, username, max(began, start), min(moment, end), began >= start)
+    return days
+
+
+def _read_month(month: str) -> dict:
+    try:
+        with open(ROLLUP_DIR / f"usage-{month}.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {"days": {}}
+
+
+def _write_final(room: str, first: str, last: str, days: dict):
+    """Replace room's rows for first..last in the month files."""
+    months = {}
+    key = first
+    while key <= last:
+        months.setdefault(key[:7], []).append(key)
+        key = _next_key(key)
+    for month, keys in months.items():
+        path = ROLLUP_DIR / f"usage-{month}.json"
+        # Other rooms' rows may be rewritten by the other process at the same time
+        with get_lock(path).write(), file_lock(path):
+            data = _read_month(month)
+            for key in keys:
+                rooms = data["days"].setdefault(key, {})
+                if room in days.get(key, {}):
+                    rooms[room] = _compact(days[key][room])
+                else:
+                    rooms.pop(room, None)
+                if not rooms:
+                    del data["days"][key]
+            data["days"] = dict(sorted(data["days"].items()))
+            atomic_write_json(path, data, indent=None)
+
+
+def _rebuild(room: str, first: str, last: str):
+    """Recompute first..last of room from its log: final days are rewritten in
+    their month files, live ones replace the live aggregates."""
+    import checkin_log
+
+    part = checkin_log._partition(room)
+    # No check-out of this room (in either process) can land between the scan
+    # and replacing the days, where it would be counted twice or not at all
+    with part.lock, file_lock(part.log_file):
+        days = _scan_days(room, first, last)
+
+        def _replace(state):
+            # Forced, so this runs once under the state's file lock: it may write the month files
+            finalized = state["finalized_through"] or ""
+            if first <= finalized:
+                _write_final(room, first, min(last, finalized), days)
+            key = max(first, _next_key(finalized)) if finalized else first
+            while key <= last:
+                live = state["days"].setdefault(key, {})
+                if room in days.get(key, {}):
+                    live[room] = days[key][room]
+                else:
+                    live.pop(room, None)
+                if not live:
+                    del state["days"][key]
+                key = _next_key(key)
+            _clear_dirty(state, room, first, last)
+
+        _state.update(_replace, force=True)
+
+
+def _refresh(first: str = None, last: str = None):
+    """Rebuild the dirty days (only those overlapping first..last, if given)."""
+    dirty = [list(item) for item in _state.read()["dirty"]
+             if (first is None or item[2] >= first) and (last is None or item[1] <= last)]
+    for room, range_first, range_last in dirty:
+        try:
+            _rebuild(room, range_first, range_last)
+        except ValueError:
+            # The room is no longer configured
+            _state.update(lambda state: _clear_dirty(state, room, range_first, range_last))
+
+
+def finalize_due(now: datetime = None):
+    """Finalize every day before the last FINALIZE_AFTER_DAYS. A cheap no-op
+    once done for the day; the first run also rolls up the log's whole history."""
+    import checkin_log
+
+    through = _day_key((now or datetime.now()) - timedelta(days=FINALIZE_AFTER_DAYS + 1))
+    finalized = _state.read()["finalized_through"]
+    if finalized is not None and finalized >= through:
+        return
+    if finalized is not None:
+        first = _next_key(finalized)
+    else:
+        # First run: roll up everything since the oldest record of any room
+        moments = [moment for moment in map(_first_moment, checkin_log.log_files()) if moment is not None]
+        first = _day_key(min(moments)) if moments else None
+    rooms = checkin_log.rooms()
+
+    def _finalize(state):
+        # The days are rebuilt from the log (exact, including the other process's
+        # writes) under each room's locks; marking them first keeps that safe
+        # against check-outs in between and against a crash halfway
+        if state["finalized_through"] is not None and state["finalized_through"] >= through:
+            return
+        for key in [key for key in state["days"] if key <= through]:
+            del state["days"][key]
+        if first is not None and first <= through:
+            for room in rooms:
+                _add_dirty(state, room, first, through)
+        state["finalized_through"] = through
+
+    _state.update(_finalize, force=True)
+    _refresh()
+
+
+def _first_moment(item):
+    """Timestamp of the first record of a (room, log file), if any."""
+    for record in iter_range(item[1]):
+        try:
+            return datetime.strptime(record.get("timestamp"), TIMESTAMP_FORMAT)
+        except Exception:
+            continue
+    return None
+
+
+# --- Reports ---
+
+def _rows(first: str, last: str, room: str = None) -> dict:
+    """{day: {room: compact row}} for first..last from the month files and the
+    live days, after rebuilding dirty ones. room None means every room."""
+    _refresh(first, last)
+    days = {}
+    month = first[:7]
+    while month <= last[:7]:
+        for key, rooms in _read_month(month)["days"].items():
+            if first <= key <= last:
+                days[key] = dict(rooms)
+        year, number = int(month[:4]), int(month[5:])
+        month = f"{year + number // 12:04d}-{number % 12 + 1:02d}"
+    with _state.lock:
+        for key, rooms in _state.read()["days"].items():
+            if first <= key <= last:
+                days.setdefault(key, {}).update({name: _compact(aggregate) for name, aggregate in rooms.items()})
+    if room is not None:
+        days = {key: {room: rooms[room]} for key, rooms in days.items() if room in rooms}
+    return dict(sorted(days.items()))
+
+
+def _combine(rooms: dict) -> dict:
+    """One row for several rooms' rows of a day. Unique users are exact for the
+    day; per hour they are summed over rooms."""
+    users, hours = {}, [[0, 0, 0] for _ in range(24)]
+    for row in rooms.values():
+        for username, (checkins, seconds) in row["users"].items():
+            total = users.setdefault(username, [0, 0])
+            total[0] += checkins
+            total[1] += seconds
+        for hour, values in enumerate(row["hours"]):
+            for index, value in enumerate(values):
+                hours[hour][index] += value
+    return {
+        "checkins": sum(row["checkins"] for row in rooms.values()),
+        "seconds": sum(row["seconds"] for row in rooms.values()),
+        "unique_users": len(users),
+        "users": users,
+        "hours": hours,
+    }
+
+
+def day_rollup(day, room: str = None) -> dict:
+    """The rollup row of one day (a date, datetime or "YYYY-MM-DD"): {"checkins",
+    "seconds", "unique_users", "users": {u: [checkins, seconds]},
+    "hours": [[checkins, seconds, unique users]] * 24}."""
+    key = day if isinstance(day, str) else day.strftime("%Y-%m-%d")
+    return _combine(_rows(key, key, room).get(key, {}))
+
+
+def monthly_report(year: int, month: int, room: str = None) -> dict:
+    """Usage of a month from its rollup rows: totals, a per-day series, the top
+    users by time spent and the hourly profile ("user_days" is the number of
+    (user, day) pairs active in that hour)."""
+    first = f"{year:04d}-{month:02d}-01"
+    last = _day_key(_day_start(f"{year + month // 12:04d}-{month % 12 + 1:02d}-01") - timedelta(days=1))
+    days = {key: _combine(rooms) for key, rooms in _rows(first, last, room).items()}
+    users, hourly = {}, [{"hour": hour, "checkins": 0, "seconds": 0, "user_days": 0} for hour in range(24)]
+    for row in days.values():
+        for username, (checkins, seconds) in row["users"].items():
+            total = users.setdefault(username, [0, 0])
+            total[0] += checkins
+            total[1] += seconds
+        for hour, (checkins, seconds, unique) in enumerate(row["hours"]):
+            hourly[hour]["checkins"] += checkins
+            hourly[hour]["seconds"] += seconds
+            hourly[hour]["user_days"] += unique
+    seconds = sum(row["seconds"] for row in days.values())
+    busiest = max(hourly, key=lambda item: item["seconds"])
+    return {
+        "month": first[:7],
+        "room": room,
+        "checkins": sum(row["checkins"] for row in days.values()),
+        "seconds": seconds,
+        "hours": round(seconds / 3600, 1),
+        "unique_users": len(users),
+        "days": [{"day": key, "checkins": row["checkins"], "seconds": row["seconds"],
+                  "unique_users": row["unique_users"]} for key, row in days.items()],
+        "top_users": [{"username": username, "checkins": checkins, "seconds": seconds}
+                      for username, (checkins, seconds) in heapq.nlargest(
+                          TOP_USERS, users.items(), key=lambda item: item[1][1])],
+        "hourly": hourly,
+        "busiest_hour": busiest["hour"] if busiest["seconds"] else None,
+    }
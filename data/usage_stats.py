@@ -0,0 +1,179 @@
+import math
+from pathlib import Path
+from datetime import datetime, timedelta
+from activity_log import log_activity
+from storage import SharedState
+
+STATS_FILE = Path(__file__).parent / "usage_stats.json"
+TIMESTAMP_FORMAT = "%m/%d/%Y, %I:%M:%S %p"
+
+# A user needs this many past samples before their own history is trusted
+MIN_SAMPLES = 10
+Z_THRESHOLD = 3.0
+# Tukey fences for the batch IQR test
+IQR_FACTOR = 1.5
+# A (day, hour) bucket is a spike if it exceeds the same hour's history by this many std devs
+SPIKE_Z_THRESHOLD = 3.0
+SPIKE_HISTORY_DAYS = 28
+# Per-event observations are saved at most this often (and at exit), not per check-in
+SAVE_INTERVAL = 1.0
+
+# Shared with the kiosk API process: each one's observations are merged on save
+_stats = SharedState(STATS_FILE, lambda: {"users": {}, "scored_days": []}, SAVE_INTERVAL)
+
+
+# --- Rolling per-user statistics (Welford) ---
+
+def _welford_update(acc: dict, value: float):
+    acc["n"] = acc.get("n", 0) + 1
+    delta = value - acc.get("mean", 0.0)
+    acc["mean"] = acc.get("mean", 0.0) + delta / acc["n"]
+    acc["m2"] = acc.get("m2", 0.0) + delta * (value - acc["mean"])
+
+
+def _z_score(acc: dict, value: float):
+    """z-score of value against the accumulator, or None if there's too little history."""
+    n = acc.get("n", 0)
+    if n < MIN_SAMPLES:
+        return None
+    std = math.sqrt(acc["m2"] / (n - 1))
+    if std == 0:
+        return None
+    return (value - acc["mean"]) / std
+
+
+def _observe(username: str, metric: str, value: float):
+    """Score value against the user's history, then fold it in. Returns the z-score."""
+    def _fold(stats):
+        acc = stats["users"].setdefault(username, {}).setdefault(metric, {})
+        z = _z_score(acc, value)
+        _welford_update(acc, value)
+        return z
+
+    return _stats.update(_fold)
+
+
+def observe_checkin(username: str, moment: datetime):
+    """Incremental check on the hour a user checks in (e.g. a 3 AM visit)."""
+    hour = moment.hour + moment.minute / 60
+    z = _observe(username, "checkin_hour", hour)
+    if z is not None and abs(z) >= Z_THRESHOLD:
+        log_activity(
+            "anomaly_unusual_hour",
+            username,
+            f"Check-in at {moment.strftime('%I:%M %p')} is unusual for {username} (z={z:.1f})",
+        )
+
+
+def observe_session(username: str, check_in_time: str, check_out_time: datetime):
+    """Incremental check on a finished session's length (e.g. a marathon session)."""
+    try:
+        started = datetime.strptime(check_in_time, TIMESTAMP_FORMAT)
+    except Exception:
+        return
+    seconds = (check_out_time - started).total_seconds()
+    z = _observe(username, "session_seconds", seconds)
+    if z is not None and abs(z) >= Z_THRESHOLD:
+        log_activity(
+            "anomaly_long_session" if z > 0 else "anomaly_short_session",
+            username,
+            f"Session of {seconds / 3600:.1f}h is unusual for {username} (z={z:.1f})",
+        )
+
+
+def get_user_stats(username: str) -> dict:
+    """Mean/std of each tracked metric for a user."""
+    with _stats.lock:
+        user = _stats.read()["users"].get(username, {})
+        result = {}
+        for metric, acc in user.items():
+            n = acc.get("n", 0)
+            result[metric] = {
+                "n": n,
+                "mean": acc.get("mean", 0.0),
+                "std": math.sqrt(acc["m2"] / (n - 1)) if n > 1 else 0.0,
+            }
+        return result
+
+
+# --- Batch scoring over a whole day (vectorized) ---
+
+def score_day(day: datetime = None, write_events: bool = True) -> list:
+    """Score every session and hourly check-in count of one day in bulk.
+    Sessions are tested with z-scores and IQR fences against all sessions; hourly
+    check-in counts are compared with the same hour on previous days. Each day is
+    only written to the activity log once."""
+    # Imported here: occupancy_analytics imports checkin_log, which imports this module
+    import numpy as np
+    from occupancy_analytics import load_events, pair_sessions, DAY, HOUR, _local_seconds
+
+    day = (day or datetime.now() - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    day_start = _local_seconds(day)
+    day_end = day_start + DAY
+
+    times, user_codes, is_checkin, usernames = load_events()
+    starts, ends, codes = pair_sessions(times, user_codes, is_checkin)
+    durations = ends - starts
+    findings = []
+
+    # Session lengths: population z-score and IQR fences, flag outliers that started that day
+    if len(durations) >= MIN_SAMPLES:
+        mean = durations.mean()
+        std = durations.std()
+        q1, q3 = np.percentile(durations, [25, 75])
+        upper = q3 + IQR_FACTOR * (q3 - q1)
+        lower = q1 - IQR_FACTOR * (q3 - q1)
+        z = (durations - mean) / std if std > 0 else np.zeros_like(durations)
+        on_day = (starts >= day_start) & (starts < day_end)
+        outliers = on_day & ((np.abs(z) >= Z_THRESHOLD) | (durations > upper) | (durations < lower))
+        for i in np.flatnonzero(outliers):
+            findings.append({
+                "event_type": "anomaly_long_session" if durations[i] > mean else "anomaly_short_session",
+                "username": usernames[codes[i]],
+                "description": f"Session of {durations[i] / 3600:.1f}h on {day.strftime('%m/%d/%Y')} is an outlier (z={z[i]:.1f}, IQR fence {upper / 3600:.1f}h)",
+            })
+
+    # Check-in spikes: each hour of the day against the same hour on previous days
+    checkins = times[is_checkin]
+    history_start = day_start - SPIKE_HISTORY_DAYS * DAY
+    window = checkins[(checkins >= history_start) & (checkins < day_end)]
+    if len(window):
+        day_index = ((window - history_start) // DAY).astype(np.int64)
+        hour_index = ((window % DAY) // HOUR).astype(np.int64)
+        counts = np.zeros((SPIKE_HISTORY_DAYS + 1, 24))
+        np.add.at(counts, (day_index, hour_index), 1)
+        past, current = counts[:-1], counts[-1]
+        mean = past.mean(axis=0)
+        std = past.std(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = np.where(std > 0, (current - mean) / std, 0.0)
+        for hour in np.flatnonzero((z >= SPIKE_Z_THRESHOLD) & (current > mean + 1)):
+            findings.append({
+                "event_type": "anomaly_checkin_spike",
+                "username": "system",
+                "description": f"{int(current[hour])} check-ins at {hour:02d}:00 on {day.strftime('%m/%d/%Y')} (usual {mean[hour]:.1f}, z={z[hour]:.1f})",
+            })
+
+    if write_events:
+        key = day.strftime("%Y-%m-%d")
+
+        def _mark_scored(stats):
+            if key in stats["scored_days"]:
+                return True
+            stats["scored_days"] = (stats["scored_days"] + [key])[-366:]
+            return False
+
+        # Forced: checked and marked under the file lock, so only one process writes the events
+        already_scored = _stats.update(_mark_scored, force=True)
+        if not already_scored:
+            for finding in findings:
+                log_activity(finding["event_type"], finding["username"], finding["description"])
+    return findings
+
+
+def score_previous_day():
+    """Score yesterday once; cheap no-op after the first call of the day."""
+    key = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    if key in _stats.read()["scored_days"]:
+        return
+    score_day()
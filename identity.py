@@ -0,0 +1,123 @@
+"""Per-session identity cache: the signed-in user's record and role.
+
+Resolved once at sign-in and then read in O(1) by every route. Each entry
+carries the users-store version it was resolved at. The cache subscribes to the
+users store's change events: when a write changes a signed-in user (role change,
+rename, profile edit) their entry is refreshed, and when the user is locked or
+deleted the session is signed out and sent to the login screen right away
+instead of on its next login.
+"""
+import threading
+import weakref
+
+import flet as ft
+
+from activity_log import log_activity
+from records import UserRecord
+from users_data import _users_store
+
+
+class Identity:
+    __slots__ = ("username", "record", "role", "version", "_raw")
+
+    def __init__(self, username: str, raw: dict, version: int):
+        self.username = username
+        self.record = UserRecord.from_dict(username, raw)
+        self.role = "Admin" if raw.get("role") == "Admin" else "User"
+        self.version = version
+        self._raw = dict(raw)
+
+
+# session id -> (weak page reference, Identity)
+_sessions = {}
+_lock = threading.Lock()
+
+
+def _session_key(page):
+    return getattr(page, "session_id", None)
+
+
+def _set_session(page, username: str, role: str):
+    page.session.set("current_user", username)
+    page.session.set("user_role", role)
+
+
+def sign_in(page, username: str):
+    """Resolve and cache the identity of a user who just logged in. Returns None
+    (and caches nothing) if the account is missing or locked."""
+    username = username.strip().lower()
+    raw = _users_store.read().get(username)
+    if raw is None or raw.get("locked"):
+        return None
+    identity = Identity(username, raw, _users_store.version)
+    with _lock:
+        _sessions[_session_key(page)] = (weakref.ref(page), identity)
+    _set_session(page, username, identity.role)
+    return identity
+
+
+def sign_out(page):
+    with _lock:
+        _sessions.pop(_session_key(page), None)
+    _set_session(page, "", "User")
+
+
+def current(page):
+    """The session's identity, or None when nobody is signed in."""
+    entry = _sessions.get(_session_key(page))
+    if entry is not None:
+        return entry[1]
+    username = page.session.get("current_user")
+    if not username:
+        return None
+    # Signed in before the cache existed (e.g. a restored session): resolve once
+    identity = sign_in(page, username)
+    if identity is None:
+        _set_session(page, "", "User")
+    return identity
+
+
+def current_role(page) -> str:
+    identity = current(page)
+    return identity.role if identity is not None else "User"
+
+
+def _evict(page, username: str, reason: str):
+    sign_out(page)
+    log_activity("logout", username, f"Session of {username} ended: {reason}")
+    try:
+        page.snack_bar = ft.SnackBar(ft.Text(f"You were signed out: {reason}"), bgcolor=ft.Colors.RED_700)
+        page.snack_bar.open = True
+        page.go("/login")
+    except Exception:
+        pass
+
+
+def _on_users_changed(users: dict):
+    """Users store change event: refresh, or evict, every affected session."""
+    version = _users_store.version
+    evicted = []
+    with _lock:
+        for key, (page_ref, identity) in list(_sessions.items()):
+            page = page_ref()
+            if page is None:
+                del _sessions[key]
+                continue
+            # Follow the session's own username so a profile rename isn't mistaken for a delete
+            username = (page.session.get("current_user") or identity.username).strip().lower()
+            raw = users.get(username)
+            if raw is None or raw.get("locked"):
+                del _sessions[key]
+                evicted.append((page, username, "account deleted" if raw is None else "account locked"))
+            elif raw != identity._raw or username != identity.username:
+                refreshed = Identity(username, raw, version)
+                _sessions[key] = (page_ref, refreshed)
+                if refreshed.role != identity.role or username != identity.username:
+                    _set_session(page, username, refreshed.role)
+            else:
+                identity.version = version
+    for page, username, reason in evicted:
+        _evict(page, username, reason)
+
+
+_users_store.subscribe(_on_users_changed)
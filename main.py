@@ -1,3 +1,5 @@
+import os
+import secrets
 import flet as ft
 
 # Import reusable components and layouts
@@ -14,6 +16,11 @@ from views.users_view import users_view
 from views.auditlogs_view import audit_logs_view
 from views.settings_view import settings_view
 from users_data import get_user, ensure_default_admin_user
+from storage import transactional
+from identity import current_role
+import sessions
+from user_import import UPLOAD_DIR
+import auto_checkout
 
 
 def main(page: ft.Page):
@@ -31,12 +38,18 @@ def main(page: ft.Page):
     page.session.set("current_user", "")
     page.session.set("user_role", "User")  # Default to User role
 
+    # Track activity; idle and disconnected sessions release their views and caches
+    sessions.register(page)
+
+    # Each render reads every store at most once (shared snapshot)
+    @transactional
     def route_change(route):
         page.views.clear()
 
         # Get current user role
         current_user = page.session.get("current_user")
-        user_role = page.session.get("user_role") or "User"
+        # O(1) from the identity cache, kept current by users-store change events
+        user_role = current_role(page)
 
         # The initial landing page
         if page.route == "/":
@@ -86,5 +99,9 @@ def main(page: ft.Page):
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", "8000"))
-    ft.app(target=main, view=ft.AppView.WEB_BROWSER, host="0.0.0.0", port=port)
+    # Uploads (user import sheets) need a signing key for their upload URLs
+    os.environ.setdefault("FLET_SECRET_KEY", secrets.token_hex(32))
+    # Close sessions of students who forgot to check out
+    auto_checkout.start()
+    ft.app(target=main, view=ft.AppView.WEB_BROWSER, host="0.0.0.0", port=port, upload_dir=str(UPLOAD_DIR))
 
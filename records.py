@@ -0,0 +1,234 @@
+"""Compact record types shared by the stores.
+
+Records use __slots__ (no per-instance __dict__) and store repeated categorical
+values (role, status, event type) as shared enum members, and timestamps as epoch
+floats. Conversion to/from plain dicts happens only at the JSON/DB boundary via
+from_dict()/to_dict().
+"""
+import sys
+from enum import Enum
+from datetime import datetime
+
+TIMESTAMP_FORMAT = "%m/%d/%Y, %I:%M:%S %p"
+
+
+class _StrEnum(str, Enum):
+    """String enum that prints and formats as its plain value."""
+
+    def __str__(self):
+        return self.value
+
+    def __format__(self, spec):
+        return format(self.value, spec)
+
+
+class Role(_StrEnum):
+    ADMIN = "Admin"
+    USER = "User"
+
+
+class UserStatus(_StrEnum):
+    ACTIVE = "Active"
+    INACTIVE = "Inactive"
+
+
+class CheckinStatus(_StrEnum):
+    CHECKED_IN = "checked_in"
+    CHECKED_OUT = "checked_out"
+
+
+class EventType(_StrEnum):
+    LOGIN_SUCCESS = "login_success"
+    LOGIN_FAILED = "login_failed"
+    LOGOUT = "logout"
+    USER_CREATED = "user_created"
+    USER_DELETED = "user_deleted"
+    USER_LOCKED = "user_locked"
+    USER_UNLOCKED = "user_unlocked"
+    PROFILE_UPDATED = "profile_updated"
+    CHECK_IN = "check_in"
+    CHECK_OUT = "check_out"
+
+
+def _enum_or_intern(enum_cls, value):
+    """Map a stored string to its enum member; unknown values are interned so
+    repeated strings still share one object."""
+    if value is None:
+        return None
+    try:
+        return enum_cls(value)
+    except ValueError:
+        return sys.intern(str(value))
+
+
+def _to_epoch(timestamp):
+    if not timestamp:
+        return None
+    try:
+        return datetime.strptime(timestamp, TIMESTAMP_FORMAT).timestamp()
+    except Exception:
+        return None
+
+
+def _format_epoch(epoch):
+    if epoch is None:
+        return None
+    return datetime.fromtimestamp(epoch).strftime(TIMESTAMP_FORMAT)
+
+
+def _plain(value):
+    # Enum members serialize as their value
+    return value.value if isinstance(value, Enum) else value
+
+
+class _Record:
+    __slots__ = ()
+
+    def get(self, key: str, default=None):
+        """Dict-style access for callers that still treat records as dicts.
+        Missing and None fields both return `default`."""
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+
+class UserRecord(_Record):
+    __slots__ = ("username", "name", "email", "role", "status", "twofa", "last_login", "locked", "password_hash")
+
+    def __init__(self, username, name="", email="", role=Role.USER, status=UserStatus.ACTIVE,
+                 twofa=False, last_login="", locked=False, password_hash=None):
+        self.username = username
+        self.name = name
+        self.email = email
+        self.role = role
+        self.status = status
+        self.twofa = twofa
+        self.last_login = last_login
+        self.locked = locked
+        self.password_hash = password_hash
+
+    @classmethod
+    def from_dict(cls, username: str, data: dict):
+        return cls(
+            username,
+            data.get("name", ""),
+            data.get("email", ""),
+            _enum_or_intern(Role, data.get("role", "User")),
+            _enum_or_intern(UserStatus, data.get("status", "Active")),
+            bool(data.get("twofa", False)),
+            data.get("last_login", ""),
+            bool(data.get("locked", False)),
+            data.get("password_hash"),
+        )
+
+    def to_dict(self) -> dict:
+        """The users.json value for this user (the username is the key)."""
+        data = {
+            "email": self.email,
+            "name": self.name,
+            "role": _plain(self.role),
+            "status": _plain(self.status),
+            "twofa": self.twofa,
+            "last_login": self.last_login,
+            "locked": self.locked,
+        }
+        if self.password_hash:
+            data["password_hash"] = self.password_hash
+        return data
+
+
+class CheckinEvent(_Record):
+    __slots__ = ("username", "status", "_timestamp", "_check_in_time", "duration", "prev", "room")
+
+    def __init__(self, username, status, timestamp=None, check_in_time=None, duration=None, prev=None, room=None):
+        self.username = username
+        self.status = status
+        self._timestamp = timestamp
+        self._check_in_time = check_in_time
+        self.duration = duration
+        self.prev = prev
+        # None for records logged before check-ins were split by room
+        self.room = room
+
+    @property
+    def timestamp(self):
+        return _format_epoch(self._timestamp)
+
+    @property
+    def check_in_time(self):
+        return _format_epoch(self._check_in_time)
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            sys.intern(data.get("username") or ""),
+            _enum_or_intern(CheckinStatus, data.get("status", "checked_out")),
+            _to_epoch(data.get("timestamp")),
+            _to_epoch(data.get("check_in_time")),
+            data.get("duration"),
+            data.get("prev"),
+            sys.intern(data["room"]) if data.get("room") else None,
+        )
+
+    def to_dict(self) -> dict:
+        data = {
+            "username": self.username,
+            "status": _plain(self.status),
+            "check_in_time": self.check_in_time,
+            "timestamp": self.timestamp,
+        }
+        if self.duration is not None:
+            data["duration"] = self.duration
+        if self.prev is not None:
+            data["prev"] = self.prev
+        if self.room:
+            data["room"] = self.room
+        return data
+
+
+class ActivityEvent(_Record):
+    __slots__ = ("event_type", "username", "_timestamp", "description", "ip_address", "room")
+
+    def __init__(self, event_type, username, timestamp=None, description="", ip_address=None, room=None):
+        self.event_type = event_type
+        self.username = username
+        self._timestamp = timestamp
+        self.description = description
+        self.ip_address = ip_address
+        self.room = room
+
+    @property
+    def timestamp(self):
+        return _format_epoch(self._timestamp)
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            _enum_or_intern(EventType, data.get("event_type", "Unknown")),
+            sys.intern(data.get("username") or ""),
+            _to_epoch(data.get("timestamp")),
+            data.get("description", ""),
+            data.get("ip_address"),
+            data.get("room"),
+        )
+
+    def to_dict(self) -> dict:
+        data = {
+            "event_type": _plain(self.event_type),
+            "username": self.username,
+            "timestamp": self.timestamp,
+            "description": self.description,
+        }
+        if self.ip_address:
+            data["ip_address"] = self.ip_address
+        if self.room:
+            data["room"] = self.room
+        return data
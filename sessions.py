@@ -0,0 +1,230 @@
+"""Registry of live Flet sessions: last activity, idle eviction and cleanup.
+
+Every page is registered when its session starts. Any event from the browser
+(clicks, typing, navigation) counts as activity. The heavy per-session state
+(the current view's controls and the closures and data they hold, overlays, and
+whatever a view registered with `on_end`) is released:
+
+- on disconnect (browser closed, tab lost its connection): the view is dropped
+  and rebuilt if the same session reconnects before Flet expires it;
+- on close (Flet expired the session): all of that plus the sign-in and its
+  identity cache entry, and the session leaves the registry;
+- after SESSION_IDLE_TTL seconds without activity: a signed-in user is signed
+  out and sent to the login screen; a session that is also disconnected is
+  dropped from the registry.
+
+    sessions.register(page)                      # once, in main()
+    sessions.on_end(page, unsubscribe)           # view-level subscriptions
+    sessions.gauge()                             # live sessions and memory
+"""
+import os
+import sys
+import threading
+import time
+import weakref
+
+from activity_log import log_activity
+from identity import sign_out
+
+# Seconds without any browser event before a session is evicted
+IDLE_TTL = int(os.environ.get("SESSION_IDLE_TTL", 30 * 60))
+# How often the idle sweep runs
+SWEEP_INTERVAL = int(os.environ.get("SESSION_SWEEP_INTERVAL", 60))
+
+
+class Session:
+    __slots__ = ("id", "page", "started", "last_activity", "connected", "_cleanups")
+
+    def __init__(self, page):
+        self.id = page.session_id
+        self.page = weakref.ref(page)
+        self.started = self.last_activity = time.monotonic()
+        self.connected = True
+        self._cleanups = []
+
+    def idle_seconds(self, now: float = None) -> float:
+        return (now or time.monotonic()) - self.last_activity
+
+
+# session id -> Session
+_sessions = {}
+_lock = threading.Lock()
+_sweeper = None
+
+
+def register(page):
+    """Track a new session and hook its connect/disconnect/close events."""
+    global _sweeper
+    session = Session(page)
+    with _lock:
+        _sessions[session.id] = session
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=_sweep_forever, name="session-sweeper", daemon=True)
+            _sweeper.start()
+
+    # Wrap the page's event entry point so every browser event marks the session active
+    handle_event = page.on_event_async
+
+    async def _on_event(e):
+        session.last_activity = time.monotonic()
+        await handle_event(e)
+
+    page.on_event_async = _on_event
+    page.on_connect = lambda e: _on_connect(page)
+    page.on_disconnect = lambda e: _on_disconnect(page)
+    page.on_close = lambda e: end(page, "closed")
+    return session
+
+
+def on_end(page, callback):
+    """Run callback() when the session's state is released (disconnect, idle
+    eviction or close), e.g. to drop a pub/sub subscription."""
+    session = _sessions.get(page.session_id)
+    if session is not None:
+        session._cleanups.append(callback)
+
+
+def _run_cleanups(session):
+    cleanups, session._cleanups = session._cleanups, []
+    for callback in cleanups:
+        try:
+            callback()
+        except Exception:
+            pass
+
+
+def _release_view(page):
+    """Drop the controls (and the closures and data they hold) of the current view."""
+    try:
+        page.views.clear()
+        page.overlay.clear()
+        page.controls.clear()
+        # Removes them from the page's control index too
+        page.update()
+    except Exception:
+        pass
+
+
+def _on_disconnect(page):
+    session = _sessions.get(page.session_id)
+    if session is None:
+        return
+    session.connected = False
+    _run_cleanups(session)
+    _release_view(page)
+
+
+def _on_connect(page):
+    session = _sessions.get(page.session_id)
+    if session is None:
+        session = register(page)
+    session.connected = True
+    session.last_activity = time.monotonic()
+    # The view was released on disconnect: rebuild it for the returning browser
+    page.go(page.route or "/")
+
+
+def end(page, reason: str):
+    """Release everything the session holds and forget it."""
+    with _lock:
+        session = _sessions.pop(page.session_id, None)
+    if session is not None:
+        _run_cleanups(session)
+    username = page.session.get("current_user")
+    sign_out(page)
+    if username:
+        log_activity("logout", username, f"Session of {username} ended: {reason}")
+    _release_view(page)
+
+
+def _evict_idle(session):
+    page = session.page()
+    if page is None:
+        with _lock:
+            _sessions.pop(session.id, None)
+        return
+    reason = f"idle for {IDLE_TTL // 60} min"
+    if not session.connected:
+        end(page, reason)
+        return
+    username = page.session.get("current_user")
+    if not username:
+        return
+    sign_out(page)
+    _run_cleanups(session)
+    log_activity("logout", username, f"Session of {username} ended: {reason}")
+    try:
+        page.go("/login")
+    except Exception:
+        pass
+
+
+def sweep(now: float = None) -> int:
+    """Evict sessions idle for longer than IDLE_TTL. Returns how many."""
+    now = now or time.monotonic()
+    with _lock:
+        idle = [s for s in _sessions.values() if s.idle_seconds(now) > IDLE_TTL]
+    evicted = 0
+    for session in idle:
+        page = session.page()
+        # Already-signed-out sessions on the login screen just keep waiting
+        if page is not None and session.connected and not page.session.get("current_user"):
+            continue
+        _evict_idle(session)
+        evicted += 1
+    return evicted
+
+
+def _sweep_forever():
+    while True:
+        time.sleep(SWEEP_INTERVAL)
+        try:
+            sweep()
+        except Exception:
+            pass
+
+
+def _approx_size(obj) -> int:
+    """Shallow size of an object plus its attribute dict and direct values."""
+    size = sys.getsizeof(obj)
+    attrs = getattr(obj, "__dict__", None)
+    if attrs:
+        size += sys.getsizeof(attrs) + sum(sys.getsizeof(value) for value in attrs.values())
+    return size
+
+
+def session_memory(page) -> dict:
+    """Approximate memory held by a session's controls and session storage."""
+    controls = list(getattr(page, "_index", {}).values())
+    storage = page.session
+    values = [storage.get(key) for key in storage.get_keys()] if hasattr(storage, "get_keys") else []
+    return {
+        "controls": len(controls),
+        "bytes": sum(_approx_size(control) for control in controls) + sum(sys.getsizeof(v) for v in values),
+    }
+
+
+def gauge() -> dict:
+    """Live sessions and the approximate memory each one holds."""
+    now = time.monotonic()
+    with _lock:
+        sessions = list(_sessions.values())
+    rows = []
+    for session in sessions:
+        page = session.page()
+        if page is None:
+            continue
+        rows.append({
+            "id": session.id,
+            "user": page.session.get("current_user") or "",
+            "connected": session.connected,
+            "idle_seconds": round(session.idle_seconds(now)),
+            **session_memory(page),
+        })
+    return {
+        "live": len(rows),
+        "connected": sum(1 for row in rows if row["connected"]),
+        "signed_in": sum(1 for row in rows if row["user"]),
+        "bytes": sum(row["bytes"] for row in rows),
+        "sessions": rows,
+    }
@@ -0,0 +1,511 @@
+"""Concurrency-safe file storage shared by the JSON stores.
+
+- RWLock: any number of concurrent readers, one exclusive writer.
+- atomic_write_json: temp file + fsync + rename, so readers never see a
+  half-written file.
+- file_lock: an exclusive lock across processes (the Flet app and the kiosk
+  API), for read-modify-write of files both of them write.
+- SharedState: derived state kept in memory and saved with throttling, merged
+  with the other process's saves instead of overwriting them.
+- JsonStore: one per file. update() runs read-modify-write under the write lock;
+  concurrent updaters are coalesced (group commit) into one load, all their
+  mutations, and a single flush. Every flush bumps the store's version and is
+  announced to its subscribers (change events).
+- unit_of_work(): a per-request snapshot. Inside it each store is read at most
+  once, every consumer sees the same data, and writes are buffered until the
+  unit commits.
+"""
+import asyncio
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+
+class RWLock:
+    """Readers share the lock; a writer waits for active readers to finish and
+    blocks new ones while it waits, so writers can't be starved."""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def get_lock(path: Path) -> RWLock:
+    """The reader-writer lock of a store file (one per resolved path)."""
+    key = str(Path(path).resolve())
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = RWLock()
+        return lock
+
+
+# Paths whose file lock this thread holds -> nesting depth
+_held_file_locks = threading.local()
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Hold an exclusive OS lock on path's "<name>.lock" sidecar file, so another
+    process running the same code waits. Threads of this process should also
+    hold get_lock(path): the OS lock does not order them on every platform.
+    Re-entrant within a thread."""
+    path = Path(path)
+    held = getattr(_held_file_locks, "depth", None)
+    if held is None:
+        held = _held_file_locks.depth = {}
+    key = str(path.resolve())
+    if held.get(key):
+        held[key] += 1
+        try:
+            yield
+        finally:
+            held[key] -= 1
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    # LK_LOCK gives up after 10 seconds: keep waiting
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+        held[key] = 1
+        try:
+            yield
+        finally:
+            held[key] = 0
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write_json(path: Path, data, indent: int = 2, fsync: bool = True):
+    """Write JSON to a temp file in the same folder, fsync it, then rename over path.
+    fsync=False keeps the atomic rename but skips the flush to disk, for derived
+    state that can be rebuilt after a crash."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            # dumps() then one write: json.dump() streams through the pure-Python encoder
+            f.write(json.dumps(data, indent=indent))
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+
+class _Pending:
+    __slots__ = ("mutate", "done", "result", "error")
+
+    def __init__(self, mutate):
+        self.mutate = mutate
+        self.done = False
+        self.result = None
+        self.error = None
+
+
+class JsonStore:
+    """A whole-file JSON store with locked reads and group-committed writes."""
+
+    def __init__(self, path: Path, default_factory=dict):
+        self.path = Path(path)
+        self.default_factory = default_factory
+        self.lock = get_lock(self.path)
+        self._mutex = threading.Lock()
+        self._flushed = threading.Condition(self._mutex)
+        self._pending = []
+        self._flushing = False
+        # Bumped on every write this process commits; subscribers hear about each one
+        self.version = 0
+        self._listeners = []
+
+    def _load(self):
+        if not self.path.exists():
+            return self.default_factory()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return self.default_factory()
+
+    def read(self):
+        """Load the current contents. Readers never block each other.
+        Inside a unit of work this is the unit's shared snapshot."""
+        unit = _current_unit.get()
+        if unit is not None:
+            return unit.snapshot(self)
+        return self._read_now()
+
+    def _read_now(self):
+        with self.lock.read():
+            return self._load()
+
+    def update(self, mutate):
+        """Apply mutate(data) and persist. Returns whatever mutate returns.
+        Inside a unit of work the change is applied to the snapshot and written
+        when the unit commits."""
+        unit = _current_unit.get()
+        if unit is not None:
+            return unit.buffer(self, mutate)
+        return self._update_now(mutate)
+
+    def _update_now(self, mutate):
+        """Writers that arrive while a flush is running wait for it, and the next
+        flush applies all of them together with one write."""
+        ticket = _Pending(mutate)
+        with self._mutex:
+            self._pending.append(ticket)
+            while self._flushing and not ticket.done:
+                self._flushed.wait()
+            if not ticket.done:
+                # Become the leader for everything queued so far
+                self._flushing = True
+                batch, self._pending = self._pending, []
+        if not ticket.done:
+            self._flush(batch)
+        if ticket.error is not None:
+            raise ticket.error
+        return ticket.result
+
+    def subscribe(self, listener):
+        """Call listener(data) after every write this process commits, with the
+        contents just written (read-only). Runs on the writing thread before the
+        writers return, so a change is seen before its caller moves on."""
+        self._listeners.append(listener)
+
+    def _notify(self, data):
+        for listener in list(self._listeners):
+            try:
+                listener(data)
+            except Exception:
+                pass
+
+    def _flush(self, batch: list):
+        try:
+            with self.lock.write():
+                data = self._load()
+                for pending in batch:
+                    try:
+                        pending.result = pending.mutate(data)
+                    except Exception as ex:
+                        pending.error = ex
+                atomic_write_json(self.path, data)
+            self.version += 1
+            self._notify(data)
+        except Exception as ex:
+            for pending in batch:
+                if pending.error is None:
+                    pending.error = ex
+        finally:
+            with self._mutex:
+                for pending in batch:
+                    pending.done = True
+                self._flushing = False
+                self._flushed.notify_all()
+
+    def replace(self, data):
+        """Overwrite the whole store (still atomic and ordered with other writers)."""
+        def _replace(current):
+            current.clear()
+            if isinstance(current, dict):
+                current.update(data)
+            else:
+                current.extend(data)
+        self.update(_replace)
+
+
+class SharedState:
+    """JSON state cached in memory that both processes update (derived
+    statistics, rule state, rollups). update() applies a change in memory right
+    away and remembers it; saves are throttled to save_interval (and run at exit).
+    A save takes the file lock and, if the other process wrote the file since it
+    was read, re-reads it and replays the unsaved changes on top, so neither
+    process overwrites the other's updates. Changes must therefore be replayable:
+    only touch the data passed in, no other side effects."""
+
+    def __init__(self, path: Path, default_factory=dict, save_interval: float = 0.0):
+        self.path = Path(path)
+        self.default_factory = default_factory
+        self.save_interval = save_interval
+        # Hold it across a read and the update that depends on it
+        self.lock = threading.RLock()
+        self._data = None
+        self._signature = None
+        self._unsaved = []
+        self._saved_at = 0.0
+        atexit.register(self.flush)
+
+    def _file_signature(self):
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        # Every save renames a new file in, so the inode changes too
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _refresh(self):
+        """Re-read the file if someone else wrote it, replaying unsaved changes."""
+        signature = self._file_signature()
+        if self._data is not None and signature == self._signature:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            data = self.default_factory()
+        for mutate in self._unsaved:
+            mutate(data)
+        self._data, self._signature = data, signature
+
+    def read(self):
+        """The current state, including the other process's saved changes. Don't
+        modify it; use update()."""
+        with self.lock:
+            self._refresh()
+            return self._data
+
+    def update(self, mutate, force: bool = False):
+        """Apply mutate(data) and save (throttled unless force). Returns what
+        mutate returns. A forced update runs under the file lock on the latest
+        contents, so a check-and-set in it is atomic across processes."""
+        with self.lock:
+            if force:
+                with get_lock(self.path).write(), file_lock(self.path):
+                    self._refresh()
+                    result = mutate(self._data)
+                    self._unsaved.append(mutate)
+                    self._write()
+                return result
+            self._refresh()
+            result = mutate(self._data)
+            self._unsaved.append(mutate)
+            if time.monotonic() - self._saved_at >= self.save_interval:
+                self.flush()
+            return result
+
+    def flush(self):
+        """Save the unsaved changes now."""
+        with self.lock:
+            if not self._unsaved:
+                return
+            with get_lock(self.path).write(), file_lock(self.path):
+                self._refresh()
+                self._write()
+
+    def _write(self):
+        atomic_write_json(self.path, self._data, indent=None, fsync=False)
+        self._signature = self._file_signature()
+        self._unsaved = []
+        self._saved_at = time.monotonic()
+
+
+_stores = {}
+_stores_guard = threading.Lock()
+
+
+def get_store(path: Path, default_factory=dict) -> JsonStore:
+    """The shared JsonStore of a file, so every module writing it uses the same lock and queue."""
+    key = str(Path(path).resolve())
+    with _stores_guard:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = JsonStore(path, default_factory)
+        return store
+
+
+# --- Unit of work ---
+
+_current_unit = contextvars.ContextVar("unit_of_work", default=None)
+
+
+class UnitOfWork:
+    """Snapshot of the stores for one route render or event handler."""
+
+    def __init__(self):
+        self._snapshots = {}
+        self._writes = []
+        self._cache = {}
+        self._after_commit = []
+
+    def snapshot(self, store: JsonStore):
+        """The store's contents, loaded on first use and shared afterwards."""
+        if store.path not in self._snapshots:
+            self._snapshots[store.path] = store._read_now()
+        return self._snapshots[store.path]
+
+    def buffer(self, store: JsonStore, mutate):
+        """Apply mutate to the snapshot now and queue it for commit."""
+        result = mutate(self.snapshot(store))
+        self._writes.append((store, mutate))
+        return result
+
+    def cached(self, key, loader):
+        """loader() once per unit; later calls with the same key reuse the result."""
+        if key not in self._cache:
+            self._cache[key] = loader()
+        return self._cache[key]
+
+    def has_writes(self, store: JsonStore) -> bool:
+        """Whether the unit has buffered changes to store not yet committed."""
+        return any(pending is store for pending, _ in self._writes)
+
+    def after_commit(self, action):
+        self._after_commit.append(action)
+
+    def commit(self):
+        """Write buffered changes, one group-committed update per store. Mutations
+        are replayed against the latest file contents, so changes other sessions
+        committed meanwhile are kept."""
+        by_store = {}
+        for store, mutate in self._writes:
+            by_store.setdefault(store, []).append(mutate)
+        self._writes = []
+        for store, mutations in by_store.items():
+            def _apply_all(data, mutations=mutations):
+                for mutate in mutations:
+                    mutate(data)
+            store._update_now(_apply_all)
+        actions, self._after_commit = self._after_commit, []
+        for action in actions:
+            action()
+
+    def rollback(self):
+        self._writes = []
+        self._after_commit = []
+
+
+def current_unit():
+    """The active unit of work, or None."""
+    return _current_unit.get()
+
+
+@contextmanager
+def unit_of_work():
+    """Open a unit of work. A nested call joins the one already open."""
+    unit = _current_unit.get()
+    if unit is not None:
+        yield unit
+        return
+    unit = UnitOfWork()
+    token = _current_unit.set(unit)
+    try:
+        yield unit
+    except BaseException:
+        unit.rollback()
+        _current_unit.reset(token)
+        raise
+    # Commit outside the unit so writes go straight to the stores
+    _current_unit.reset(token)
+    unit.commit()
+
+
+def transactional(handler):
+    """Run a route render or event handler inside its own unit of work.
+    Async handlers get one too; their commit runs on a worker thread so the
+    event loop never waits on the disk."""
+    if inspect.iscoroutinefunction(handler):
+        @functools.wraps(handler)
+        async def async_wrapper(*args, **kwargs):
+            if _current_unit.get() is not None:
+                return await handler(*args, **kwargs)
+            unit = UnitOfWork()
+            token = _current_unit.set(unit)
+            try:
+                result = await handler(*args, **kwargs)
+            except BaseException:
+                unit.rollback()
+                _current_unit.reset(token)
+                raise
+            _current_unit.reset(token)
+            await asyncio.to_thread(unit.commit)
+            return result
+        return async_wrapper
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        with unit_of_work():
+            return handler(*args, **kwargs)
+    return wrapper
+
+
+def cached(key, loader):
+    """loader() memoized for the active unit of work (uncached outside one)."""
+    unit = _current_unit.get()
+    if unit is None:
+        return loader()
+    return unit.cached(key, loader)
+
+
+def after_commit(action):
+    """Run action when the active unit commits, or right away if there is none."""
+    unit = _current_unit.get()
+    if unit is None:
+        action()
+    else:
+        unit.after_commit(action)
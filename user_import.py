@@ -0,0 +1,228 @@
+"""Bulk user provisioning from a CSV or XLSX sheet.
+
+Rows are streamed (csv.DictReader / openpyxl read-only), validated and
+de-duplicated against the file itself and the user index, password-hashed on a
+worker pool, and committed in batches: one store update, one DB round trip and
+one batched audit append per batch.
+
+Expected columns (header row, case-insensitive): username, password, and
+optionally name, email, role.
+
+Usage:
+    python user_import.py cohort.xlsx [--batch 500] [--report errors.csv] [--actor admin]
+"""
+import argparse
+import csv
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Runnable as a script from anywhere: put the project and data folders on sys.path
+PROJECT_ROOT = Path(__file__).resolve().parent
+for folder in (PROJECT_ROOT / "data", PROJECT_ROOT):
+    if str(folder) not in sys.path:
+        sys.path.insert(0, str(folder))
+
+from auth import _hash_password
+from activity_log import log_activities
+from users_data import _users_store, _synced_index, _write_users_to_db
+
+# Where the admin UI stores uploaded sheets before importing them
+UPLOAD_DIR = PROJECT_ROOT / "uploads"
+BATCH_SIZE = 500
+HASH_WORKERS = 4
+MIN_PASSWORD_LENGTH = 6
+
+_USERNAME_RE = re.compile(r"^[a-z0-9._-]{3,32}$")
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+ROLES = ("Admin", "User")
+
+
+def _cell(value) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def iter_rows(path: Path):
+    """Yield (row_number, {column: value}) from a CSV or XLSX file without loading
+    it whole. Row numbers match the spreadsheet (header is row 1)."""
+    path = Path(path)
+    if path.suffix.lower() in (".xlsx", ".xlsm"):
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [_cell(name).lower() for name in next(rows, ())]
+            for number, values in enumerate(rows, start=2):
+                if values is None or all(value is None for value in values):
+                    continue
+                yield number, {name: _cell(value) for name, value in zip(header, values) if name}
+        finally:
+            workbook.close()
+    else:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.DictReader(f)
+            reader.fieldnames = [_cell(name).lower() for name in reader.fieldnames or []]
+            for number, row in enumerate(reader, start=2):
+                if not any(row.values()):
+                    continue
+                yield number, {name: _cell(value) for name, value in row.items() if name}
+
+
+def _read_rows(path: Path, errors: list):
+    """iter_rows, ending with a "could not read file" error instead of raising
+    when the sheet can't be read any further."""
+    try:
+        yield from iter_rows(path)
+    except Exception as ex:
+        errors.append({"row": None, "username": "", "error": f"could not read file: {ex}"})
+
+
+def validate_row(row: dict) -> tuple:
+    """Return (clean_fields, error). Exactly one of the two is None."""
+    username = row.get("username", "").lower()
+    password = row.get("password", "")
+    email = row.get("email", "")
+    role = (row.get("role") or "User").title()
+    if not username:
+        return None, "missing username"
+    if not _USERNAME_RE.match(username):
+        return None, "username must be 3-32 characters of a-z, 0-9, . _ -"
+    if len(password) < MIN_PASSWORD_LENGTH:
+        return None, f"password must be at least {MIN_PASSWORD_LENGTH} characters"
+    if email and not _EMAIL_RE.match(email):
+        return None, "invalid email"
+    if role not in ROLES:
+        return None, f"role must be one of {', '.join(ROLES)}"
+    return {
+        "username": username,
+        "password": password,
+        "name": row.get("name") or username,
+        "email": email,
+        "role": role,
+    }, None
+
+
+def _commit_batch(batch: list, pool: ThreadPoolExecutor, actor: str, errors: list) -> int:
+    """Hash, store, mirror and audit one batch of validated rows. Returns rows created."""
+    hashes = list(pool.map(_hash_password, [fields["password"] for _, fields in batch]))
+    new_records = {}
+    for (number, fields), password_hash in zip(batch, hashes):
+        new_records[fields["username"]] = (number, {
+            "password_hash": password_hash,
+            "name": fields["name"],
+            "email": fields["email"],
+            "role": fields["role"],
+            "status": "Active",
+            "twofa": False,
+            "last_login": "",
+            "locked": False,
+        })
+
+    def _insert(users):
+        # Re-checked under the store lock: another session may have created one meanwhile
+        created, taken = {}, []
+        for username, (number, record) in new_records.items():
+            if username in users:
+                taken.append((number, username))
+            else:
+                users[username] = record
+                created[username] = record
+        return created, taken
+
+    created, taken = _users_store.update(_insert)
+    for number, username in taken:
+        errors.append({"row": number, "username": username, "error": "username already exists"})
+    if created:
+        _write_users_to_db(created)
+        log_activities([("user_created", actor, f"New user {username} created by {actor} (import)") for username in created])
+    return len(created)
+
+
+def import_users(path: Path, actor: str = "system", batch_size: int = BATCH_SIZE, on_progress=None) -> dict:
+    """Import every valid row of a CSV/XLSX sheet. Returns counts, timing and a
+    per-row error list; on_progress(result_so_far) is called after each batch.
+    A sheet that can't be read is reported in the error list; a store or
+    database error stops the import and propagates (earlier batches stay)."""
+    started = time.perf_counter()
+    index = _synced_index()
+    existing_emails = {fields[3].lower() for fields in index.fields.values() if fields[3]}
+    seen_usernames, seen_emails = set(), set()
+    errors = []
+    result = {"rows": 0, "created": 0, "failed": 0, "seconds": 0.0, "rows_per_sec": 0.0, "errors": errors}
+
+    def _progress():
+        result["failed"] = len(errors)
+        result["seconds"] = time.perf_counter() - started
+        result["rows_per_sec"] = result["rows"] / result["seconds"] if result["seconds"] else 0.0
+        if on_progress is not None:
+            on_progress(result)
+
+    batch = []
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+        for number, row in _read_rows(path, errors):
+            result["rows"] += 1
+            fields, error = validate_row(row)
+            if fields is not None:
+                username, email = fields["username"], fields["email"].lower()
+                if username in seen_usernames:
+                    error = "duplicate username in file"
+                elif username in index.fields:
+                    error = "username already exists"
+                elif email and email in seen_emails:
+                    error = "duplicate email in file"
+                elif email and email in existing_emails:
+                    error = "email already in use"
+            if error:
+                errors.append({"row": number, "username": row.get("username", ""), "error": error})
+                continue
+            seen_usernames.add(username)
+            if email:
+                seen_emails.add(email)
+            batch.append((number, fields))
+            if len(batch) >= batch_size:
+                result["created"] += _commit_batch(batch, pool, actor, errors)
+                batch = []
+                _progress()
+        if batch:
+            result["created"] += _commit_batch(batch, pool, actor, errors)
+    errors.sort(key=lambda error: error["row"] or 0)
+    _progress()
+    return result
+
+
+def write_error_report(errors: list, path: Path):
+    """Save the per-row errors as CSV (row, username, error)."""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["row", "username", "error"])
+        writer.writeheader()
+        writer.writerows(errors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import users from a CSV or XLSX file.")
+    parser.add_argument("file", type=Path)
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="rows per commit")
+    parser.add_argument("--report", type=Path, help="write the per-row error report to this CSV")
+    parser.add_argument("--actor", default="system", help="username recorded in the audit log")
+    args = parser.parse_args(argv)
+
+    def _print_progress(result):
+        print(f"\r{result['rows']} rows, {result['created']} created, {result['failed']} failed, "
+              f"{result['rows_per_sec']:.0f} rows/s", end="", flush=True)
+
+    result = import_users(args.file, actor=args.actor, batch_size=args.batch, on_progress=_print_progress)
+    print()
+    for error in result["errors"][:20]:
+        print(f"  row {error['row']}: {error['username']} - {error['error']}")
+    if len(result["errors"]) > 20:
+        print(f"  ... {len(result['errors']) - 20} more")
+    if args.report:
+        write_error_report(result["errors"], args.report)
+        print(f"Error report written to {args.report}")
+    return 0 if not result["errors"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""In-memory search index over users.json.
+
+- keys: every username, sorted, for keyset pagination ("usernames after X").
+- by_role / by_status: username sets per value.
+- trie: prefix lookup over the username, email and name, including their
+  parts (e.g. "doe" matches "john.doe@school.edu").
+
+The index is kept in step with the store by diffing only the fields it covers,
+so a change to one user doesn't rebuild the whole index.
+"""
+import re
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+_TOKEN_SPLIT = re.compile(r"[^a-z0-9]+")
+
+
+def tokens(*values) -> set:
+    """Lower-cased search tokens of the given values: each whole value plus its parts."""
+    result = set()
+    for value in values:
+        value = (value or "").strip().lower()
+        if not value:
+            continue
+        result.add(value)
+        result.update(part for part in _TOKEN_SPLIT.split(value) if part)
+    return result
+
+
+class _TrieNode:
+    __slots__ = ("children", "users")
+
+    def __init__(self):
+        self.children = {}
+        self.users = None
+
+
+class PrefixTrie:
+    """Token trie; each node that ends a token holds the usernames having it."""
+
+    def __init__(self):
+        self.root = _TrieNode()
+
+    def add(self, token: str, username: str):
+        node = self.root
+        for char in token:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _TrieNode()
+            node = child
+        if node.users is None:
+            node.users = set()
+        node.users.add(username)
+
+    def remove(self, token: str, username: str):
+        path = [self.root]
+        for char in token:
+            node = path[-1].children.get(char)
+            if node is None:
+                return
+            path.append(node)
+        node = path[-1]
+        if node.users:
+            node.users.discard(username)
+            if not node.users:
+                node.users = None
+        # Prune branches that no longer lead to any token
+        for depth in range(len(token), 0, -1):
+            node = path[depth]
+            if node.users or node.children:
+                break
+            del path[depth - 1].children[token[depth - 1]]
+
+    def prefix(self, prefix: str) -> set:
+        """Usernames having any token that starts with prefix."""
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        found = set()
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.users:
+                found |= node.users
+            stack.extend(node.children.values())
+        return found
+
+
+class UserIndex:
+    def __init__(self):
+        self.signature = None
+        self.data = {}
+        self.fields = {}
+        self.keys = []
+        self.by_role = {}
+        self.by_status = {}
+        self.trie = PrefixTrie()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _fields_of(username: str, record: dict) -> tuple:
+        return (record.get("role", "User"), record.get("status", "Active"),
+                record.get("name", ""), record.get("email", ""))
+
+    def _add(self, username: str, fields: tuple):
+        role, status, name, email = fields
+        self.fields[username] = fields
+        self.by_role.setdefault(role, set()).add(username)
+        self.by_status.setdefault(status, set()).add(username)
+        for token in tokens(username, name, email):
+            self.trie.add(token, username)
+
+    def _remove(self, username: str):
+        role, status, name, email = self.fields.pop(username)
+        self.by_role.get(role, set()).discard(username)
+        self.by_status.get(status, set()).discard(username)
+        for token in tokens(username, name, email):
+            self.trie.remove(token, username)
+
+    def sync(self, users: dict, signature=None):
+        """Bring the index in line with `users`, touching only changed users."""
+        with self.lock:
+            if not self.fields:
+                # First build: sort once instead of inserting key by key
+                for username, record in users.items():
+                    self._add(username, self._fields_of(username, record))
+                self.keys = sorted(self.fields)
+                self.data = users
+                self.signature = signature
+                return
+            for username in [u for u in self.fields if u not in users]:
+                self._remove(username)
+                del self.keys[bisect_left(self.keys, username)]
+            for username, record in users.items():
+                fields = self._fields_of(username, record)
+                old = self.fields.get(username)
+                if old == fields:
+                    continue
+                if old is None:
+                    insort(self.keys, username)
+                else:
+                    self._remove(username)
+                self._add(username, fields)
+            self.data = users
+            self.signature = signature
+
+    @classmethod
+    def matches(cls, username: str, record: dict, role: str = None, status: str = None, query: str = None) -> bool:
+        """Whether one user passes search()'s filters, for records that are not
+        in the index (e.g. a unit of work's uncommitted changes)."""
+        user_role, user_status, name, email = cls._fields_of(username, record)
+        if (role and user_role != role) or (status and user_status != status):
+            return False
+        user_tokens = tokens(username, name, email)
+        return all(any(token.startswith(word) for token in user_tokens)
+                   for word in (query or "").strip().lower().split())
+
+    def search(self, role: str = None, status: str = None, query: str = None,
+               after: str = None, limit: int = None) -> list:
+        """Sorted usernames matching every filter, starting after `after`.
+        Each word of the query must prefix-match a token of the user."""
+        with self.lock:
+            candidates = None
+            if role:
+                candidates = set(self.by_role.get(role, ()))
+            if status:
+                matched = self.by_status.get(status, set())
+                candidates = matched.copy() if candidates is None else candidates & matched
+            for word in (query or "").strip().lower().split():
+                matched = self.trie.prefix(word)
+                candidates = matched if candidates is None else candidates & matched
+                if not candidates:
+                    return []
+
+            start = bisect_right(self.keys, after) if after is not None else 0
+            if candidates is None:
+                end = start + limit if limit is not None else len(self.keys)
+                return self.keys[start:end]
+            if limit is not None and len(candidates) * 8 > len(self.keys):
+                # Broad filter (e.g. role=User): walk the sorted keys, no sort needed
+                page = []
+                for position in range(start, len(self.keys)):
+                    username = self.keys[position]
+                    if username in candidates:
+                        page.append(username)
+                        if len(page) == limit:
+                            break
+                return page
+            keys = sorted(candidates)
+            start = bisect_right(keys, after) if after is not None else 0
+            end = start + limit if limit is not None else len(keys)
+            return keys[start:end]
@@ -1,18 +1,57 @@
-import json
 from pathlib import Path
 from datetime import datetime
-from activity_log import log_activity
+from activity_log import log_activity, log_activities
 import hashlib
-from auth import _reset_login_attempts
+from auth import _reset_login_attempts, _reset_login_attempts_many
+from records import UserRecord
+from storage import get_store, current_unit
+from user_index import UserIndex
+
+
+_UPSERT_USER_SQL = """
+    INSERT INTO users (username, name, email, role, locked, twofa, status, last_login, password_hash)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        name=VALUES(name),
+        email=VALUES(email),
+        role=VALUES(role),
+        locked=VALUES(locked),
+        twofa=VALUES(twofa),
+        status=VALUES(status),
+        last_login=VALUES(last_login),
+        password_hash=VALUES(password_hash)
+"""
+
+
+def _user_db_row(username: str, user_rec: dict) -> tuple:
+    return (
+        username,
+        user_rec.get("name"),
+        user_rec.get("email"),
+        user_rec.get("role", "User"),
+        1 if user_rec.get("locked") else 0,
+        1 if user_rec.get("twofa") else 0,
+        user_rec.get("status", "Active"),
+        user_rec.get("last_login") or None,
+        user_rec.get("password_hash"),
+    )
 
 
 def _delete_user_from_db(username: str) -> bool:
     """Best-effort delete from MySQL users table."""
+    return _delete_users_from_db([username])
+
+
+def _delete_users_from_db(usernames: list) -> bool:
+    """Best-effort delete of many users in one statement and round trip."""
+    if not usernames:
+        return True
     try:
         from db import get_connection
         conn = get_connection()
         cur = conn.cursor()
-        cur.execute("DELETE FROM users WHERE username = %s", (username,))
+        placeholders = ", ".join(["%s"] * len(usernames))
+        cur.execute(f"DELETE FROM users WHERE username IN ({placeholders})", tuple(usernames))
         conn.commit()
         cur.close()
         conn.close()
@@ -26,36 +65,18 @@ def _write_user_to_db(username: str, user_rec: dict) -> bool:
     Best-effort write to MySQL users table.
     If the DB or connector is unavailable, fail silently.
     """
+    return _write_users_to_db({username: user_rec})
+
+
+def _write_users_to_db(records: dict) -> bool:
+    """Best-effort upsert of many users with one executemany and one commit."""
+    if not records:
+        return True
     try:
         from db import get_connection
         conn = get_connection()
         cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO users (username, name, email, role, locked, twofa, status, last_login, password_hash)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                name=VALUES(name),
-                email=VALUES(email),
-                role=VALUES(role),
-                locked=VALUES(locked),
-                twofa=VALUES(twofa),
-                status=VALUES(status),
-                last_login=VALUES(last_login),
-                password_hash=VALUES(password_hash)
-            """,
-            (
-                username,
-                user_rec.get("name"),
-                user_rec.get("email"),
-                user_rec.get("role", "User"),
-                1 if user_rec.get("locked") else 0,
-                1 if user_rec.get("twofa") else 0,
-                user_rec.get("status", "Active"),
-                user_rec.get("last_login") or None,
-                user_rec.get("password_hash"),
-            ),
-        )
+        cur.executemany(_UPSERT_USER_SQL, [_user_db_row(username, rec) for username, rec in records.items()])
         conn.commit()
         cur.close()
         conn.close()
@@ -66,43 +87,50 @@ def _write_user_to_db(username: str, user_rec: dict) -> bool:
 USERS_FILE = Path(__file__).parent / "users.json"
 
 
+# Same shared store as auth.py, so both modules serialize on one lock
+_users_store = get_store(USERS_FILE)
+
+
 def _load_users():
-    if not USERS_FILE.exists():
-        return {}
-    try:
-        with open(USERS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+    return _users_store.read()
 
 
 def _save_users(users: dict):
-    with open(USERS_FILE, "w", encoding="utf-8") as f:
-        json.dump(users, f, indent=2)
+    _users_store.replace(users)
+
+
+_index = UserIndex()
+
+
+def _file_signature():
+    try:
+        stat = USERS_FILE.stat()
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+
+def _synced_index() -> UserIndex:
+    """The search index over the committed users.json, re-synced only when the
+    file has changed since the last search. It is shared by every session (and
+    the API), so a unit of work's uncommitted snapshot never goes into it."""
+    signature = _file_signature()
+    if signature is None or signature != _index.signature:
+        _index.sync(_users_store._read_now(), signature)
+    return _index
 
 
 def list_users():
+    """Return every user as a compact UserRecord (converted once, at the JSON boundary)."""
     users = _load_users()
-    # Return list of dicts with normalized fields
-    out = []
-    for username, data in users.items():
-        out.append({
-            "username": username,
-            "name": data.get("name", ""),
-            "email": data.get("email", ""),
-            "role": data.get("role", "User"),
-            "status": data.get("status", "Active"),
-            "twofa": data.get("twofa", False),
-            "last_login": data.get("last_login", ""),
-            "locked": data.get("locked", False),
-        })
-    # Most recent first by default if stored ordering exists
-    return out
+    return [UserRecord.from_dict(username, data) for username, data in users.items()]
 
 
 def get_user(username: str):
-    users = _load_users()
-    return users.get(username.strip().lower())
+    data = _load_users().get(username.strip().lower())
+    if data is None:
+        return None
+    return UserRecord.from_dict(username.strip().lower(), data)
 
 
 def delete_user(username: str, actor: str = "system") -> bool:
@@ -112,11 +140,7 @@ def delete_user(username: str, actor: str = "system") -> bool:
 
     # Delete in JSON
     try:
-        users = _load_users()
-        if key in users:
-            users.pop(key)
-            _save_users(users)
-            json_deleted = True
+        json_deleted = _users_store.update(lambda users: users.pop(key, None) is not None)
     except Exception:
         json_deleted = False
 
@@ -130,42 +154,112 @@ def delete_user(username: str, actor: str = "system") -> bool:
 
 
 def toggle_lock(username: str, actor: str = "system") -> bool:
-    users = _load_users()
     key = username.strip().lower()
-    if key not in users:
+
+    def _toggle(users):
+        if key not in users:
+            return None
+        users[key]["locked"] = not users[key].get("locked", False)
+        return users[key]["locked"]
+
+    locked = _users_store.update(_toggle)
+    if locked is None:
         return False
-    users[key]["locked"] = not users[key].get("locked", False)
-    status = "locked" if users[key]["locked"] else "unlocked"
-    _save_users(users)
+    status = "locked" if locked else "unlocked"
     # Clear failed attempts on unlock
-    if not users[key]["locked"]:
+    if not locked:
         try:
             _reset_login_attempts(key)
         except Exception:
             pass
-    log_activity("user_locked" if users[key]["locked"] else "user_unlocked", actor, f"User {username} {status} by {actor}")
+    log_activity("user_locked" if locked else "user_unlocked", actor, f"User {username} {status} by {actor}")
     return True
 
 
+def _bulk_targets(usernames, actor: str) -> list:
+    """Normalized, de-duplicated usernames, never including the acting admin."""
+    actor_key = (actor or "").strip().lower()
+    targets = []
+    for username in usernames:
+        key = username.strip().lower()
+        if key and key != actor_key and key not in targets:
+            targets.append(key)
+    return targets
+
+
+def bulk_lock(usernames, locked: bool = True, actor: str = "system") -> list:
+    """Lock (or unlock) many users in one store transaction, one DB round trip and
+    one batched audit append. Returns the usernames whose state changed."""
+    targets = _bulk_targets(usernames, actor)
+
+    def _apply(users):
+        changed = {}
+        for key in targets:
+            if key in users and bool(users[key].get("locked", False)) != locked:
+                users[key]["locked"] = locked
+                changed[key] = dict(users[key])
+        return changed
+
+    changed = _users_store.update(_apply)
+    if not changed:
+        return []
+    _write_users_to_db(changed)
+    if not locked:
+        # Clear failed attempts on unlock
+        try:
+            _reset_login_attempts_many(list(changed))
+        except Exception:
+            pass
+    status = "locked" if locked else "unlocked"
+    log_activities([
+        ("user_locked" if locked else "user_unlocked", actor, f"User {key} {status} by {actor} (bulk)")
+        for key in changed
+    ])
+    return list(changed)
+
+
+def bulk_delete(usernames, actor: str = "system") -> list:
+    """Delete many users in one store transaction, one DB round trip and one
+    batched audit append. Returns the usernames that were deleted."""
+    targets = _bulk_targets(usernames, actor)
+
+    def _apply(users):
+        return [key for key in targets if users.pop(key, None) is not None]
+
+    deleted = _users_store.update(_apply)
+    if not deleted:
+        return []
+    _delete_users_from_db(deleted)
+    log_activities([("user_deleted", actor, f"User {key} deleted by {actor} (bulk)") for key in deleted])
+    return deleted
+
+
+def bulk_set_role(usernames, role: str, actor: str = "system") -> list:
+    """Set the role of many users in one store transaction, one DB round trip and
+    one batched audit append. Returns the usernames whose role changed."""
+    if role not in ("Admin", "User"):
+        raise ValueError(f"Unknown role: {role}")
+    targets = _bulk_targets(usernames, actor)
+
+    def _apply(users):
+        changed = {}
+        for key in targets:
+            if key in users and users[key].get("role", "User") != role:
+                users[key]["role"] = role
+                changed[key] = dict(users[key])
+        return changed
+
+    changed = _users_store.update(_apply)
+    if not changed:
+        return []
+    _write_users_to_db(changed)
+    log_activities([("profile_updated", actor, f"Role of {key} set to {role} by {actor} (bulk)") for key in changed])
+    return list(changed)
+
+
 def add_user_record(username: str, name: str = "", email: str = "", role: str = "User") -> bool:
-    users = _load_users()
     key = username.strip().lower()
-    
-    # Update existing user with additional metadata
-    if key in users:
-        users[key]["name"] = name
-        users[key]["email"] = email
-        users[key]["role"] = role
-        users[key]["status"] = "Active"
-        users[key]["twofa"] = False
-        users[key]["last_login"] = ""
-        users[key]["locked"] = False
-        _save_users(users)
-        _write_user_to_db(key, users[key])
-        return True
-    
-    # Create new user if doesn't exist
-    users[key] = {
+    fields = {
         "name": name,
         "email": email,
         "role": role,
@@ -174,23 +268,48 @@ def add_user_record(username: str, name: str = "", email: str = "", role: str =
         "last_login": "",
         "locked": False
     }
-    _save_users(users)
-    _write_user_to_db(key, users[key])
-    log_activity("user_created", "admin", f"New user {username} created with email {email}")
+
+    def _upsert(users):
+        # Update existing user with additional metadata, or create it
+        existed = key in users
+        users.setdefault(key, {}).update(fields)
+        return existed, dict(users[key])
+
+    existed, record = _users_store.update(_upsert)
+    _write_user_to_db(key, record)
+    if not existed:
+        log_activity("user_created", "admin", f"New user {username} created with email {email}")
     return True
 
 
-def search_users(role: str = None, status: str = None, query: str = None):
-    users = list_users()
-    results = users
-    if role and role != "All Roles":
-        results = [u for u in results if u.get("role") == role]
-    if status and status != "All Status":
-        results = [u for u in results if u.get("status") == status]
-    if query:
-        q = query.strip().lower()
-        results = [u for u in results if q in u.get("username", "").lower() or q in u.get("email", "").lower() or q in u.get("name", "").lower()]
-    return results
+def search_users(role: str = None, status: str = None, query: str = None,
+                 after: str = None, limit: int = None):
+    """Users matching the filters, sorted by username. Pass the last username of a
+    page as `after` to get the next one (keyset pagination); only the returned
+    page is converted to UserRecords."""
+    index = _synced_index()
+    role = role if role and role != "All Roles" else None
+    status = status if status and status != "All Status" else None
+    unit = current_unit()
+    if unit is None or not unit.has_writes(_users_store):
+        keys = index.search(role=role, status=status, query=query, after=after, limit=limit)
+        data = index.data
+        return [UserRecord.from_dict(username, data[username]) for username in keys if username in data]
+
+    # This unit has uncommitted changes: search the committed index, then overlay
+    # the users the unit changed. Asking for len(changed) extra keys leaves a
+    # full page after dropping the changed ones.
+    data = _users_store.read()
+    changed = {username for username in data.keys() | index.data.keys()
+               if data.get(username) != index.data.get(username)}
+    keys = [username for username in index.search(role=role, status=status, query=query, after=after,
+                                                  limit=limit + len(changed) if limit is not None else None)
+            if username not in changed]
+    keys.extend(username for username in changed
+                if username in data and (after is None or username > after)
+                and UserIndex.matches(username, data[username], role, status, query))
+    keys = sorted(keys)[:limit] if limit is not None else sorted(keys)
+    return [UserRecord.from_dict(username, data[username]) for username in keys]
 
 
 def ensure_default_admin_user():
@@ -199,22 +318,23 @@ def ensure_default_admin_user():
     - Ensures `admin` user exists with password `Admin@123`
     - Unlocks the account and clears lockout attempts
     """
-    users = _load_users()
     default_password_hash = hashlib.sha256("Admin@123".encode("utf-8")).hexdigest()
-    admin = users.get("admin", {})
-
-    # Apply/override required fields
-    admin["password_hash"] = default_password_hash
-    admin["name"] = admin.get("name") or "Administrator"
-    admin["email"] = admin.get("email") or "admin@example.com"
-    admin["role"] = "Admin"
-    admin["status"] = "Active"
-    admin["twofa"] = admin.get("twofa", False)
-    admin["last_login"] = admin.get("last_login", "")
-    admin["locked"] = False  # ensure unlocked
-
-    users["admin"] = admin
-    _save_users(users)
+
+    def _ensure(users):
+        admin = users.setdefault("admin", {})
+
+        # Apply/override required fields
+        admin["password_hash"] = default_password_hash
+        admin["name"] = admin.get("name") or "Administrator"
+        admin["email"] = admin.get("email") or "admin@example.com"
+        admin["role"] = "Admin"
+        admin["status"] = "Active"
+        admin["twofa"] = admin.get("twofa", False)
+        admin["last_login"] = admin.get("last_login", "")
+        admin["locked"] = False  # ensure unlocked
+        return dict(admin)
+
+    admin = _users_store.update(_ensure)
 
     # Clear lockout attempts for admin
     try:
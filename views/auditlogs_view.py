@@ -1,63 +1,84 @@
 import flet as ft
-import json
-from pathlib import Path
+from datetime import datetime, timedelta
 from flet import padding, border_radius, border, Icons
 from layouts import create_main_layout
 from components import create_info_card, create_action_button, PRIMARY_COLOR, TABLE_HEADER_BG
+from activity_log import iter_activities, classify_status, count_anomalies, get_flagged_events
+from anomaly_engine import event_key
+from storage import cached, transactional
+import async_store as store
+from identity import current_role
+from occupancy import get_rooms, room_name
 
-# Path to the shared data file
-# We go up one level from 'views/' to root, then into 'data/'
-ACTIVITY_DATA_FILE = Path(__file__).parent.parent / "data" / "activity_log.json"
 
-def _load_audit_data():
+def _to_audit_row(log: dict, flagged: dict) -> dict:
+    """Transform one activity event into the row format used by the Audit Log view.
+    `flagged` maps event keys to the anomaly rules that fired for them."""
+    event_type = log.get("event_type", "Unknown")
+    description = log.get("description", "")
+
+    # --- Status from the event type, Anomaly from the rule engine's flags ---
+    status = classify_status(event_type, description)
+    rules = flagged.get(event_key(log), [])
+    anomaly = "Yes" if rules else "No"
+
+    # Prettify Event Type for display
+    display_event = event_type.replace("_", " ").title()
+
+    return {
+        "timestamp": log.get("timestamp", "N/A"),
+        "event_type": display_event,
+        "user": log.get("username", "Unknown"),
+        "ip_address": log.get("ip_address", "N/A"),  # Older events were logged without an IP
+        "room": room_name(log["room"]) if log.get("room") else "",
+        "status": status,
+        "anomaly": anomaly,
+        "anomaly_rules": ", ".join(rules),
+        "raw_description": description # Keep for export or details
+    }
+
+
+def _iter_audit_data(start=None, end=None, event_type=None, room=None):
+    """Stream audit rows oldest first, including archived (sealed) partitions.
+    event_type is the display name (e.g. "Login Failed") and room a room id (only
+    events tagged with it, i.e. that room's check-ins/outs and reservations); both
+    are pushed down to the log reader so non-matching events are never decoded."""
+    raw_event = event_type.lower().replace(" ", "_") if event_type and event_type != "All Events" else None
+    flagged = get_flagged_events()
+    for log in iter_activities(start, end, event_type=raw_event, room=room):
+        yield _to_audit_row(log, flagged)
+
+
+def _load_audit_data(start=None, end=None, event_type=None, room=None):
     """
     Loads and transforms activity logs into the format expected by the Audit Log view.
+    Newest events come first.
     """
-    if not ACTIVITY_DATA_FILE.exists():
-        return []
-    
-    try:
-        with open(ACTIVITY_DATA_FILE, "r", encoding="utf-8") as f:
-            raw_logs = json.load(f)
-    except Exception:
-        return []
+    def _load():
+        try:
+            processed_logs = list(_iter_audit_data(start, end, event_type, room))
+        except Exception:
+            return []
+        processed_logs.reverse()
+        return processed_logs
+    # The first paint and the stats cards share one load per unit of work
+    return cached(("audit_data", start, end, event_type, room), _load)
 
-    processed_logs = []
-    
-    for log in raw_logs:
-        event_type = log.get("event_type", "Unknown")
-        description = log.get("description", "")
-        
-        # --- Logic to determine Status and Anomaly based on event type ---
-        status = "Success"
-        anomaly = "No"
-        
-        # Determine Status
-        if "failed" in event_type.lower() or "denied" in description.lower():
-            status = "Failed"
-        elif "locked" in event_type.lower():
-            status = "Locked"
-        elif "timeout" in event_type.lower():
-            status = "Timeout"
-        
-        # Determine Anomaly (Flag failed attempts or locks)
-        if status in ["Failed", "Locked", "Timeout"]:
-            anomaly = "Yes"
-        
-        # Prettify Event Type for display
-        display_event = event_type.replace("_", " ").title()
-
-        processed_logs.append({
-            "timestamp": log.get("timestamp", "N/A"),
-            "event_type": display_event,
-            "user": log.get("username", "Unknown"),
-            "ip_address": "127.0.0.1",  # Placeholder: IP is not currently captured in activity_log.json
-            "status": status,
-            "anomaly": anomaly,
-            "raw_description": description # Keep for export or details
-        })
-        
-    return processed_logs
+
+def _export_csv(filename: str, start=None, end=None, event_type=None, room=None) -> int:
+    """Stream the selected range, including archived months, straight into a CSV.
+    Returns the number of rows written."""
+    import csv
+
+    fieldnames = ["timestamp", "event_type", "user", "ip_address", "room", "status", "anomaly", "anomaly_rules", "raw_description"]
+    exported = 0
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in _iter_audit_data(start, end, event_type, room):
+            writer.writerow(row)
+            exported += 1
+    return exported
 
 def audit_logs_view(page: ft.Page):
     """Audit Logs View - Shows system events and user activities with clean, simple design."""
@@ -75,6 +96,12 @@ def audit_logs_view(page: ft.Page):
             ft.dropdown.Option("Profile Updated"),
             ft.dropdown.Option("User Locked"),
             ft.dropdown.Option("Logout"),
+            ft.dropdown.Option("Check In"),
+            ft.dropdown.Option("Check Out"),
+            ft.dropdown.Option("Anomaly Long Session"),
+            ft.dropdown.Option("Anomaly Short Session"),
+            ft.dropdown.Option("Anomaly Unusual Hour"),
+            ft.dropdown.Option("Anomaly Checkin Spike"),
         ],
         value="All Events",
         width=200,
@@ -94,6 +121,29 @@ def audit_logs_view(page: ft.Page):
         text_size=13,
         color="#333333"
     )
+    anomaly_dd = ft.Dropdown(
+        options=[ft.dropdown.Option("All Events"), ft.dropdown.Option("Anomalies Only"), ft.dropdown.Option("Normal Only")],
+        value="All Events",
+        width=160,
+        bgcolor=ft.Colors.WHITE,
+        border="1px solid #CCCCCC",
+        border_radius=4,
+        text_size=13,
+        color="#333333"
+    )
+    # Room filter: only events that happened in one study room
+    rooms = get_rooms()
+    room_dd = ft.Dropdown(
+        options=[ft.dropdown.Option("all", "All Rooms")]
+        + [ft.dropdown.Option(room, settings["name"]) for room, settings in rooms.items()],
+        value="all",
+        width=180,
+        bgcolor=ft.Colors.WHITE,
+        border="1px solid #CCCCCC",
+        border_radius=4,
+        text_size=13,
+        color="#333333"
+    )
     search_field = ft.TextField(
         hint_text="Username or event",
         width=300,
@@ -104,9 +154,72 @@ def audit_logs_view(page: ft.Page):
         color="#333333"
     )
 
+    # Date range filter: quick ranges, or a custom From/To (MM/DD/YYYY, inclusive)
+    date_range_dd = ft.Dropdown(
+        options=[
+            ft.dropdown.Option("All Time"),
+            ft.dropdown.Option("Last Hour"),
+            ft.dropdown.Option("Today"),
+            ft.dropdown.Option("Last 7 Days"),
+            ft.dropdown.Option("Custom"),
+        ],
+        value="All Time",
+        width=160,
+        bgcolor=ft.Colors.WHITE,
+        border="1px solid #CCCCCC",
+        border_radius=4,
+        text_size=13,
+        color="#333333"
+    )
+    from_field = ft.TextField(
+        hint_text="From (MM/DD/YYYY)",
+        width=150,
+        bgcolor=ft.Colors.WHITE,
+        border="1px solid #CCCCCC",
+        border_radius=4,
+        text_size=13,
+        color="#333333"
+    )
+    to_field = ft.TextField(
+        hint_text="To (MM/DD/YYYY)",
+        width=150,
+        bgcolor=ft.Colors.WHITE,
+        border="1px solid #CCCCCC",
+        border_radius=4,
+        text_size=13,
+        color="#333333"
+    )
+
     # Container for the table
     list_container = ft.Container()
 
+    def get_date_range():
+        """Resolve the date filter into a (start, end) window; None means unbounded."""
+        now = datetime.now()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        choice = date_range_dd.value
+        if choice == "Last Hour":
+            return now - timedelta(hours=1), None
+        if choice == "Today":
+            return today, None
+        if choice == "Last 7 Days":
+            return today - timedelta(days=6), None
+        if choice == "Custom":
+            start = end = None
+            try:
+                if from_field.value:
+                    start = datetime.strptime(from_field.value.strip(), "%m/%d/%Y")
+                if to_field.value:
+                    # "To" is inclusive of the whole day
+                    end = datetime.strptime(to_field.value.strip(), "%m/%d/%Y") + timedelta(days=1)
+            except ValueError:
+                pass
+            return start, end
+        return None, None
+
+    def get_room():
+        return None if room_dd.value == "all" else room_dd.value
+
     def get_status_color(status: str) -> str:
         """Get color for status badge."""
         colors = {
@@ -117,10 +230,13 @@ def audit_logs_view(page: ft.Page):
         }
         return colors.get(status, "#757575")
 
-    def update_ui(e=None):
+    @transactional
+    def update_ui(e=None, current_data=None):
         """Update the audit logs table based on filters."""
-        # Refresh data on update
-        current_data = _load_audit_data()
+        # Refresh data on update, reading only the selected time window
+        if current_data is None:
+            start, end = get_date_range()
+            current_data = _load_audit_data(start, end, event_type_dd.value, get_room())
         
         # Filter logic
         filtered_data = []
@@ -137,7 +253,13 @@ def audit_logs_view(page: ft.Page):
             if filter_status != "All Status" and log["status"] != filter_status:
                 continue
                 
-            # 3. Search Query (Username or Event Type)
+            # 3. Filter by Anomaly flag
+            if anomaly_dd.value == "Anomalies Only" and log["anomaly"] != "Yes":
+                continue
+            if anomaly_dd.value == "Normal Only" and log["anomaly"] == "Yes":
+                continue
+
+            # 4. Search Query (Username or Event Type)
             if filter_query:
                 if (filter_query not in log["user"].lower() and 
                     filter_query not in log["event_type"].lower()):
@@ -195,6 +317,7 @@ def audit_logs_view(page: ft.Page):
                         ft.Container(
                             ft.Text(log["anomaly"], size=12, color=ft.Colors.RED if is_anomaly else ft.Colors.GREEN_700, weight=ft.FontWeight.BOLD),
                             width=90,
+                            tooltip=log["anomaly_rules"] or None,
                         ),
                     ], spacing=0),
                     padding=padding.symmetric(horizontal=15, vertical=10),
@@ -213,38 +336,44 @@ def audit_logs_view(page: ft.Page):
         )
         page.update()
 
+    @transactional
+    async def refresh(e=None):
+        """Reload the selected window off the event loop, then redraw."""
+        start, end = get_date_range()
+        update_ui(current_data=await store.run("activity", _load_audit_data, start, end, event_type_dd.value, get_room()))
+
     # Wire filter changes
-    event_type_dd.on_change = update_ui
-    status_dd.on_change = update_ui
-    search_field.on_change = update_ui
+    event_type_dd.on_change = refresh
+    status_dd.on_change = refresh
+    search_field.on_change = refresh
+    date_range_dd.on_change = refresh
+    anomaly_dd.on_change = refresh
+    room_dd.on_change = refresh
+    from_field.on_submit = refresh
+    to_field.on_submit = refresh
 
     # Controls row
     search_fields = ft.Row([
         ft.Column([ft.Text("Event Type", weight=ft.FontWeight.BOLD, size=14, color="#000000"), event_type_dd]),
         ft.Column([ft.Text("Status", weight=ft.FontWeight.BOLD, size=14, color="#000000"), status_dd]),
+        ft.Column([ft.Text("Anomaly", weight=ft.FontWeight.BOLD, size=14, color="#000000"), anomaly_dd]),
+        ft.Column([ft.Text("Room", weight=ft.FontWeight.BOLD, size=14, color="#000000"), room_dd], visible=len(rooms) > 1),
+        ft.Column([ft.Text("Date Range", weight=ft.FontWeight.BOLD, size=14, color="#000000"), ft.Row([date_range_dd, from_field, to_field], spacing=8)]),
         ft.Column([ft.Text("Search", weight=ft.FontWeight.BOLD, size=14, color="#000000"), search_field], expand=True),
     ], spacing=20, alignment=ft.MainAxisAlignment.START)
 
-    def export_logs(e):
+    @transactional
+    async def export_logs(e):
         """Export current filtered logs to CSV."""
-        import csv
-        
-        # Get current data (re-apply filters logic or just export all)
-        # For simplicity, we export ALL data currently
-        data_to_export = _load_audit_data()
-        
         filename = "audit_logs_export.csv"
         try:
-            if not data_to_export:
+            start, end = get_date_range()
+            exported = await store.run("activity", _export_csv, filename, start, end, event_type_dd.value, get_room())
+
+            if not exported:
                 raise Exception("No data to export")
 
-            with open(filename, 'w', newline='', encoding='utf-8') as f:
-                # Get headers from first key
-                writer = csv.DictWriter(f, fieldnames=data_to_export[0].keys())
-                writer.writeheader()
-                writer.writerows(data_to_export)
-                
-            page.snack_bar = ft.SnackBar(ft.Text(f"Exported {len(data_to_export)} records to {filename}"), bgcolor=ft.Colors.GREEN_700)
+            page.snack_bar = ft.SnackBar(ft.Text(f"Exported {exported} records to {filename}"), bgcolor=ft.Colors.GREEN_700)
             page.snack_bar.open = True
             page.update()
         except Exception as ex:
@@ -255,7 +384,7 @@ def audit_logs_view(page: ft.Page):
     # Calculate stats for the cards
     current_data = _load_audit_data()
     total_events = len(current_data)
-    anomalies = sum(1 for log in current_data if log["anomaly"] == "Yes")
+    anomalies = count_anomalies()
     failed_actions = sum(1 for log in current_data if log["status"] == "Failed")
 
     content = ft.Column([
@@ -273,7 +402,7 @@ def audit_logs_view(page: ft.Page):
         ft.Row([
             search_fields,
             ft.Row([
-                create_action_button("Refresh", Icons.REFRESH, on_click=lambda e: update_ui(), color=PRIMARY_COLOR),
+                create_action_button("Refresh", Icons.REFRESH, on_click=refresh, color=PRIMARY_COLOR),
                 create_action_button("Export", Icons.DOWNLOAD, on_click=export_logs, color=PRIMARY_COLOR),
             ], spacing=10),
         ], spacing=20, alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
@@ -284,5 +413,5 @@ def audit_logs_view(page: ft.Page):
 
     # Initial population
     update_ui()
-    user_role = page.session.get("user_role") or "User"
+    user_role = current_role(page)
     return create_main_layout(page, content, "/auditlogs", user_role)
@@ -1,20 +1,127 @@
 import flet as ft
+from datetime import datetime
 from flet import padding, border_radius, border
 from layouts import create_main_layout
 from components import create_info_card, TABLE_HEADER_BG
-from activity_log import get_recent_activities, count_anomalies
+from activity_log import get_recent_activities, count_anomalies, count_activities
 from users_data import list_users
+from occupancy_analytics import get_occupancy_summary, format_seconds
+from usage_rollups import monthly_report
+from log_writer import get_writer_stats
+from identity import current_role
+import occupancy
+import sessions
 from checkin_log import (
     get_active_checkins_count,
     get_checkins_today_count,
     get_user_checkins_count,
 )
 
+def _analytics_panel(days: int = 7, room: str = None):
+    """Occupancy analytics (admin) of one room or all: session length stats, peak
+    hour, an hourly occupancy profile and this month's usage rollup."""
+    try:
+        summary = get_occupancy_summary(days=days, room=room)
+    except Exception:
+        return ft.Container()
+    today = datetime.now()
+    try:
+        month = monthly_report(today.year, today.month, room)
+    except Exception:
+        month = None
+
+    peak_hour = summary["peak_hour"]
+    stats_row = ft.Row(
+        [
+            create_info_card("Avg Session", format_seconds(summary["avg_session_seconds"])),
+            create_info_card("Median / P90", f"{format_seconds(summary['median_session_seconds'])} / {format_seconds(summary['p90_session_seconds'])}"),
+            create_info_card("Peak Hour", f"{peak_hour:02d}:00" if peak_hour is not None else "N/A"),
+        ],
+        spacing=20,
+        wrap=True,
+    )
+    month_row = ft.Row(
+        [
+            create_info_card("Check-ins This Month", str(month["checkins"])),
+            create_info_card("Hours Used This Month", f"{month['hours']:.1f}"),
+            create_info_card("Unique Users This Month", str(month["unique_users"])),
+        ],
+        spacing=20,
+        wrap=True,
+    ) if month else ft.Container()
+
+    # Simple bar chart: one bar per hour of day, scaled to the busiest hour
+    profile = summary["hourly_profile"]
+    highest = max(profile) or 1
+    bars = ft.Row(
+        [
+            ft.Column(
+                [
+                    ft.Container(
+                        height=max(2, 100 * value / highest),
+                        width=18,
+                        bgcolor=TABLE_HEADER_BG,
+                        border_radius=border_radius.only(top_left=3, top_right=3),
+                        tooltip=f"{hour:02d}:00 - avg {value:.1f} occupants",
+                    ),
+                    ft.Text(f"{hour:02d}", size=9, color=ft.Colors.GREY_700),
+                ],
+                spacing=2,
+                alignment=ft.MainAxisAlignment.END,
+                horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+            )
+            for hour, value in enumerate(profile)
+        ],
+        spacing=4,
+        vertical_alignment=ft.CrossAxisAlignment.END,
+        height=130,
+    )
+
+    return ft.Column(
+        [
+            ft.Container(height=30),
+            ft.Text(f"Occupancy Analytics{f' - {occupancy.room_name(room)}' if room else ''} (last {days} days)",
+                    size=18, weight=ft.FontWeight.BOLD, color="#000000"),
+            stats_row,
+            month_row,
+            ft.Container(
+                content=bars,
+                padding=padding.all(15),
+                border=border.all(1, ft.Colors.GREY_300),
+                border_radius=border_radius.all(8),
+                bgcolor=ft.Colors.WHITE,
+            ),
+        ],
+    )
+
+
+def _log_writer_status():
+    """One-line health of the background audit log writer (admins only)."""
+    try:
+        stats = get_writer_stats()
+    except Exception:
+        return ft.Container()
+    if stats.get("failing"):
+        # Events are kept and retried, but nothing reaches the audit log until this clears
+        return ft.Text(
+            f"Audit log writer is failing and retrying ({stats['queue_depth']} queued): {stats['last_error']}",
+            size=11,
+            color=ft.Colors.RED_700,
+        )
+    return ft.Text(
+        f"Audit log writer: queue {stats['queue_depth']}/{stats['queue_capacity']} "
+        f"(max {stats['max_depth']}), write latency avg {stats['avg_latency_ms']:.1f} ms / "
+        f"max {stats['max_latency_ms']:.1f} ms, {stats['avg_batch_size']:.1f} events per fsync",
+        size=11,
+        color=ft.Colors.GREY_700,
+    )
+
+
 def dashboard_view(page: ft.Page):
     """Recreates the DASHBOARD.png screen."""
     current_user = (page.session.get("current_user") or "").lower()
 
-    user_role = page.session.get("user_role") or "User"
+    user_role = current_role(page)
 
     # Activity list:
     # - Admin: show all recent activities
@@ -86,19 +193,75 @@ def dashboard_view(page: ft.Page):
     # Metrics: for admin show real counts; for non-admin show only their check-in count
     if user_role == "Admin":
         total_users = str(len(list_users()))
-        active_sessions = str(get_active_checkins_count())
-        checkins_today = str(get_checkins_today_count())
         anomalies = str(count_anomalies())
+        # "Today" window is answered by the activity log's timestamp index
+        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        events_today = str(count_activities(start=today_start))
+        active_card = create_info_card("Active Sessions", "")
+        checkins_card = create_info_card("Check-ins Today", "")
         metrics_row = ft.Row(
             [
                 create_info_card("Total Users", total_users),
-                create_info_card("Active Sessions", active_sessions),
-                create_info_card("Check-ins Today", checkins_today),
+                active_card,
+                checkins_card,
+                create_info_card("Events Today", events_today),
             ],
             spacing=20,
             wrap=True,
         )
+
+        # Room filter for the check-in metrics and analytics
+        rooms = occupancy.get_rooms()
+        room_filter = ft.Dropdown(
+            label="Room",
+            width=220,
+            value="all",
+            options=[ft.dropdown.Option("all", "All Rooms")]
+            + [ft.dropdown.Option(room, settings["name"]) for room, settings in rooms.items()],
+            visible=len(rooms) > 1,
+        )
+        active_value = active_card.content.controls[1]
+        checkins_value = checkins_card.content.controls[1]
+        analytics_slot = ft.Container(_analytics_panel())
+
+        def selected_room():
+            return None if room_filter.value == "all" else room_filter.value
+
+        def capacity_of(room) -> int:
+            return sum(rooms[r]["capacity"] for r in ([room] if room else rooms))
+
+        active_value.value = f"{get_active_checkins_count()}/{capacity_of(None)}"
+        checkins_value.value = str(get_checkins_today_count())
+
+        def on_room_filter(e):
+            room = selected_room()
+            active_value.value = f"{get_active_checkins_count(room)}/{capacity_of(room)}"
+            checkins_value.value = str(get_checkins_today_count(room))
+            analytics_slot.content = _analytics_panel(room=room)
+            page.update()
+
+        room_filter.on_change = on_room_filter
+
+        # Live occupancy: every check-in/out in a shown room pushes the new count here
+        def on_occupancy(state):
+            if page.route != "/dashboard":
+                # Navigated away: this card is gone
+                occupancy.unwatch(page.session_id)
+                return
+            room = selected_room()
+            if room not in (None, state["room"]):
+                return
+            # The rooms' in-memory counters; "All Rooms" adds them up
+            snapshots = [occupancy.snapshot(r) for r in ([room] if room else rooms)]
+            active_value.value = f"{sum(s['occupied'] for s in snapshots)}/{sum(s['capacity'] for s in snapshots)}"
+            active_value.update()
+
+        occupancy.watch(page.session_id, on_occupancy)
+        sessions.on_end(page, lambda: occupancy.unwatch(page.session_id))
+        metrics_row = ft.Column([room_filter, metrics_row], spacing=12)
+        analytics_panel = ft.Column([analytics_slot, _log_writer_status()])
     else:
+        analytics_panel = ft.Container()
         my_checkins = str(get_user_checkins_count(current_user))
         metrics_row = ft.Row(
             [
@@ -112,6 +275,7 @@ def dashboard_view(page: ft.Page):
         [
             ft.Text("Dashboard", size=20, weight=ft.FontWeight.BOLD, color="#000000"),
             metrics_row,
+            analytics_panel,
             ft.Container(height=30),
             ft.Text("Recent Activity", size=18, weight=ft.FontWeight.BOLD, color="#000000"),
             activity_table,
@@ -119,5 +283,4 @@ def dashboard_view(page: ft.Page):
         ],
     )
 
-    user_role = page.session.get("user_role") or "User"
     return create_main_layout(page, content, "/dashboard", user_role)
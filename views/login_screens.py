@@ -1,9 +1,9 @@
 import flet as ft
 from flet import padding, ControlState, border_radius, border
 from components import PRIMARY_COLOR, SECONDARY_COLOR, ACCENT_COLOR, TEXT_COLOR, BG_WHITE
-from auth import check_credentials, add_user
-from activity_log import log_activity
-from users_data import get_user, add_user_record
+from storage import transactional
+import async_store as store
+from identity import sign_in
 
 
 def login_screen(page: ft.Page, is_login=True):
@@ -54,7 +54,8 @@ def login_screen(page: ft.Page, is_login=True):
         page.snack_bar.open = True
         page.update()
 
-    def on_login(e):
+    @transactional
+    async def on_login(e):
         username = username_field.value.strip()
         password = password_field.value
         if not username or not password:
@@ -63,31 +64,29 @@ def login_screen(page: ft.Page, is_login=True):
         
         try:
             # Check credentials (returns tuple: success, message, remaining_lockout_time)
-            success, message, remaining_lockout = check_credentials(username, password)
+            success, message, remaining_lockout = await store.check_credentials(username, password)
         except Exception as ex:
             show_snack(f"Login error: {ex}", success=False)
             return
         
         if success:
+            # Resolve the user's record and role once; routes read it from the identity cache
+            if await store.run("users", sign_in, page, username) is None:
+                show_snack("This account is locked", success=False)
+                return
             show_snack(message, success=True)
-            # Get user role from users_data - normalize username to lowercase
-            username_lower = username.lower()
-            user_data = get_user(username_lower)
-            user_role = user_data.get("role", "User") if user_data else "User"
-            # Store in session
-            page.session.set("current_user", username_lower)
-            page.session.set("user_role", user_role)
-            log_activity("login_success", username, f"User {username} logged in successfully")
+            await store.log_activity("login_success", username, f"User {username} logged in successfully", ip_address=page.client_ip)
             page.go("/dashboard")
         else:
             show_snack(message, success=False)
             # Log failed attempt with remaining lockout info if applicable
             if remaining_lockout > 0:
-                log_activity("login_failed", username_field.value.strip(), f"Account locked - {remaining_lockout} minutes remaining")
+                await store.log_activity("login_failed", username_field.value.strip(), f"Account locked - {remaining_lockout} minutes remaining", ip_address=page.client_ip)
             else:
-                log_activity("login_failed", username_field.value.strip(), message)
+                await store.log_activity("login_failed", username_field.value.strip(), message, ip_address=page.client_ip)
 
-    def on_signup(e):
+    @transactional
+    async def on_signup(e):
         username = username_field.value.strip()
         password = password_field.value
         email = email_field.value.strip()
@@ -97,7 +96,7 @@ def login_screen(page: ft.Page, is_login=True):
             return
 
         try:
-            created = add_user(username, password, email)
+            created = await store.add_user(username, password, email)
         except Exception as ex:
             show_snack(f"Sign up failed: {ex}", success=False)
             return
@@ -105,9 +104,9 @@ def login_screen(page: ft.Page, is_login=True):
         if created:
             try:
                 # Add user metadata (default role is User) and attempt DB write
-                add_user_record(username, name=username, email=email)
+                await store.add_user_record(username, name=username, email=email)
                 show_snack("Account created. You may now log in.")
-                log_activity("user_created", username, f"New user {username} created with default role")
+                await store.log_activity("user_created", username, f"New user {username} created with default role")
                 page.go("/login")
             except Exception as ex:
                 show_snack(f"User created but metadata save failed: {ex}", success=False)
@@ -13,9 +13,11 @@ from layouts import create_main_layout
 from components import (create_text_field, create_admin_button, PRIMARY_COLOR, 
                         SECONDARY_COLOR, TEXT_COLOR, BG_LIGHT, BG_WHITE, 
                         BORDER_COLOR, LIGHT_TEXT, create_button)
-from activity_log import log_activity
-from users_data import get_user, _load_users, _save_users
-from auth import check_credentials, _hash_password
+from users_data import _users_store
+from auth import _hash_password
+from storage import transactional
+import async_store as store
+from identity import current, sign_out
 
 def profile_view(page: ft.Page, is_admin_view=False):
     """
@@ -24,8 +26,9 @@ def profile_view(page: ft.Page, is_admin_view=False):
     """
     
     # Require an authenticated user to load profile data
-    current_user = (page.session.get("current_user") or "").strip().lower()
-    user_role = page.session.get("user_role") or "User"
+    identity = current(page)
+    current_user = identity.username if identity else ""
+    user_role = identity.role if identity else "User"
     if not current_user:
         page.snack_bar = ft.SnackBar(ft.Text("Please log in to view your profile"), bgcolor=ft.Colors.RED_700)
         page.snack_bar.open = True
@@ -33,7 +36,7 @@ def profile_view(page: ft.Page, is_admin_view=False):
         page.go("/login")
         return
 
-    user_data = get_user(current_user) or {}
+    user_data = identity.record
     user_name = user_data.get("name", current_user)
     user_email = user_data.get("email", "")
     
@@ -111,7 +114,8 @@ def profile_view(page: ft.Page, is_admin_view=False):
     display_username = ft.Text(current_user, size=10, color=TEXT_COLOR)
     display_role = ft.Text(user_role, size=9, color=ft.Colors.WHITE, weight=ft.FontWeight.W_600)
 
-    def on_update_profile(e):
+    @transactional
+    async def on_update_profile(e):
         # Validate inputs
         new_username = username_field.value.strip().lower()
         new_name = name_field.value.strip()
@@ -134,7 +138,7 @@ def profile_view(page: ft.Page, is_admin_view=False):
         
         # Verify current password if needed
         if current_password:
-            success, msg, _ = check_credentials(current_user, current_password)
+            success, msg, _ = await store.check_credentials(current_user, current_password)
             if not success:
                 page.snack_bar = ft.SnackBar(ft.Text("Current password is incorrect"), bgcolor=ft.Colors.RED_700)
                 page.snack_bar.open = True
@@ -154,47 +158,46 @@ def profile_view(page: ft.Page, is_admin_view=False):
                 page.update()
                 return
         
-        # Load users data
-        users = _load_users()
         old_key = current_user.lower()
-        
-        # Ensure the current user exists
-        if old_key not in users:
+        new_hash = _hash_password(new_password) if new_password else None
+
+        # Checks and changes run as one atomic update of users.json, so a
+        # concurrent session can't slip in between them
+        def _apply(users):
+            # Ensure the current user exists
+            if old_key not in users:
+                return "missing"
+            # Check if new username already exists (if username changed)
+            if new_username != old_key and new_username in users:
+                return "taken"
+
+            # If username changed, create new entry and delete old one
+            user_rec = users[old_key]
+            if new_username != old_key:
+                users[new_username] = users.pop(old_key)
+
+            # Update fields
+            user_rec["name"] = new_name
+            user_rec["email"] = new_email
+
+            # Update password if provided
+            if new_hash:
+                user_rec["password_hash"] = new_hash
+            return None
+
+        error = await store.run("users", _users_store.update, _apply)
+        if error == "missing":
             page.snack_bar = ft.SnackBar(ft.Text("User record not found. Please log in again."), bgcolor=ft.Colors.RED_700)
             page.snack_bar.open = True
             page.update()
             page.go("/login")
             return
-
-        # Check if new username already exists (if username changed)
-        if new_username != old_key and new_username in users:
+        if error == "taken":
             page.snack_bar = ft.SnackBar(ft.Text("Username already exists"), bgcolor=ft.Colors.RED_700)
             page.snack_bar.open = True
             page.update()
             return
         
-        # Update user data
-        user_rec = users.get(old_key, {})
-        
-        # If username changed, create new entry and delete old one
-        if new_username != old_key:
-            users[new_username] = user_rec
-            del users[old_key]
-            current_user_key = new_username
-        else:
-            current_user_key = old_key
-        
-        # Update fields
-        users[current_user_key]["name"] = new_name
-        users[current_user_key]["email"] = new_email
-        
-        # Update password if provided
-        if new_password:
-            users[current_user_key]["password_hash"] = _hash_password(new_password)
-        
-        # Save changes
-        _save_users(users)
-        
         # Update session if username changed
         if new_username != old_key:
             page.session.set("current_user", new_username)
@@ -203,7 +206,7 @@ def profile_view(page: ft.Page, is_admin_view=False):
             display_username.value = current_user
         
         # Log activity
-        log_activity("profile_updated", new_username, f"User {new_username} updated profile")
+        await store.log_activity("profile_updated", new_username, f"User {new_username} updated profile")
         
         # Clear password fields
         current_password_field.value = ""
@@ -214,10 +217,10 @@ def profile_view(page: ft.Page, is_admin_view=False):
         page.snack_bar.open = True
         page.update()
     
-    def on_logout(e):
-        log_activity("logout", current_user, f"User {current_user} logged out")
-        page.session.set("current_user", "")
-        page.session.set("user_role", "User")
+    @transactional
+    async def on_logout(e):
+        await store.log_activity("logout", current_user, f"User {current_user} logged out")
+        sign_out(page)
         page.go("/login")
     
     def on_switch_profile(e):
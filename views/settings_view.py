@@ -10,6 +10,10 @@ import flet as ft
 from flet import padding, border_radius, Icons
 from layouts import create_main_layout
 from components import PRIMARY_COLOR, SUCCESS_COLOR, TEXT_COLOR, LIGHT_TEXT, BG_WHITE, BG_LIGHT, BORDER_COLOR, TABLE_HEADER_BG
+from identity import current, current_role
+import sessions
+import occupancy
+import async_store as store
 
 def settings_view(page: ft.Page):
     """Clean Security Settings view matching app design."""
@@ -49,6 +53,116 @@ def settings_view(page: ft.Page):
         border=ft.border.all(1, BORDER_COLOR),
     )
 
+    user_role = current_role(page)
+
+    # Live sessions gauge and room capacity (admins only)
+    sessions_card = capacity_card = None
+    if user_role == "Admin":
+        policy_options = [ft.dropdown.Option("reject", "Reject when full"), ft.dropdown.Option("waitlist", "Waitlist")]
+        room_dropdown = ft.Dropdown(value=occupancy.DEFAULT_ROOM, width=200)
+        capacity_field = ft.TextField(width=100, height=40, text_size=13)
+        policy_dropdown = ft.Dropdown(width=160, options=policy_options)
+        capacity_status = ft.Text("", size=12, color=LIGHT_TEXT)
+        new_room_id = ft.TextField(hint_text="Room id (e.g. library-2)", width=200, height=40, text_size=13)
+        new_room_name = ft.TextField(hint_text="Name", width=200, height=40, text_size=13)
+        new_room_capacity = ft.TextField(hint_text="Seats", width=100, height=40, text_size=13)
+
+        def show_room(e=None):
+            """Fill the fields with the selected room's settings."""
+            rooms = occupancy.get_rooms()
+            room_dropdown.options = [ft.dropdown.Option(room, settings["name"]) for room, settings in rooms.items()]
+            settings = rooms.get(room_dropdown.value) or rooms[occupancy.DEFAULT_ROOM]
+            capacity_field.value = str(settings["capacity"])
+            policy_dropdown.value = settings["policy"]
+            if e is not None:
+                page.update()
+
+        def _seats(field) -> int:
+            try:
+                return int(field.value)
+            except (TypeError, ValueError):
+                return 0
+
+        async def save_capacity(e):
+            capacity = _seats(capacity_field)
+            try:
+                await store.run("checkins", occupancy.set_capacity, capacity, policy_dropdown.value,
+                                current(page).username, room_dropdown.value)
+                capacity_status.value = f"Saved: {capacity} seats in {occupancy.room_name(room_dropdown.value)}"
+                capacity_status.color = SUCCESS_COLOR
+            except ValueError as ex:
+                capacity_status.value = str(ex)
+                capacity_status.color = ft.Colors.RED_700
+            page.update()
+
+        async def add_room(e):
+            try:
+                await store.run("checkins", occupancy.add_room, new_room_id.value, new_room_name.value,
+                                _seats(new_room_capacity), "reject", current(page).username)
+                room_dropdown.value = new_room_id.value.strip().lower()
+                new_room_id.value = new_room_name.value = new_room_capacity.value = ""
+                show_room()
+                capacity_status.value = f"Added {occupancy.room_name(room_dropdown.value)}"
+                capacity_status.color = SUCCESS_COLOR
+            except ValueError as ex:
+                capacity_status.value = str(ex)
+                capacity_status.color = ft.Colors.RED_700
+            page.update()
+
+        room_dropdown.on_change = show_room
+        show_room()
+
+        capacity_card = ft.Container(
+            content=ft.Column([
+                ft.Row([
+                    ft.Icon(Icons.EVENT_SEAT, color=PRIMARY_COLOR, size=20),
+                    ft.Text("Study Rooms", weight=ft.FontWeight.BOLD, size=14, color=TEXT_COLOR),
+                ], spacing=10),
+                ft.Container(height=12),
+                ft.Row([
+                    room_dropdown,
+                    capacity_field,
+                    policy_dropdown,
+                    ft.ElevatedButton("Save", bgcolor=PRIMARY_COLOR, color=ft.Colors.WHITE, on_click=save_capacity),
+                ], spacing=10, wrap=True),
+                ft.Row([
+                    new_room_id,
+                    new_room_name,
+                    new_room_capacity,
+                    ft.OutlinedButton("Add Room", on_click=add_room),
+                ], spacing=10, wrap=True),
+                capacity_status,
+            ], spacing=4),
+            padding=padding.all(16),
+            bgcolor=BG_WHITE,
+            border_radius=border_radius.all(8),
+            border=ft.border.all(1, BORDER_COLOR),
+        )
+
+        gauge = sessions.gauge()
+        sessions_card = ft.Container(
+            content=ft.Column([
+                ft.Row([
+                    ft.Icon(Icons.DEVICES, color=PRIMARY_COLOR, size=20),
+                    ft.Text("Live Sessions", weight=ft.FontWeight.BOLD, size=14, color=TEXT_COLOR),
+                ], spacing=10),
+                ft.Container(height=12),
+                ft.Text(
+                    f"{gauge['live']} live, {gauge['connected']} connected, {gauge['signed_in']} signed in",
+                    size=12, color=LIGHT_TEXT,
+                ),
+                ft.Text(
+                    f"About {gauge['bytes'] / 1024:.0f} KB held by session views; "
+                    f"idle sessions are signed out after {sessions.IDLE_TTL // 60} min",
+                    size=12, color=LIGHT_TEXT,
+                ),
+            ], spacing=4),
+            padding=padding.all(16),
+            bgcolor=BG_WHITE,
+            border_radius=border_radius.all(8),
+            border=ft.border.all(1, BORDER_COLOR),
+        )
+
     content = ft.Column([
         # Header
         ft.Row([
@@ -62,6 +176,15 @@ def settings_view(page: ft.Page):
         dark_mode_card,
         
     ], spacing=0, scroll=ft.ScrollMode.AUTO)
+
+    if sessions_card is not None:
+        content.controls.extend([
+            ft.Container(height=20),
+            ft.Text("Study Space", size=14, weight=ft.FontWeight.BOLD, color=TEXT_COLOR),
+            ft.Container(height=12),
+            capacity_card,
+            ft.Container(height=12),
+            sessions_card,
+        ])
     
-    user_role = page.session.get("user_role") or "User"
     return create_main_layout(page, content, "/settings", user_role)
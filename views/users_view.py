@@ -2,8 +2,18 @@ import flet as ft
 from flet import padding, border_radius, border, Icons
 from layouts import create_main_layout
 from components import ADMIN_ROLE_COLOR, USER_ROLE_COLOR, SUCCESS_COLOR, PRIMARY_COLOR, create_action_button, TABLE_HEADER_BG
-from users_data import search_users, delete_user, toggle_lock, get_user
+from users_data import search_users, get_user
 from activity_log import get_recent_activities
+from storage import transactional
+from user_import import write_error_report, UPLOAD_DIR
+from pathlib import Path
+from functools import partial
+import secrets
+import async_store as store
+from identity import current_role
+
+# Users fetched and rendered per page
+PAGE_SIZE = 50
 
 def users_view(page: ft.Page):
     """User management screen with functional actions (delete, lock/unlock, search/filter, view logs)."""
@@ -21,7 +31,6 @@ def users_view(page: ft.Page):
         border_radius=4,
         text_size=13,
         color="#333333",
-        on_change=lambda e: update_ui()
     )
     status_dd = ft.Dropdown(
         options=[ft.dropdown.Option("All Status"), ft.dropdown.Option("Active"), ft.dropdown.Option("Inactive")],
@@ -32,7 +41,6 @@ def users_view(page: ft.Page):
         border_radius=4,
         text_size=13,
         color="#333333",
-        on_change=lambda e: update_ui()
     )
     search_field = ft.TextField(
         hint_text="Username or email",
@@ -42,9 +50,15 @@ def users_view(page: ft.Page):
         border_radius=4,
         text_size=13,
         color="#333333",
-        on_change=lambda e: update_ui()
     )
 
+    # Keyset pagination: cursors[i] is the last username before page i
+    cursors = [None]
+    next_cursor = [None]
+    page_label = ft.Text("Page 1", size=12, color="#333333")
+    prev_btn = ft.IconButton(Icons.CHEVRON_LEFT, tooltip="Previous page")
+    next_btn = ft.IconButton(Icons.CHEVRON_RIGHT, tooltip="Next page")
+
     # Container placeholders (give it height so internal ListView can scroll)
     list_container = ft.Container(expand=True, height=500)
 
@@ -53,125 +67,444 @@ def users_view(page: ft.Page):
         page.snack_bar.open = True
         page.update()
 
-    def do_toggle_lock(username: str):
+    async def fetch_users(usernames) -> dict:
+        """Current records of the given users (None if gone), read off the event loop."""
+        return await store.run("users", lambda: {name: get_user(name) for name in usernames})
+
+    @transactional
+    async def do_toggle_lock(username: str, e=None):
         # We use 'system' if current_user is None
         actor = current_user if current_user else "system"
-        success = toggle_lock(username, actor=actor)
+        success = await store.toggle_lock(username, actor=actor)
         
         if success:
             show_snack(f"Toggled lock status for {username}")
-            # Refresh the UI to update the lock icon
-            update_ui()
+            # Patch only this user's row (status text and lock icon)
+            refresh_row(username, (await fetch_users([username]))[username])
         else:
             show_snack(f"Failed to toggle lock for {username}", success=False)
 
-    def update_ui(e=None):
-        role = role_dd.value
-        status = status_dd.value
-        q = search_field.value
-        
-        # Fetch fresh data
-        users = search_users(role=role, status=status, query=q)
-
-        # Build header
-        header_row = ft.Container(
-            ft.Row(
-                [
-                    ft.Container(ft.Text("Username", weight=ft.FontWeight.BOLD, size=13, color=ft.Colors.WHITE), width=120),
-                    ft.Container(ft.Text("Name", weight=ft.FontWeight.BOLD, size=13, color=ft.Colors.WHITE), width=160),
-                    ft.Container(ft.Text("Email", weight=ft.FontWeight.BOLD, size=13, color=ft.Colors.WHITE), expand=True),
-                    ft.Container(ft.Text("Role", weight=ft.FontWeight.BOLD, size=13, color=ft.Colors.WHITE), width=80),
-                    ft.Container(ft.Text("Status", weight=ft.FontWeight.BOLD, size=13, color=ft.Colors.WHITE), width=80),
-                    ft.Container(ft.Text("2FA", weight=ft.FontWeight.BOLD, size=13, color=ft.Colors.WHITE), width=50),
-                    ft.Container(ft.Text("Last Login", weight=ft.FontWeight.BOLD, size=13, color=ft.Colors.WHITE), width=150),
-                    ft.Container(ft.Text("Actions", weight=ft.FontWeight.BOLD, size=13, color=ft.Colors.WHITE), width=140),
-                ],
-                spacing=0,
-            ),
-            padding=padding.symmetric(horizontal=15, vertical=12),
-            bgcolor=TABLE_HEADER_BG,
-            border_radius=border_radius.only(top_left=8, top_right=8),
+    @transactional
+    async def do_delete(username: str):
+        actor = current_user if current_user else "system"
+        if await store.delete_user(username, actor=actor):
+            show_snack(f"Deleted user {username}")
+            refresh_row(username, None)
+        else:
+            show_snack(f"Failed to delete {username}", success=False)
+
+    def confirm_delete(username: str, e=None):
+        async def on_confirm(e):
+            page.close(dialog)
+            await do_delete(username)
+
+        dialog = ft.AlertDialog(
+            modal=True,
+            title=ft.Text("Delete user"),
+            content=ft.Text(f"Delete {username}? This cannot be undone."),
+            actions=[
+                ft.TextButton("Cancel", on_click=lambda e: page.close(dialog)),
+                ft.TextButton("Delete", on_click=on_confirm, style=ft.ButtonStyle(color=ft.Colors.RED_700)),
+            ],
         )
+        page.open(dialog)
 
-        rows = []
-        # Handle case where no users found
-        if not users:
-            rows.append(ft.Container(
-                content=ft.Text("No users found.", italic=True),
-                padding=20,
-                alignment=ft.alignment.center
-            ))
-        
-        for i, u in enumerate(users):
-            role_color = ADMIN_ROLE_COLOR if u.get("role") == "Admin" else USER_ROLE_COLOR
-            locked = u.get("locked", False)
-            username_val = u.get("username")
-            
-            # Safe Last Login Handling
-            last_login = u.get("last_login")
-            if not last_login:
-                last_login = "Never"
-            
-            # Action Buttons Logic
-            actions = []
-            # Check if this row is the current logged-in user (case-insensitive)
-            if current_user and username_val.lower() == current_user.lower():
-                actions.append(ft.Text("Current User", size=11, italic=True, color=ft.Colors.GREY_600))
+    # Multi-select for bulk actions (kept across pages until cleared)
+    selected = set()
+    selected_label = ft.Text("0 selected", size=12, color="#333333")
+    select_all_cb = ft.Checkbox(on_change=lambda e: select_page(e.control.value))
+    bulk_role_dd = ft.Dropdown(
+        options=[ft.dropdown.Option("Admin"), ft.dropdown.Option("User")],
+        value="User",
+        width=110,
+        bgcolor=ft.Colors.WHITE,
+        border_radius=4,
+        text_size=12,
+        color="#333333",
+    )
+
+    def sync_selection_ui(push: bool = True):
+        selected_label.value = f"{len(selected)} selected"
+        select_all_cb.value = bool(row_controls) and all(
+            name in selected for name, controls in row_controls.items() if controls.get("select") is not None
+        )
+        if push:
+            selected_label.update()
+            select_all_cb.update()
+
+    def toggle_select(username: str, value: bool):
+        if value:
+            selected.add(username)
+        else:
+            selected.discard(username)
+        sync_selection_ui()
+
+    def select_page(value: bool):
+        for name, controls in row_controls.items():
+            checkbox = controls.get("select")
+            if checkbox is None:
+                continue
+            checkbox.value = value
+            if value:
+                selected.add(name)
             else:
-                # LOCK BUTTON
-                lock_icon = Icons.LOCK_OUTLINE if not locked else Icons.LOCK_OPEN
-                lock_tooltip = "Lock User" if not locked else "Unlock User"
-                lock_color = ft.Colors.GREY_600 if not locked else ft.Colors.GREEN_600
-                
-                lock_btn = ft.IconButton(
-                    lock_icon, 
-                    icon_color=lock_color, 
-                    tooltip=lock_tooltip, 
-                    icon_size=18, 
-                    on_click=lambda e, u=username_val: do_toggle_lock(u)
-                )
-                
-                actions.append(lock_btn)
-
-            # Alternating row background for readability
-            row_bg = ft.Colors.WHITE if i % 2 == 0 else ft.Colors.GREY_200
-            
-            # Status Indicator (Shows 'Locked' in red if locked, otherwise normal status)
-            display_status = "Locked" if locked else u.get("status", "Active")
-            status_color = ft.Colors.RED if locked else SUCCESS_COLOR
-
-            rows.append(ft.Container(
-                content=ft.Row([
-                    ft.Container(ft.Text(u.get("username"), size=12, color="#000000", weight=ft.FontWeight.BOLD), width=120),
-                    ft.Container(ft.Text(u.get("name"), size=12, color="#333333"), width=160),
-                    ft.Container(ft.Text(u.get("email"), size=12, color="#555555"), expand=True),
-                    ft.Container(ft.Text(u.get("role"), color=role_color, size=12), width=80),
-                    ft.Container(ft.Text(display_status, color=status_color, size=12), width=80),
-                    ft.Container(ft.Text("Yes" if u.get("twofa") else "No", size=12, color="#27AE60" if u.get("twofa") else "#E74C3C", weight=ft.FontWeight.BOLD), width=50),
-                    ft.Container(ft.Text(last_login, size=12, color="#888888"), width=150),
-                    ft.Container(ft.Row(actions, spacing=0), width=140),
-                ], spacing=0),
-                padding=padding.symmetric(horizontal=15, vertical=10),
-                bgcolor=row_bg,
+                selected.discard(name)
+        sync_selection_ui(push=False)
+        table.update()
+        selected_label.update()
+
+    @transactional
+    async def run_bulk(action: str, e=None):
+        if not selected:
+            show_snack("Select users first", success=False)
+            return
+        actor = current_user if current_user else "system"
+        names = sorted(selected)
+        if action == "lock":
+            changed = await store.bulk_lock(names, locked=True, actor=actor)
+        elif action == "unlock":
+            changed = await store.bulk_lock(names, locked=False, actor=actor)
+        elif action == "delete":
+            changed = await store.bulk_delete(names, actor=actor)
+        else:
+            changed = await store.bulk_set_role(names, bulk_role_dd.value, actor=actor)
+        selected.clear()
+        # Patch the affected rows, then push them to the client in one update
+        for name, user in (await fetch_users(changed)).items():
+            refresh_row(name, user, push=False)
+        for controls in row_controls.values():
+            if controls.get("select") is not None:
+                controls["select"].value = False
+        sync_selection_ui(push=False)
+        table.update()
+        selected_label.update()
+        show_snack(f"{len(changed)} user(s) updated")
+
+    def confirm_bulk_delete(e):
+        if not selected:
+            show_snack("Select users first", success=False)
+            return
+
+        async def on_confirm(e):
+            page.close(dialog)
+            await run_bulk("delete")
+
+        dialog = ft.AlertDialog(
+            modal=True,
+            title=ft.Text("Delete users"),
+            content=ft.Text(f"Delete {len(selected)} selected user(s)? This cannot be undone."),
+            actions=[
+                ft.TextButton("Cancel", on_click=lambda e: page.close(dialog)),
+                ft.TextButton("Delete", on_click=on_confirm, style=ft.ButtonStyle(color=ft.Colors.RED_700)),
+            ],
+        )
+        page.open(dialog)
+
+    bulk_bar = ft.Row([
+        selected_label,
+        create_action_button("Lock", Icons.LOCK_OUTLINE, on_click=partial(run_bulk, "lock"), color=ft.Colors.GREY_700),
+        create_action_button("Unlock", Icons.LOCK_OPEN, on_click=partial(run_bulk, "unlock"), color=ft.Colors.GREEN_700),
+        create_action_button("Delete", Icons.DELETE_OUTLINE, on_click=confirm_bulk_delete, color=ft.Colors.RED_700),
+        bulk_role_dd,
+        create_action_button("Set Role", Icons.BADGE_OUTLINED, on_click=partial(run_bulk, "role"), color=PRIMARY_COLOR),
+    ], spacing=10)
+
+    # Import users from a CSV/XLSX sheet
+    import_status = ft.Text("", size=12, color="#333333")
+
+    def show_import_errors(errors: list, report_path: Path = None):
+        # Without a report file (web uploads) every error is listed here
+        shown = errors[:200] if report_path else errors
+        rows = [
+            ft.Text(f"Row {error['row']}  {error['username']}  -  {error['error']}", size=12)
+            for error in shown
+        ]
+        if len(errors) > len(shown):
+            rows.append(ft.Text(f"... {len(errors) - len(shown)} more", size=12, italic=True))
+        header = [ft.Text(f"Full report: {report_path}", size=11, color=ft.Colors.GREY_700)] if report_path else []
+        dialog = ft.AlertDialog(
+            title=ft.Text(f"{len(errors)} row(s) not imported"),
+            content=ft.Column([
+                *header,
+                ft.ListView(rows, height=300, width=520),
+            ], tight=True),
+            actions=[ft.TextButton("Close", on_click=lambda e: page.close(dialog))],
+        )
+        page.open(dialog)
+
+    async def run_import(path: Path, uploaded: bool = False):
+        """Import a sheet. A desktop sheet gets its error report saved next to it;
+        an uploaded one (web) is deleted afterwards and its errors are only shown
+        here, since the browser can't open files on the server."""
+        # Called from the import worker thread; control updates are thread-safe
+        def on_progress(result):
+            import_status.value = (f"Importing... {result['rows']} rows, {result['created']} created, "
+                                   f"{result['failed']} failed ({result['rows_per_sec']:.0f} rows/s)")
+            import_status.update()
+
+        try:
+            result = await store.import_users(path, actor=current_user or "system", on_progress=on_progress)
+        except Exception as ex:
+            show_snack(f"Import failed: {ex}", success=False)
+            return
+        finally:
+            if uploaded:
+                # The sheet holds plaintext passwords: don't keep it on the server
+                path.unlink(missing_ok=True)
+        import_status.value = (f"Imported {result['created']} of {result['rows']} rows, {result['failed']} failed "
+                               f"({result['rows_per_sec']:.0f} rows/s)")
+        if result["errors"]:
+            report_path = None
+            if not uploaded:
+                report_path = path.with_name(path.stem + "_errors.csv")
+                await store.run("import", write_error_report, result["errors"], report_path)
+            show_import_errors(result["errors"], report_path)
+        await reset_and_update()
+
+    async def on_file_picked(e: ft.FilePickerResultEvent):
+        if not e.files:
+            return
+        picked = e.files[0]
+        if picked.path:
+            # Desktop: read the sheet in place
+            await run_import(Path(picked.path))
+        else:
+            # Web: upload it to UPLOAD_DIR under a name of its own (so two admins'
+            # "cohort.xlsx" don't collide), then import in on_upload
+            upload_name = f"import-{secrets.token_hex(8)}{Path(picked.name).suffix.lower()}"
+            pending_uploads[upload_name] = picked.name
+            import_status.value = f"Uploading {picked.name}..."
+            import_status.update()
+            file_picker.upload([ft.FilePickerUploadFile(picked.name, upload_url=page.get_upload_url(upload_name, 600))])
+
+    async def on_upload(e: ft.FilePickerUploadEvent):
+        # Uploads report the picked file's name; map it back to the unique one
+        upload_name = next((name for name, picked in pending_uploads.items() if picked == e.file_name), None)
+        if upload_name is None:
+            return
+        if e.error:
+            del pending_uploads[upload_name]
+            (UPLOAD_DIR / upload_name).unlink(missing_ok=True)
+            show_snack(f"Upload failed: {e.error}", success=False)
+        elif e.progress == 1.0:
+            del pending_uploads[upload_name]
+            await run_import(UPLOAD_DIR / upload_name, uploaded=True)
+
+    # unique upload file name -> picked file name, for uploads in flight
+    pending_uploads = {}
+
+    file_picker = ft.FilePicker(on_result=on_file_picked, on_upload=on_upload)
+    page.overlay.append(file_picker)
+
+    async def reset_and_update(e=None):
+        # Filters changed: start again from the first page
+        del cursors[1:]
+        await refresh()
+
+    async def go_page(step: int, e=None):
+        if step > 0 and not next_btn.disabled:
+            cursors.append(next_cursor[0])
+        elif step < 0 and len(cursors) > 1:
+            cursors.pop()
+        await refresh()
+
+    role_dd.on_change = reset_and_update
+    status_dd.on_change = reset_and_update
+    search_field.on_change = reset_and_update
+    prev_btn.on_click = partial(go_page, -1)
+    next_btn.on_click = partial(go_page, 1)
+
+    # username -> controls of its row on the current page, so one user's change
+    # patches that row instead of rebuilding the table
+    row_controls = {}
+
+    header_row = ft.Container(
+        ft.Row(
+            [
+                ft.Container(select_all_cb, width=40),
+                ft.Container(ft.Text("Username", weight=ft.FontWeight.BOLD, size=13, color=ft.Colors.WHITE), width=120),
+                ft.Container(ft.Text("Name", weight=ft.FontWeight.BOLD, size=13, color=ft.Colors.WHITE), width=160),
+                ft.Container(ft.Text("Email", weight=ft.FontWeight.BOLD, size=13, color=ft.Colors.WHITE), expand=True),
+                ft.Container(ft.Text("Role", weight=ft.FontWeight.BOLD, size=13, color=ft.Colors.WHITE), width=80),
+                ft.Container(ft.Text("Status", weight=ft.FontWeight.BOLD, size=13, color=ft.Colors.WHITE), width=80),
+                ft.Container(ft.Text("2FA", weight=ft.FontWeight.BOLD, size=13, color=ft.Colors.WHITE), width=50),
+                ft.Container(ft.Text("Last Login", weight=ft.FontWeight.BOLD, size=13, color=ft.Colors.WHITE), width=150),
+                ft.Container(ft.Text("Actions", weight=ft.FontWeight.BOLD, size=13, color=ft.Colors.WHITE), width=140),
+            ],
+            spacing=0,
+        ),
+        padding=padding.symmetric(horizontal=15, vertical=12),
+        bgcolor=TABLE_HEADER_BG,
+        border_radius=border_radius.only(top_left=8, top_right=8),
+    )
+    empty_row = ft.Container(
+        content=ft.Text("No users found.", italic=True),
+        padding=20,
+        alignment=ft.alignment.center
+    )
+    table = ft.ListView(controls=[header_row], spacing=0, expand=True)
+
+    def apply_lock_state(controls: dict, locked: bool, status: str):
+        # Status Indicator (Shows 'Locked' in red if locked, otherwise normal status)
+        controls["status"].value = "Locked" if locked else status
+        controls["status"].color = ft.Colors.RED if locked else SUCCESS_COLOR
+        lock_btn = controls.get("lock")
+        if lock_btn is not None:
+            lock_btn.icon = Icons.LOCK_OUTLINE if not locked else Icons.LOCK_OPEN
+            lock_btn.tooltip = "Lock User" if not locked else "Unlock User"
+            lock_btn.icon_color = ft.Colors.GREY_600 if not locked else ft.Colors.GREEN_600
+
+    def build_row(u):
+        role_color = ADMIN_ROLE_COLOR if u.get("role") == "Admin" else USER_ROLE_COLOR
+        username_val = u.get("username")
+        
+        # Safe Last Login Handling
+        last_login = u.get("last_login")
+        if not last_login:
+            last_login = "Never"
+
+        controls = {"status": ft.Text(size=12), "role": ft.Text(u.get("role"), color=role_color, size=12)}
+        # Action Buttons Logic
+        actions = []
+        # Check if this row is the current logged-in user (case-insensitive)
+        is_self = current_user and username_val.lower() == current_user.lower()
+        if is_self:
+            actions.append(ft.Text("Current User", size=11, italic=True, color=ft.Colors.GREY_600))
+        else:
+            controls["select"] = ft.Checkbox(
+                value=username_val in selected,
+                on_change=lambda e, u=username_val: toggle_select(u, e.control.value)
+            )
+            # LOCK BUTTON
+            controls["lock"] = ft.IconButton(
+                icon_size=18,
+                on_click=partial(do_toggle_lock, username_val)
+            )
+            actions.append(controls["lock"])
+            actions.append(ft.IconButton(
+                Icons.DELETE_OUTLINE,
+                icon_color=ft.Colors.RED_400,
+                tooltip="Delete User",
+                icon_size=18,
+                on_click=partial(confirm_delete, username_val)
             ))
+        apply_lock_state(controls, u.get("locked", False), u.get("status", "Active"))
 
-        list_container.content = ft.Card(
-            content=ft.Container(
-                content=ft.ListView(
-                    controls=[header_row] + rows,
-                    spacing=0,
-                    expand=True,
-                ),
-                padding=padding.only(bottom=10),
-                bgcolor=ft.Colors.WHITE,
-                expand=True,
-            ),
-            elevation=1,
-            expand=True,
-            height=500,
+        controls["row"] = ft.Container(
+            content=ft.Row([
+                ft.Container(controls.get("select"), width=40),
+                ft.Container(ft.Text(u.get("username"), size=12, color="#000000", weight=ft.FontWeight.BOLD), width=120),
+                ft.Container(ft.Text(u.get("name"), size=12, color="#333333"), width=160),
+                ft.Container(ft.Text(u.get("email"), size=12, color="#555555"), expand=True),
+                ft.Container(controls["role"], width=80),
+                ft.Container(controls["status"], width=80),
+                ft.Container(ft.Text("Yes" if u.get("twofa") else "No", size=12, color="#27AE60" if u.get("twofa") else "#E74C3C", weight=ft.FontWeight.BOLD), width=50),
+                ft.Container(ft.Text(last_login, size=12, color="#888888"), width=150),
+                ft.Container(ft.Row(actions, spacing=0), width=140),
+            ], spacing=0),
+            padding=padding.symmetric(horizontal=15, vertical=10),
         )
+        return controls
+
+    def restripe(start: int = 0):
+        # Alternating row background for readability; only rows from `start` on change
+        for i, row in enumerate(table.controls[1 + start:], start):
+            if row is not empty_row:
+                row.bgcolor = ft.Colors.WHITE if i % 2 == 0 else ft.Colors.GREY_200
+
+    def matches_filters(user) -> bool:
+        # Role/status edits can move a user out of the current filter
+        if role_dd.value != "All Roles" and user.get("role") != role_dd.value:
+            return False
+        if status_dd.value != "All Status" and user.get("status") != status_dd.value:
+            return False
+        return True
+
+    def refresh_row(username: str, user, push: bool = True):
+        """Patch, insert or remove one user's row in place after a change; user is
+        the current record, or None if it was deleted. With push=False the caller
+        sends the changes itself (one update for a batch)."""
+        if user is not None and not matches_filters(user):
+            user = None
+        controls = row_controls.get(username)
+        if controls is not None and user is not None:
+            apply_lock_state(controls, user.get("locked", False), user.get("status", "Active"))
+            controls["role"].value = user.get("role")
+            controls["role"].color = ADMIN_ROLE_COLOR if user.get("role") == "Admin" else USER_ROLE_COLOR
+            if push:
+                controls["row"].update()
+            return
+
+        if controls is not None:
+            # Deleted: splice the row out and restripe the rows below it
+            position = table.controls.index(controls["row"])
+            table.controls.pop(position)
+            del row_controls[username]
+            if not row_controls:
+                table.controls.append(empty_row)
+            restripe(position - 1)
+        elif user is not None:
+            # New user on this page's key range: splice it in at its sorted position
+            shown = sorted(row_controls)
+            after, last = cursors[-1], (shown[-1] if shown else None)
+            if (after is not None and username <= after) or (last is not None and username > last and not next_btn.disabled):
+                return
+            if empty_row in table.controls:
+                table.controls.remove(empty_row)
+            position = sum(1 for name in shown if name < username)
+            row_controls[username] = build_row(user)
+            table.controls.insert(1 + position, row_controls[username]["row"])
+            restripe(position)
+        else:
+            return
+        if push:
+            table.update()
+
+    def page_query() -> dict:
+        # One page plus one row, to know whether another page follows
+        return {"role": role_dd.value, "status": status_dd.value, "query": search_field.value,
+                "after": cursors[-1], "limit": PAGE_SIZE + 1}
+
+    @transactional
+    def update_ui(e=None, users=None):
+        if users is None:
+            users = search_users(**page_query())
+        has_next = len(users) > PAGE_SIZE
+        users = users[:PAGE_SIZE]
+        next_cursor[0] = users[-1].username if users else None
+        page_label.value = f"Page {len(cursors)}"
+        prev_btn.disabled = len(cursors) == 1
+        next_btn.disabled = not has_next
+
+        # A new page or filter: rebuild the rows of this page only
+        row_controls.clear()
+        for u in users:
+            row_controls[u.username] = build_row(u)
+        table.controls = [header_row] + [row_controls[u.username]["row"] for u in users]
+        # Handle case where no users found
+        if not users:
+            table.controls.append(empty_row)
+        restripe()
+        sync_selection_ui(push=False)
         page.update()
 
+    @transactional
+    async def refresh(e=None):
+        """Fetch the current page off the event loop, then redraw it."""
+        update_ui(users=await store.search_users(**page_query()))
+
+    list_container.content = ft.Card(
+        content=ft.Container(
+            content=table,
+            padding=padding.only(bottom=10),
+            bgcolor=ft.Colors.WHITE,
+            expand=True,
+        ),
+        elevation=1,
+        expand=True,
+        height=500,
+    )
+
     # Wire filter changes handled inline above
 
     # Controls row
@@ -179,7 +512,9 @@ def users_view(page: ft.Page):
         ft.Column([ft.Text("Role", weight=ft.FontWeight.BOLD, size=14, color="#000000"), role_dd]),
         ft.Column([ft.Text("Status", weight=ft.FontWeight.BOLD, size=14, color="#000000"), status_dd]),
         ft.Column([ft.Text("Search", weight=ft.FontWeight.BOLD, size=14, color="#000000"), search_field], expand=True),
-        create_action_button("Refresh", Icons.REFRESH, on_click=lambda e: update_ui(), color=PRIMARY_COLOR)
+        create_action_button("Refresh", Icons.REFRESH, on_click=refresh, color=PRIMARY_COLOR),
+        create_action_button("Import", Icons.UPLOAD_FILE, on_click=lambda e: file_picker.pick_files(
+            allowed_extensions=["csv", "xlsx"], dialog_title="Import users"), color=PRIMARY_COLOR),
     ], spacing=20, alignment=ft.MainAxisAlignment.START)
 
     content = ft.Column(
@@ -187,7 +522,11 @@ def users_view(page: ft.Page):
             ft.Row([ft.Text("User Management", size=20, weight=ft.FontWeight.BOLD, color="#000000")]),
             search_fields,
             ft.Container(height=12),
+            bulk_bar,
+            import_status,
+            ft.Container(height=8),
             list_container,
+            ft.Row([prev_btn, page_label, next_btn], alignment=ft.MainAxisAlignment.END),
             ft.Container(height=20),
         ],
         expand=True,
@@ -196,5 +535,5 @@ def users_view(page: ft.Page):
 
     # Initial population
     update_ui()
-    user_role = page.session.get("user_role") or "User"
+    user_role = current_role(page)
     return create_main_layout(page, content, "/users", user_role)